@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - análises em fluxo sobre replays e resultados
+- Fontes em gerador: arquivo do replay.py (lido em pedaços), diretório do
+  archive.py ou banco do results.py; nada é carregado inteiro
+- Estágios encadeáveis: attacks/matches (registros), where (filtro),
+  group (agregado por chave)
+- Agregados de memória constante: Histogram, Summary (contagem, média,
+  mínimo, máximo) e quantis pelo algoritmo P² (Jain & Chlamtac), que
+  guarda só cinco marcadores por quantil
+Relatórios prontos: damage (histograma de dano por personagem), turns
+(distribuição de turnos por dado) e quantiles (campo qualquer por chave).
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from replay import read_replays, replay_steps
+from script import DICE_TYPES
+
+# ---------- Fontes ----------
+def replay_source(path):
+    """Replays de um arquivo do replay.py ou de um diretório do archive.py"""
+    if os.path.isdir(path):
+        from archive import Archive
+        archive = Archive(path)
+        try:
+            for _, rep in archive.range():
+                yield rep
+        finally:
+            archive.close()
+    else:
+        yield from read_replays(path)
+
+def results_source(path, source=None):
+    """Linhas do banco do results.py como dicionários (cursor em fluxo)"""
+    db = sqlite3.connect(path)
+    try:
+        sql = "SELECT source, kind1, kind2, dice, winner, rounds FROM results"
+        params = ()
+        if source:
+            sql += " WHERE source = ?"
+            params = (source,)
+        for src, kind1, kind2, dice, winner, rounds in db.execute(sql, params):
+            yield {'source': src, 'kind1': kind1, 'kind2': kind2, 'dice': dice,
+                   'winner': kind1 if winner == 0 else kind2, 'rounds': rounds}
+    finally:
+        db.close()
+
+# ---------- Estágios ----------
+def attacks(replays):
+    """Um registro por ataque, com o dano refeito pelo motor"""
+    for rep in replays:
+        sides = DICE_TYPES[rep.dice]
+        for turn, (seat, action, roll, damage) in enumerate(replay_steps(rep), 1):
+            if action == 'attack' and damage is not None:
+                yield {'kind': rep.kinds[seat], 'target': rep.kinds[1 - seat], 'dice': rep.dice,
+                       'roll': roll, 'crit': roll == sides, 'damage': damage, 'turn': turn}
+
+def matches(replays):
+    """Um registro por partida (mesmos campos do results.py, mais turnos, críticos e dano)"""
+    for rep in replays:
+        sides = DICE_TYPES[rep.dice]
+        damage = [0, 0]
+        crits = items = turns = 0
+        for seat, action, roll, dealt in replay_steps(rep):
+            turns += 1
+            if dealt:
+                damage[seat] += dealt
+            if action == 'attack':
+                crits += roll == sides
+            elif action in ('heal', 'fury'):
+                items += 1
+        yield {'kind1': rep.kinds[0], 'kind2': rep.kinds[1], 'dice': rep.dice,
+               'winner': rep.kinds[rep.winner], 'rounds': rep.rounds, 'turns': turns,
+               'crits': crits, 'items': items, 'damage1': damage[0], 'damage2': damage[1]}
+
+# Campos de cada tipo de registro e o (agrupamento, campo) padrão do relatório quantiles
+RECORD_FIELDS = {
+    'attacks': (('kind', 'target', 'dice', 'roll', 'crit', 'damage', 'turn'), ('kind', 'damage')),
+    'matches': (('kind1', 'kind2', 'dice', 'winner', 'rounds', 'turns', 'crits', 'items', 'damage1', 'damage2'),
+                ('dice', 'turns')),
+    'results': (('source', 'kind1', 'kind2', 'dice', 'winner', 'rounds'), ('dice', 'rounds')),
+}
+
+def where(records, **conditions):
+    """Filtra por igualdade: where(registros, dice='d10', crit=True)"""
+    items = list(conditions.items())
+    for record in records:
+        if all(record.get(field) == value for field, value in items):
+            yield record
+
+def group(records, key, field, make):
+    """Consome o fluxo alimentando um agregado por valor de `key`; devolve {chave: agregado}"""
+    groups = {}
+    for record in records:
+        k = record[key] if isinstance(key, str) else tuple(record[f] for f in key)
+        aggregate = groups.get(k)
+        if aggregate is None:
+            aggregate = groups[k] = make()
+        aggregate.add(record[field])
+    return groups
+
+# ---------- Agregados ----------
+class Histogram:
+    """Contagem por valor inteiro (dano, turnos: poucos valores distintos)"""
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+
+    def add(self, value):
+        self.counts[value] = self.counts.get(value, 0) + 1
+        self.total += 1
+
+    def render(self, width=40):
+        peak = max(self.counts.values(), default=1)
+        return "\n".join(f"{value:6d} {count:10d} {'#' * max(1, round(count / peak * width))}"
+                         for value, count in sorted(self.counts.items()))
+
+class P2Quantile:
+    """Estimativa de um quantil em fluxo com cinco marcadores (algoritmo P²)"""
+    def __init__(self, p):
+        self.p = p
+        self.q = []                     # alturas dos marcadores
+        self.n = [0, 1, 2, 3, 4]        # posições reais
+        self.np = [0, 2 * p, 4 * p, 2 + 2 * p, 4]  # posições desejadas
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q, n = self.q, self.n
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.q, self.n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        if not self.q:
+            return 0.0
+        if len(self.q) < 5:
+            return self.q[min(len(self.q) - 1, int(self.p * len(self.q)))]
+        return self.q[2]
+
+class Summary:
+    """Contagem, média, mínimo, máximo e quantis P² de um campo numérico"""
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, quantiles=QUANTILES):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.quantiles = [P2Quantile(p) for p in quantiles]
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        for quantile in self.quantiles:
+            quantile.add(value)
+
+    def render(self):
+        cells = "  ".join(f"p{q.p * 100:g} {q.value():7.2f}" for q in self.quantiles)
+        return (f"n {self.count:9d}  média {self.sum / max(1, self.count):7.2f}  "
+                f"min {self.min}  max {self.max}  {cells}")
+
+# ---------- Linha de comando ----------
+def main():
+    parser = argparse.ArgumentParser(description="Análises em fluxo sobre replays e resultados")
+    parser.add_argument('report', choices=['damage', 'turns', 'quantiles'])
+    parser.add_argument('input', help="arquivo do replay.py, diretório do archive.py ou banco .db do results.py")
+    parser.add_argument('--dice', choices=list(DICE_TYPES.keys()), help="só partidas com este dado")
+    parser.add_argument('--field', help="campo numérico (quantiles; padrão conforme os registros)")
+    parser.add_argument('--by', help="campo de agrupamento (quantiles; padrão conforme os registros)")
+    parser.add_argument('--records', choices=['attacks', 'matches'], default='attacks',
+                        help="registros de replay usados em quantiles")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    filters = {'dice': args.dice} if args.dice else {}
+    from_results = args.input.endswith('.db')
+    if args.report == 'damage':
+        if from_results:
+            parser.error("damage precisa de replays (o banco só guarda o resultado)")
+        groups = group(where(attacks(replay_source(args.input)), **filters), 'kind', 'damage', Histogram)
+        for kind, histogram in sorted(groups.items()):
+            print(f"\n{kind} — dano por ataque ({histogram.total} ataques)")
+            print(histogram.render())
+    elif args.report == 'turns':
+        if from_results:
+            records, field = results_source(args.input), 'rounds'
+        else:
+            records, field = matches(replay_source(args.input)), 'turns'
+        groups = group(where(records, **filters), 'dice', field, Histogram)
+        for dice, histogram in sorted(groups.items(), key=lambda item: DICE_TYPES[item[0]]):
+            print(f"\n{dice} — {'rounds' if from_results else 'turnos'} por partida ({histogram.total} partidas)")
+            print(histogram.render())
+    else:
+        kind = 'results' if from_results else args.records
+        fields, (by, field) = RECORD_FIELDS[kind]
+        by, field = args.by or by, args.field or field
+        for name in (by, field):
+            if name not in fields:
+                parser.error(f"campo {name!r} não existe nos registros {kind}: {', '.join(fields)}")
+        if from_results:
+            records = results_source(args.input)
+        else:
+            stage = attacks if args.records == 'attacks' else matches
+            records = stage(replay_source(args.input))
+        groups = group(where(records, **filters), by, field, Summary)
+        for key, summary in sorted(groups.items()):
+            print(f"{str(key):12s} {summary.render()}")
+    print(f"\n{time.perf_counter() - started:.2f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - arquivo de replays em segmentos com índice no rodapé
+- Diretório com segmentos seg-NNNNNN.rpa; cada entrada é o id da partida
+  seguido do registro do replay.py
+- Segmentos fechados têm no fim um índice ordenado (id -> deslocamento) e
+  são abertos com mmap: buscar a partida N ou percorrer uma faixa não lê o
+  resto do arquivo
+- O segmento ativo vira um segmento fechado ao passar do tamanho limite
+- A compactação em segundo plano junta segmentos pequenos e descarta as
+  partidas apagadas (lápides)
+- BATALHA_REPLAYS=<diretório> grava as partidas direto no arquivo
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from replay import Replay, iter_records
+from script import REPLAY_LENGTH
+
+SEGMENT_SIZE = 64 * 1024 * 1024  # bytes de dados antes de abrir um segmento novo
+SEGMENT_MAGIC = b'BDRA'
+INDEX_MAGIC = b'BDRX'
+SEGMENT_HEADER = struct.Struct('<4sHHQ')  # magic, versão, reservado, primeiro id do segmento
+ENTRY_ID = struct.Struct('<Q')
+INDEX_ENTRY = struct.Struct('<QI')  # id da partida, deslocamento da entrada
+TRAILER = struct.Struct('<QQQQ4s')  # início do índice, contagem, menor id, maior id, magic
+TOMBSTONES = 'tombstones.bin'
+PURGED = 'purged.bin'  # ids já removidos fisicamente pela compactação (para os índices)
+
+class Segment:
+    """Um arquivo de segmento; fechado (mmap + índice) ou ativo (só acréscimo)"""
+    def __init__(self, path):
+        self.path = path
+        self.seq = int(os.path.basename(path)[4:10])
+        self.mm = None
+        self.file = None
+        self.ids = []       # só no segmento ativo
+        self.offsets = []
+        with open(path, 'rb') as f:
+            header = f.read(SEGMENT_HEADER.size)
+            magic, _, _, self.base = SEGMENT_HEADER.unpack(header)
+            if magic != SEGMENT_MAGIC:
+                raise ValueError(f"{path} não é um segmento de replays")
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size >= SEGMENT_HEADER.size + TRAILER.size:
+                f.seek(size - TRAILER.size)
+                trailer = TRAILER.unpack(f.read(TRAILER.size))
+                if trailer[4] == INDEX_MAGIC:
+                    self._map(trailer)
+                    return
+        self._recover()
+
+    @staticmethod
+    def name(directory, seq):
+        return os.path.join(directory, f"seg-{seq:06d}.rpa")
+
+    @classmethod
+    def create(cls, directory, seq, base, suffix=''):
+        path = cls.name(directory, seq) + suffix
+        with open(path, 'wb') as f:
+            f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, 1, 0, base))
+        return cls(path)
+
+    def _map(self, trailer):
+        self.index_offset, self.count, self.first, self.last, _ = trailer
+        with open(self.path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = self.index_offset
+
+    def _recover(self):
+        """Segmento ativo (ou interrompido): reconstrói o índice e corta a cauda incompleta"""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        offset = SEGMENT_HEADER.size
+        while offset + ENTRY_ID.size + REPLAY_LENGTH.size <= len(data):
+            (size,) = REPLAY_LENGTH.unpack_from(data, offset + ENTRY_ID.size)
+            stop = offset + ENTRY_ID.size + REPLAY_LENGTH.size + size
+            if stop > len(data):
+                break
+            self.ids.append(ENTRY_ID.unpack_from(data, offset)[0])
+            self.offsets.append(offset)
+            offset = stop
+        self.file = open(self.path, 'r+b')
+        self.file.truncate(offset)
+        self.file.seek(offset)
+        self.size = offset
+        self.count = len(self.ids)
+        self.first = self.ids[0] if self.ids else self.base
+        self.last = self.ids[-1] if self.ids else self.base - 1
+
+    @property
+    def sealed(self):
+        return self.mm is not None
+
+    def append(self, match_id, raw):
+        offset = self.size
+        self.file.write(ENTRY_ID.pack(match_id))
+        self.file.write(raw)
+        self.ids.append(match_id)
+        self.offsets.append(offset)
+        self.size += ENTRY_ID.size + len(raw)
+        self.count += 1
+        if self.count == 1:
+            self.first = match_id
+        self.last = match_id
+
+    def seal(self):
+        """Grava o índice e o rodapé e passa a ler por mmap"""
+        index = b"".join(INDEX_ENTRY.pack(i, off) for i, off in zip(self.ids, self.offsets))
+        trailer = (self.size, self.count, self.first, self.last, INDEX_MAGIC)
+        self.file.write(index)
+        self.file.write(TRAILER.pack(*trailer))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        self.ids, self.offsets = [], []
+        self._map(trailer)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    # ---------- Leitura ----------
+    def _index_at(self, i):
+        return INDEX_ENTRY.unpack_from(self.mm, self.index_offset + i * INDEX_ENTRY.size)
+
+    def _find(self, match_id):
+        """Posição da primeira entrada com id >= match_id"""
+        if not self.sealed:
+            return bisect.bisect_left(self.ids, match_id)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._index_at(mid)[0] < match_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _entry(self, i):
+        """(id, registro cru) da i-ésima entrada"""
+        if self.sealed:
+            match_id, offset = self._index_at(i)
+            data = self.mm
+        else:
+            match_id, offset = self.ids[i], self.offsets[i]
+            self.file.flush()
+            end = self.offsets[i + 1] if i + 1 < self.count else self.size
+            data = os.pread(self.file.fileno(), end - offset, offset)
+            offset = 0
+        start = offset + ENTRY_ID.size
+        (size,) = REPLAY_LENGTH.unpack_from(data, start)
+        return match_id, data[start:start + REPLAY_LENGTH.size + size]
+
+    def get(self, match_id):
+        i = self._find(match_id)
+        if i < self.count:
+            found, raw = self._entry(i)
+            if found == match_id:
+                return raw
+        return None
+
+    def entries(self, start=0, stop=None):
+        """(id, registro cru) com start <= id < stop, em ordem"""
+        i = self._find(start)
+        while i < self.count:
+            match_id, raw = self._entry(i)
+            if stop is not None and match_id >= stop:
+                return
+            yield match_id, raw
+            i += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class Archive:
+    """Diretório de segmentos; também serve de destino para o ReplayWriter (write/flush/close)"""
+    def __init__(self, directory, segment_size=SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.lock = threading.RLock()
+        self.compacting = threading.Lock()
+        self.compactor = None
+        self.wake = threading.Event()
+        self.running = False
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith('.rpa.tmp'):  # compactação interrompida
+                os.remove(os.path.join(directory, name))
+        segments = [Segment(os.path.join(directory, name))
+                    for name in sorted(os.listdir(directory)) if name.startswith('seg-') and name.endswith('.rpa')]
+        self.segments = self._drop_superseded(segments)
+        self.tombstones = self._load_ids(TOMBSTONES)
+        self.purged = self._load_ids(PURGED)
+        self.next_seq = max((s.seq for s in self.segments), default=0) + 1
+        if self.segments and not self.segments[-1].sealed:
+            self.active = self.segments.pop()
+        else:
+            self.active = Segment.create(directory, self._take_seq(), self._next_id())
+        for seg in self.segments:
+            if not seg.sealed:  # ativo antigo de uma execução interrompida
+                seg.seal()
+        self.next_id = max(self.active.base, self.active.last + 1)
+
+    def _drop_superseded(self, segments):
+        """Depois de uma compactação interrompida, o segmento mais novo vale sobre os que ele cobre"""
+        keep = []
+        for seg in sorted(segments, key=lambda s: -s.seq):
+            if seg.count and any(k.count and seg.first <= k.last and k.first <= seg.last for k in keep):
+                seg.close()
+                os.remove(seg.path)
+                continue
+            keep.append(seg)
+        return sorted(keep, key=lambda s: (s.first, s.seq))
+
+    def _load_ids(self, name):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return set()
+        with open(path, 'rb') as f:
+            data = f.read()
+        return {ENTRY_ID.unpack_from(data, i)[0] for i in range(0, len(data) - 7, ENTRY_ID.size)}
+
+    def _append_ids(self, name, ids):
+        with open(os.path.join(self.directory, name), 'ab') as f:
+            f.write(b"".join(ENTRY_ID.pack(i) for i in ids))
+
+    def _take_seq(self):
+        seq = self.next_seq
+        self.next_seq += 1
+        return seq
+
+    def _next_id(self):
+        return max((s.last + 1 for s in self.segments), default=1)
+
+    # ---------- Escrita ----------
+    def append(self, raw):
+        """Acrescenta um registro do replay.py; devolve o id da partida"""
+        with self.lock:
+            if self.active.count and self.active.size + ENTRY_ID.size + len(raw) > self.segment_size:
+                self._rollover()
+            match_id = self.next_id
+            self.next_id += 1
+            self.active.append(match_id, bytes(raw))
+            return match_id
+
+    write = append
+
+    def _rollover(self):
+        self.active.seal()
+        self.segments.append(self.active)
+        self.active = Segment.create(self.directory, self._take_seq(), self.next_id)
+        self.wake.set()
+
+    def flush(self):
+        with self.lock:
+            self.active.flush()
+
+    def delete(self, ids):
+        """Marca partidas como apagadas; o espaço volta na compactação.
+        Ids que não existem (ou já apagados) são ignorados; devolve quantas foram marcadas."""
+        existing = sorted(i for i in set(ids) if self.get_raw(i) is not None)
+        with self.lock:
+            new = [i for i in existing if i not in self.tombstones]
+            self._append_ids(TOMBSTONES, new)
+            self.tombstones.update(new)
+        return len(new)
+
+    def deleted(self, match_id):
+        return match_id in self.tombstones or match_id in self.purged
+
+    # ---------- Leitura ----------
+    def _all_segments(self):
+        with self.lock:
+            return self.segments + [self.active]
+
+    def get_raw(self, match_id):
+        if match_id in self.tombstones:
+            return None
+        segments = self._all_segments()
+        i = bisect.bisect_right([s.first for s in segments], match_id) - 1
+        return segments[i].get(match_id) if i >= 0 else None
+
+    def get(self, match_id):
+        raw = self.get_raw(match_id)
+        return Replay(raw) if raw is not None else None
+
+    def range(self, start=1, stop=None):
+        """(id, Replay) das partidas com start <= id < stop"""
+        for match_id, raw in self.raw_range(start, stop):
+            yield match_id, Replay(raw)
+
+    def raw_range(self, start=1, stop=None):
+        tombstones = self.tombstones
+        for seg in self._all_segments():
+            if seg.count == 0 or seg.last < start or (stop is not None and seg.first >= stop):
+                continue
+            for match_id, raw in seg.entries(start, stop):
+                if match_id not in tombstones:
+                    yield match_id, raw
+
+    def __iter__(self):
+        return self.range()
+
+    def __len__(self):
+        return sum(s.count for s in self._all_segments()) - len(self.tombstones)
+
+    # ---------- Compactação ----------
+    def _plan(self):
+        """Grupos de segmentos fechados vizinhos que cabem num só, ou que têm lápides"""
+        groups = []
+        group, size = [], 0
+        for seg in self.segments:
+            live = seg.size
+            if group and size + live > self.segment_size:
+                groups.append(group)
+                group, size = [], 0
+            group.append(seg)
+            size += live
+        if group:
+            groups.append(group)
+        dead = self.tombstones
+        return [g for g in groups if len(g) > 1 or
+                (dead and any(g[0].first <= i <= g[0].last for i in dead))]
+
+    def compact(self):
+        """Reescreve os grupos planejados; devolve quantos segmentos foram substituídos"""
+        with self.compacting:
+            with self.lock:
+                plan = self._plan()
+                seqs = [self._take_seq() for _ in plan]
+            return sum(self._rewrite(group, seq) for group, seq in zip(plan, seqs))
+
+    def _rewrite(self, group, seq):
+        # Escreve em .tmp e só renomeia depois de fechado: uma queda no meio não deixa
+        # um segmento incompleto que pareça substituir os originais
+        tmp = Segment.create(self.directory, seq, group[0].base, '.tmp')
+        dropped = set()
+        for seg in group:
+            for match_id, raw in seg.entries():
+                if match_id in self.tombstones:
+                    dropped.add(match_id)
+                else:
+                    tmp.append(match_id, raw)
+        tmp.seal()
+        tmp.mm.close()
+        os.replace(tmp.path, Segment.name(self.directory, seq))
+        merged = Segment(Segment.name(self.directory, seq))
+        with self.lock:
+            at = self.segments.index(group[0])
+            self.segments[at:at + len(group)] = [merged]
+            self._append_ids(PURGED, sorted(dropped))
+            self.purged |= dropped
+            self.tombstones -= dropped
+            self._rewrite_tombstones()
+        for seg in group:
+            try:
+                os.remove(seg.path)  # leitores em curso mantêm o mmap antigo até terminar
+            except OSError:
+                pass  # Windows não apaga arquivo mapeado: sai na próxima abertura (_drop_superseded)
+        return len(group)
+
+    def _rewrite_tombstones(self):
+        path = os.path.join(self.directory, TOMBSTONES)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(b"".join(ENTRY_ID.pack(i) for i in sorted(self.tombstones)))
+        os.replace(path + '.tmp', path)
+
+    def start_compactor(self, interval=60):
+        """Compacta em segundo plano a cada `interval` segundos ou logo depois de uma virada de segmento"""
+        self.running = True
+        def run():
+            while self.running:
+                self.wake.wait(interval)
+                self.wake.clear()
+                if self.running:
+                    self.compact()
+        self.compactor = threading.Thread(target=run, name="archive-compactor", daemon=True)
+        self.compactor.start()
+        return self
+
+    def close(self):
+        """Para a compactação e fecha o segmento ativo (com índice) se tiver partidas"""
+        self.running = False
+        self.wake.set()
+        if self.compactor is not None:
+            self.compactor.join()
+        with self.lock:
+            if self.active.count:
+                self.active.seal()
+                self.segments.append(self.active)
+                self.active = Segment.create(self.directory, self._take_seq(), self.next_id)
+            self.active.close()
+
+    def stats(self):
+        segments = self._all_segments()
+        return {
+            'segments': len(segments),
+            'matches': len(self),
+            'tombstones': len(self.tombstones),
+            'bytes': sum(os.path.getsize(s.path) for s in segments),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivo de replays em segmentos com índice")
+    parser.add_argument('directory')
+    parser.add_argument('--segment-mb', type=float, default=SEGMENT_SIZE / 2 ** 20, help="tamanho limite do segmento")
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help="acrescenta os replays de arquivos do replay.py")
+    imp.add_argument('files', nargs='+')
+    get = sub.add_parser('get', help="mostra uma partida pelo id")
+    get.add_argument('id', type=int)
+    rng = sub.add_parser('range', help="percorre uma faixa de ids")
+    rng.add_argument('start', type=int)
+    rng.add_argument('stop', type=int)
+    rng.add_argument('--quiet', action='store_true', help="só conta e mede")
+    delete = sub.add_parser('delete', help="apaga partidas (lápides)")
+    delete.add_argument('ids', type=int, nargs='+')
+    sub.add_parser('compact', help="junta segmentos pequenos e descarta as partidas apagadas")
+    sub.add_parser('stats')
+    args = parser.parse_args()
+
+    archive = Archive(args.directory, int(args.segment_mb * 2 ** 20))
+    try:
+        if args.command == 'import':
+            started = time.perf_counter()
+            count = 0
+            first = None
+            for path in args.files:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                for _, raw in iter_records(data):
+                    match_id = archive.append(raw)
+                    first = first or match_id
+                    count += 1
+            print(f"{count} partidas importadas (ids {first}..{archive.next_id - 1}) "
+                  f"em {time.perf_counter() - started:.2f}s")
+        elif args.command == 'get':
+            rep = archive.get(args.id)
+            if rep is None:
+                print(f"Partida {args.id} não encontrada")
+                return 1
+            print(f"{args.id}: {rep.kinds[0]} x {rep.kinds[1]} {rep.dice}, vencedor {rep.kinds[rep.winner]} "
+                  f"em {rep.rounds} rounds, {len(rep.actions)} ações")
+        elif args.command == 'range':
+            started = time.perf_counter()
+            count = 0
+            for match_id, rep in archive.range(args.start, args.stop):
+                count += 1
+                if not args.quiet:
+                    print(f"{match_id}: {rep.kinds[0]} x {rep.kinds[1]} {rep.dice} -> {rep.kinds[rep.winner]}")
+            elapsed = time.perf_counter() - started
+            print(f"{count} partidas em {elapsed:.3f}s")
+        elif args.command == 'delete':
+            print(f"{archive.delete(args.ids)} de {len(set(args.ids))} partidas apagadas")
+        elif args.command == 'compact':
+            print(f"{archive.compact()} segmentos compactados")
+        print(" ".join(f"{k}={v}" for k, v in archive.stats().items()))
+    finally:
+        archive.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - suíte de benchmarks (somente biblioteca padrão)
+- Micro: codificação/decodificação do protocolo, _receive_raw com
+  entrada fragmentada, attack_roll
+- Macro: batalha completa sem interface, partida em loopback TCP e UDP,
+  direta ou através do proxy de degradação (impair.py)
+- Resultados em JSON com metadados da máquina; o comando compare
+  aponta regressões acima do limiar de ruído entre dois arquivos
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import impair
+import script
+from script import (
+    AdvancedNetwork, GameProtocol, MessageType, Combatant, attack_roll, battle, network_battle
+)
+
+BENCHMARKS = {}
+
+def benchmark(name, ops=1):
+    """Registra um benchmark: a função prepara o cenário e devolve um
+    callable que executa `ops` operações por chamada."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, ops)
+        return setup
+    return register
+
+# ---------- Micro ----------
+SAMPLE_TURN = {
+    'round': 3,
+    'player': 0,
+    'action': {'type': 'attack', 'roll': 5, 'crit': False, 'damage': 7},
+    'players_state': [Combatant("Você", 'Mago').to_dict(), Combatant("Oponente", 'Guardião').to_dict()]
+}
+
+@benchmark("codec.encode_message", ops=1000)
+def bench_encode():
+    encode = GameProtocol.encode_message
+    def run():
+        for _ in range(1000):
+            encode(MessageType.TURN_RESULT, SAMPLE_TURN)
+    return run
+
+@benchmark("codec.decode_message", ops=1000)
+def bench_decode():
+    frame = GameProtocol.encode_message(MessageType.TURN_RESULT, SAMPLE_TURN)
+    decode = GameProtocol.decode_message
+    def run():
+        for _ in range(1000):
+            decode(frame)
+    return run
+
+class FragmentedSocket:
+    """Socket falso que entrega um fluxo em pedaços pequenos (TCP fragmentado)"""
+    def __init__(self, stream, chunk):
+        self.stream = stream
+        self.chunk = chunk
+        self.pos = 0
+
+    def recv(self, size):
+        end = self.pos + min(size, self.chunk)
+        data = self.stream[self.pos:end]
+        self.pos = end
+        return data
+
+@benchmark("network.receive_raw_fragmented", ops=200)
+def bench_receive_raw():
+    stream = GameProtocol.encode_message(MessageType.TURN_RESULT, SAMPLE_TURN) * 200
+    def run():
+        net = AdvancedNetwork()
+        net.socket = FragmentedSocket(stream, 7)
+        for _ in range(200):
+            net._receive_raw()
+    return run
+
+@benchmark("engine.attack_roll", ops=10000)
+def bench_attack_roll():
+    a = Combatant("A", 'Guerreiro')
+    b = Combatant("B", 'Guardião')
+    a.buff_turns = 1
+    def run():
+        for _ in range(10000):
+            attack_roll(a, b, 'd10')
+    return run
+
+# ---------- Macro ----------
+@benchmark("engine.battle_headless", ops=50)
+def bench_battle():
+    def run():
+        for _ in range(50):
+            battle(Combatant("CPU-A", 'Mago', True), Combatant("CPU-B", 'Guardião', True), 'd8')
+    return run
+
+def loopback_match(use_tcp, dice='d6', relay=None):
+    """Uma batalha CPU vs CPU entre dois AdvancedNetwork no loopback.
+    `relay(port)` pode interpor um proxy e devolver a porta a usar."""
+    server = AdvancedNetwork()
+    server.create_server('127.0.0.1', 0, use_tcp)
+    port = server.socket.getsockname()[1]
+    if relay:
+        port = relay(port)
+    result = {}
+
+    def host():
+        if server.wait_connection():
+            result['winner'] = network_battle(Combatant("A", 'Guerreiro', True),
+                                              Combatant("B", 'Mago'), dice, server, True)
+
+    thread = threading.Thread(target=host)
+    thread.start()
+    client = AdvancedNetwork()
+    try:
+        if client.connect_to_server('127.0.0.1', port, use_tcp):
+            network_battle(Combatant("B", 'Mago', True), Combatant("A", 'Guerreiro'), dice, client, False)
+    finally:
+        thread.join(timeout=30)
+        client.close()
+        server.close()
+    return result.get('winner')
+
+@benchmark("network.loopback_tcp_match", ops=1)
+def bench_loopback_tcp():
+    return lambda: loopback_match(True)
+
+@benchmark("network.loopback_udp_match", ops=1)
+def bench_loopback_udp():
+    return lambda: loopback_match(False)
+
+# Rede degradada (WAN simulada) pelo proxy do impair.py; ajustável com --impair
+IMPAIRMENT = {'delay': 0.005, 'jitter': 0.002, 'loss': 0.01, 'seed': 7}
+
+def impaired_match(use_tcp, **overrides):
+    settings = dict(IMPAIRMENT, **overrides)
+    start, proxies = impair.relay(impair.Impairment(**settings), use_tcp)
+    try:
+        return loopback_match(use_tcp, relay=start)
+    finally:
+        for proxy in proxies:
+            proxy.stop()
+
+@benchmark("network.impaired_tcp_match", ops=1)
+def bench_impaired_tcp():
+    return lambda: impaired_match(True)
+
+@benchmark("network.impaired_udp_match", ops=1)
+def bench_impaired_udp():
+    # Sem perda: um datagrama perdido trava a partida UDP até o fim do tempo limite
+    return lambda: impaired_match(False, loss=0.0)
+
+# ---------- Execução ----------
+def machine_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'hostname': socket.gethostname(),
+        'commit': commit,
+    }
+
+def run_benchmark(name, repeats, min_time):
+    setup, ops = BENCHMARKS[name]
+    run = setup()
+    run()  # aquecimento
+    samples = []
+    for _ in range(repeats):
+        random.seed(1234)
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            run()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        samples.append(elapsed / (calls * ops))
+    return {
+        'unit': 's/op',
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeats': repeats,
+        'samples': samples,
+    }
+
+def run_suite(names=None, repeats=5, min_time=0.2):
+    script.set_headless(True)
+    results = {}
+    for name in names or sorted(BENCHMARKS):
+        results[name] = run_benchmark(name, repeats, min_time)
+        r = results[name]
+        print(f"{name:36s} {format_time(r['median']):>12s}  ±{format_time(r['stdev'])}")
+    return {'meta': machine_metadata(), 'results': results}
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+def compare(old, new, threshold):
+    """Compara medianas; o limiar efetivo soma o ruído (desvio relativo) das duas medições"""
+    regressions = []
+    for name in sorted(set(old['results']) | set(new['results'])):
+        a = old['results'].get(name)
+        b = new['results'].get(name)
+        if not a or not b:
+            print(f"{name:36s} {'(ausente em um dos arquivos)':>24s}")
+            continue
+        ratio = b['median'] / a['median']
+        noise = a['stdev'] / a['median'] + b['stdev'] / b['median']
+        limit = max(threshold, noise)
+        if ratio > 1 + limit:
+            verdict = "REGRESSÃO"
+            regressions.append(name)
+        elif ratio < 1 - limit:
+            verdict = "melhora"
+        else:
+            verdict = "="
+        print(f"{name:36s} {format_time(a['median']):>12s} -> {format_time(b['median']):>12s}"
+              f"  {ratio - 1:+7.1%}  (ruído {limit:.1%})  {verdict}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks da Batalha de Dados")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_p = sub.add_parser('run', help="executa a suíte")
+    run_p.add_argument('-o', '--output', default='bench_results.json')
+    run_p.add_argument('--only', nargs='*', help="nomes (ou prefixos) dos benchmarks")
+    run_p.add_argument('--repeats', type=int, default=5)
+    run_p.add_argument('--min-time', type=float, default=0.2, help="segundos mínimos por repetição")
+    run_p.add_argument('--quick', action='store_true', help="3 repetições curtas")
+    run_p.add_argument('--impair', metavar='CHAVE=VALOR,...',
+                       help="degradação dos benchmarks network.impaired_* (ex.: delay=0.05,jitter=0.01,loss=0.02)")
+    cmp_p = sub.add_parser('compare', help="compara dois arquivos de resultado")
+    cmp_p.add_argument('old')
+    cmp_p.add_argument('new')
+    cmp_p.add_argument('--threshold', type=float, default=0.05, help="variação mínima (padrão 5%%)")
+    sub.add_parser('list', help="lista os benchmarks")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name in sorted(BENCHMARKS):
+            print(name)
+        return 0
+    if args.command == 'compare':
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        return 1 if compare(old, new, args.threshold) else 0
+
+    if args.impair:
+        for item in args.impair.split(','):
+            key, value = item.split('=')
+            IMPAIRMENT[key.strip()] = int(value) if key.strip() == 'seed' else float(value)
+    names = sorted(BENCHMARKS)
+    if args.only:
+        names = [n for n in names if any(n.startswith(prefix) for prefix in args.only)]
+    repeats, min_time = (3, 0.05) if args.quick else (args.repeats, args.min_time)
+    data = run_suite(names, repeats, min_time)
+    with open(args.output, 'w') as f:
+        json.dump(data, f, indent=2)
+    print(f"Resultados gravados em {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
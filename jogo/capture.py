@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - leitura e replay de capturas de frames
+- As capturas vêm da escuta do AdvancedNetwork (BATALHA_CAPTURE=<arquivo>
+  no script.py ou --capture no server.py): cada frame cru com direção, id
+  da conexão e relógio monotônico; os arquivos girados (.1, .2, ...) são
+  lidos do mais antigo para o mais novo, e cada execução que abriu a
+  captura começa um arquivo novo
+- stats: decodifica com GameProtocol.decode_message e mostra, por tipo e
+  direção, contagem e tamanho dos frames, e o tempo de resposta (do último
+  frame enviado na conexão até cada frame recebido)
+- show: lista os frames decodificados
+- replay: reenvia a um servidor os frames de um dos lados, uma conexão
+  por conexão capturada, no ritmo original (--speed 1) ou o mais rápido
+  possível (--speed 0); cada frame só sai depois de chegarem tantas
+  respostas quantas havia na captura (ou de --timeout), então o diálogo
+  segue a ordem real. O servidor sorteia de novo personagens e dados, então
+  uma partida pode tomar outro rumo: a conexão conta como divergente e
+  segue enviando até o servidor encerrá-la
+"""
+
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import time
+
+import script
+from loadgen import percentile
+from script import (CAPTURE_HEADER, CAPTURE_IN, CAPTURE_MAGIC, CAPTURE_OUT, CAPTURE_RECORD,
+                    CAPTURE_VERSION, DEFAULT_PORT, MESSAGE_HEADER_SIZE, GameProtocol)
+
+DIRECTIONS = {CAPTURE_IN: 'in', CAPTURE_OUT: 'out'}
+
+def capture_files(path):
+    """O arquivo e os girados, do mais antigo para o mais novo"""
+    rotated = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        rotated.append(f"{path}.{i}")
+        i += 1
+    return rotated[::-1] + ([path] if os.path.exists(path) else [])
+
+def read_capture(path):
+    """(direção, conexão, monotônico, frame) de todos os arquivos da captura, em ordem.
+
+    Os arquivos podem vir de execuções diferentes, cada uma contando as
+    conexões a partir de 1: a conexão devolvida é um número sequencial
+    por (execução, conexão), na ordem em que aparece.
+    """
+    connections = {}
+    for name in capture_files(path):
+        with open(name, 'rb') as f:
+            data = f.read()
+        if len(data) < CAPTURE_HEADER.size:
+            raise ValueError(f"{name} não é uma captura conhecida")
+        magic, version, _, _, run = CAPTURE_HEADER.unpack_from(data)
+        if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+            raise ValueError(f"{name} não é uma captura conhecida")
+        offset = CAPTURE_HEADER.size
+        while offset + CAPTURE_RECORD.size <= len(data):
+            direction, conn, mono, size = CAPTURE_RECORD.unpack_from(data, offset)
+            offset += CAPTURE_RECORD.size
+            if offset + size > len(data):
+                break  # registro incompleto no fim (processo interrompido)
+            conn = connections.setdefault((run, conn), len(connections) + 1)
+            yield direction, conn, mono, data[offset:offset + size]
+            offset += size
+
+def frame_type(frame):
+    """Nome do tipo pelo cabeçalho, sem decodificar o JSON"""
+    if len(frame) < MESSAGE_HEADER_SIZE:
+        return '?'
+    try:
+        return script.MessageType(struct.unpack_from('!I', frame, 4)[0]).name
+    except ValueError:
+        return '?'
+
+# ---------- Estatísticas ----------
+def capture_stats(records):
+    """{(direção, tipo): {'frames', 'bytes', 'max', 'errors', 'latency': [s]}}"""
+    stats = {}
+    last_sent = {}
+    for direction, conn, mono, frame in records:
+        msg = GameProtocol.decode_message(frame)
+        kind = msg['type'].name if msg else frame_type(frame)
+        entry = stats.setdefault((DIRECTIONS[direction], kind),
+                                 {'frames': 0, 'bytes': 0, 'max': 0, 'errors': 0, 'latency': []})
+        entry['frames'] += 1
+        entry['bytes'] += len(frame)
+        entry['max'] = max(entry['max'], len(frame))
+        entry['errors'] += msg is None
+        if direction == CAPTURE_OUT:
+            last_sent[conn] = mono
+        elif conn in last_sent:
+            entry['latency'].append(mono - last_sent.pop(conn))
+    return stats
+
+def print_stats(stats):
+    print(f"{'dir':4s} {'tipo':17s} {'frames':>8s} {'média B':>8s} {'máx B':>7s} {'erros':>6s}"
+          f" {'resp p50':>9s} {'p95':>8s} {'p99':>8s}")
+    for (direction, kind), entry in sorted(stats.items()):
+        latency = sorted(entry['latency'])
+        cells = "".join(f" {percentile(latency, p) * 1000:8.2f}" for p in (50, 95, 99)) if latency else ""
+        print(f"{direction:4s} {kind:17s} {entry['frames']:8d} {entry['bytes'] / entry['frames']:8.1f} "
+              f"{entry['max']:7d} {entry['errors']:6d}{cells}")
+
+# ---------- Replay contra um servidor ----------
+def sessions(records, side):
+    """{conexão: ([(monotônico, frame, respostas esperadas antes dele)], respostas no total)}
+    com os frames do lado `side`"""
+    plan = {}
+    received = {}
+    for direction, conn, mono, frame in records:
+        if direction == side:
+            plan.setdefault(conn, []).append((mono, frame, received.get(conn, 0)))
+        else:
+            received[conn] = received.get(conn, 0) + 1
+    return {conn: (frames, received.get(conn, 0)) for conn, frames in plan.items()}
+
+class ReplayStats:
+    def __init__(self):
+        self.connections = 0
+        self.diverged = 0
+        self.sent = 0
+        self.received = 0
+        self.latency = {}  # tipo enviado -> [s até a próxima resposta]
+
+async def replay_session(host, port, frames, total, origin, started, speed, timeout, stats):
+    """Uma conexão capturada: envia cada frame na hora certa e depois das respostas esperadas"""
+    if speed:
+        await asyncio.sleep(max(0.0, (frames[0][0] - origin) / speed - (time.monotonic() - started)))
+    reader, writer = await asyncio.open_connection(host, port)
+    stats.connections += 1
+    arrived = asyncio.Condition()
+    received = 0
+    pending = []  # (tipo, enviado em) do último frame, até chegar a resposta
+
+    async def drain():
+        nonlocal received
+        try:
+            while True:
+                head = await reader.readexactly(MESSAGE_HEADER_SIZE)
+                await reader.readexactly(struct.unpack('!I', head[:4])[0])
+                now = time.monotonic()
+                for kind, sent in pending:
+                    stats.latency.setdefault(kind, []).append(now - sent)
+                pending.clear()
+                async with arrived:
+                    received += 1
+                    stats.received += 1
+                    arrived.notify_all()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            async with arrived:
+                arrived.notify_all()
+
+    async def responses(expected):
+        """Espera as respostas da captura; False se não vieram (a partida tomou outro rumo)"""
+        try:
+            async with arrived:
+                await asyncio.wait_for(arrived.wait_for(lambda: received >= expected or task.done()), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return received >= expected
+
+    task = asyncio.create_task(drain())
+    diverged = False
+    try:
+        for mono, frame, expected in frames:
+            if speed:
+                await asyncio.sleep(max(0.0, (mono - origin) / speed - (time.monotonic() - started)))
+            if not await responses(expected):
+                diverged = True
+                if task.done():
+                    break  # o servidor encerrou a conexão
+            pending[:] = [(frame_type(frame), time.monotonic())]  # sem resposta ao anterior: fica de fora
+            writer.write(frame)
+            await writer.drain()
+            stats.sent += 1
+        else:
+            diverged = not await responses(total) or diverged
+    except ConnectionError:
+        diverged = True
+    finally:
+        stats.diverged += diverged
+        writer.close()
+        task.cancel()
+
+async def replay_capture(host, port, plan, speed=1.0, timeout=1.0):
+    stats = ReplayStats()
+    if not plan:
+        return stats
+    origin = min(frames[0][0] for frames, _ in plan.values())
+    started = time.monotonic()
+    await asyncio.gather(*(replay_session(host, port, frames, total, origin, started, speed, timeout, stats)
+                           for frames, total in plan.values()))
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Capturas de frames da Batalha de Dados")
+    sub = parser.add_subparsers(dest='command', required=True)
+    st = sub.add_parser('stats', help="tamanho e tempo de resposta por tipo de mensagem")
+    st.add_argument('file')
+    show = sub.add_parser('show', help="lista os frames decodificados")
+    show.add_argument('file')
+    show.add_argument('-n', '--limit', type=int, default=50)
+    rep = sub.add_parser('replay', help="reenvia um lado da captura a um servidor")
+    rep.add_argument('file')
+    rep.add_argument('--host', default='127.0.0.1')
+    rep.add_argument('--port', type=int, default=DEFAULT_PORT)
+    rep.add_argument('--speed', type=float, default=1.0, help="1 = ritmo original, 0 = o mais rápido possível")
+    rep.add_argument('--side', choices=['out', 'in'], default='out',
+                     help="frames reenviados: out numa captura de cliente, in numa do servidor")
+    rep.add_argument('--timeout', type=float, default=1.0, help="segundos esperando as respostas de cada frame")
+    args = parser.parse_args()
+
+    script.set_headless(True)
+    if args.command == 'stats':
+        print_stats(capture_stats(read_capture(args.file)))
+        return 0
+
+    if args.command == 'show':
+        origin = None
+        for i, (direction, conn, mono, frame) in enumerate(read_capture(args.file)):
+            if i == args.limit:
+                break
+            origin = mono if origin is None else origin
+            msg = GameProtocol.decode_message(frame)
+            body = msg['data'] if msg else "(não decodificado)"
+            print(f"{mono - origin:10.4f} #{conn:<4d} {DIRECTIONS[direction]:3s} {frame_type(frame):16s} "
+                  f"{len(frame):6d} B  {body}")
+        return 0
+
+    plan = sessions(read_capture(args.file), CAPTURE_OUT if args.side == 'out' else CAPTURE_IN)
+    started = time.perf_counter()
+    stats = asyncio.run(replay_capture(args.host, args.port, plan, args.speed, args.timeout))
+    elapsed = time.perf_counter() - started
+    print(f"{stats.connections} conexões, {stats.sent} frames enviados, {stats.received} recebidos "
+          f"em {elapsed:.2f}s ({stats.sent / elapsed if elapsed else 0:.0f} frames/s), "
+          f"{stats.diverged} divergentes")
+    for kind, values in sorted(stats.latency.items()):
+        values.sort()
+        print(f"  {kind:17s} resposta p50 {percentile(values, 50) * 1000:7.2f} ms  "
+              f"p99 {percentile(values, 99) * 1000:7.2f} ms  ({len(values)})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - exportação colunar dos resultados de simulação
+- Um arquivo por coluna (array tipado, little-endian) e um cabeçalho
+  header.json pequeno com o número de linhas, o tipo de cada coluna e os
+  nomes por trás dos códigos de personagem e dado
+- As linhas chegam pelo mesmo gancho dos replays (script.REPLAYS) e são
+  gravadas em pedaços enquanto a simulação roda; o cabeçalho só conta os
+  pedaços completos, então um leitor nunca vê uma linha pela metade
+- Leitura por mmap sem cópia: open_columns() devolve memoryviews tipadas;
+  com NumPy, np.memmap(arquivo, dtype=header['columns'][n]['dtype'])
+"""
+
+import argparse
+import array
+import json
+import mmap
+import os
+import queue
+import sys
+import threading
+import time
+
+import script
+from replay import Replay, replay_steps
+from script import DICE_TYPES, REPLAY_DICE, REPLAY_KINDS, ReplayWriter
+
+CHUNK_ROWS = 65536
+HEADER = 'header.json'
+
+# (coluna, typecode do array, dtype equivalente do NumPy)
+COLUMNS = [
+    ('kind1', 'B', '<u1'), ('kind2', 'B', '<u1'), ('dice', 'B', '<u1'), ('winner', 'B', '<u1'),
+    ('turns', 'H', '<u2'), ('rounds', 'H', '<u2'),
+    ('damage1', 'H', '<u2'), ('damage2', 'H', '<u2'),
+    ('crits1', 'B', '<u1'), ('crits2', 'B', '<u1'),
+    ('items1', 'B', '<u1'), ('items2', 'B', '<u1'),
+]
+
+def row_from_replay(rep):
+    """Valores das colunas de uma partida, na ordem de COLUMNS"""
+    sides = DICE_TYPES[rep.dice]
+    damage, crits, items = [0, 0], [0, 0], [0, 0]
+    for seat, action, roll, dealt in replay_steps(rep):
+        if action == 'attack':
+            damage[seat] += dealt
+            crits[seat] += roll == sides
+        elif action in ('heal', 'fury'):
+            items[seat] += 1
+    return (REPLAY_KINDS.index(rep.kinds[0]), REPLAY_KINDS.index(rep.kinds[1]), REPLAY_DICE.index(rep.dice),
+            rep.winner, len(rep.actions), rep.rounds, damage[0], damage[1], crits[0], crits[1],
+            items[0], items[1])
+
+class ColumnWriter:
+    """Recebe as partidas como um ReplayWriter e grava as colunas em pedaços numa thread própria"""
+    def __init__(self, directory, chunk_rows=CHUNK_ROWS):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+        self.rows = 0
+        for name, typecode, _ in COLUMNS:
+            open(self._path(name), 'wb').close()
+        self._write_header()
+        self.buffers = [array.array(typecode) for _, typecode, _ in COLUMNS]
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="columns", daemon=True)
+        self.thread.start()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.col")
+
+    def submit(self, *parts):
+        self.queue.put(parts)
+
+    def _run(self):
+        pending = 0
+        while True:
+            parts = self.queue.get()
+            if parts is None:
+                break
+            row = row_from_replay(Replay(ReplayWriter.encode(*parts)))
+            for buffer, value in zip(self.buffers, row):
+                buffer.append(value)
+            pending += 1
+            if pending == self.chunk_rows:
+                self._flush()
+                pending = 0
+        self._flush()
+
+    def _flush(self):
+        """Acrescenta o pedaço a cada coluna e só então atualiza o cabeçalho"""
+        if not len(self.buffers[0]):
+            return
+        for (name, _, _), buffer in zip(COLUMNS, self.buffers):
+            if sys.byteorder == 'big':
+                buffer.byteswap()
+            with open(self._path(name), 'ab') as f:
+                buffer.tofile(f)
+        self.rows += len(self.buffers[0])
+        self.buffers = [array.array(typecode) for _, typecode, _ in COLUMNS]
+        self._write_header()
+
+    def _write_header(self):
+        header = {
+            'rows': self.rows,
+            'byteorder': 'little',
+            'columns': [{'name': name, 'typecode': typecode, 'dtype': dtype, 'file': f"{name}.col"}
+                        for name, typecode, dtype in COLUMNS],
+            'enums': {'kind1': REPLAY_KINDS, 'kind2': REPLAY_KINDS, 'dice': REPLAY_DICE,
+                      'winner': ['kind1', 'kind2']},
+        }
+        path = os.path.join(self.directory, HEADER)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(header, f, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+class _Tee:
+    """Entrega cada partida a dois destinos (replays e colunas ao mesmo tempo)"""
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def submit(self, *parts):
+        for sink in self.sinks:
+            sink.submit(*parts)
+
+def enable_export(directory, chunk_rows=CHUNK_ROWS):
+    """Liga a exportação colunar das batalhas locais; devolve o ColumnWriter"""
+    writer = ColumnWriter(directory, chunk_rows)
+    script.REPLAYS = writer if script.REPLAYS is None else _Tee(script.REPLAYS, writer)
+    return writer
+
+def open_columns(directory):
+    """(cabeçalho, {coluna: memoryview tipada sobre o mmap}) só com as linhas completas"""
+    with open(os.path.join(directory, HEADER), encoding='utf-8') as f:
+        header = json.load(f)
+    rows = header['rows']
+    columns = {}
+    for column in header['columns']:
+        size = rows * array.array(column['typecode']).itemsize
+        if not size:
+            columns[column['name']] = memoryview(b"").cast(column['typecode'])
+            continue
+        with open(os.path.join(directory, column['file']), 'rb') as f:
+            mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        view = memoryview(mm).cast(column['typecode'])
+        if sys.byteorder == 'big':
+            view = array.array(column['typecode'], view)
+            view.byteswap()
+        columns[column['name']] = view
+    return header, columns
+
+def describe(directory):
+    """Resumo por coluna percorrendo os mmaps (soma, média, máximo)"""
+    header, columns = open_columns(directory)
+    rows = header['rows']
+    print(f"{rows} linhas em {directory}")
+    for column in header['columns'] if rows else ():
+        view = columns[column['name']]
+        total = sum(view)
+        print(f"  {column['name']:8s} {column['dtype']:4s} "
+              f"soma {total:12d}  média {total / rows:8.3f}  máx {max(view)}")
+    return header
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportação colunar dos resultados de simulação")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="roda um torneio exportando cada batalha em colunas")
+    export.add_argument('directory')
+    export.add_argument('--series', type=int, default=100, help="séries por confronto")
+    export.add_argument('--seed', type=int)
+    export.add_argument('--chunk', type=int, default=CHUNK_ROWS, help="linhas por pedaço gravado")
+    info = sub.add_parser('info', help="linhas e resumo de cada coluna")
+    info.add_argument('directory')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        import tournament
+        writer = enable_export(args.directory, args.chunk)
+        started = time.perf_counter()
+        tournament.run_tournament(series=args.series, seed=args.seed)
+        writer.close()
+        print(f"{writer.rows} linhas exportadas em {time.perf_counter() - started:.2f}s")
+        return 0
+    describe(args.directory)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - motor rápido sem interface com regras plugáveis
+- Um objeto Ruleset por geração do jogo (RULESETS): script0.1.py (Pica-Pau
+  x Zeca Urubu, 10 HP, d6, crítico de 5), Script0.2.py, script0.3.py (a
+  CPU que escolhe fury acaba atacando: o turno procura 'aura') e
+  script0.4.py/script.py, local ou em rede (buffs dos dois decaem a cada
+  turno); uma variante nova é uma subclasse ou um Ruleset(...) com outros
+  parâmetros
+- play(): batalha CPU vs CPU só com inteiros locais, sem Combatant nem
+  saída; consome o gerador na mesma ordem do jogo original, então a mesma
+  semente dá a mesma partida que battle() do script.py
+- replay(): refaz as ações de um replay do replay.py sob qualquer regra
+  (o dano é recalculado; um item inexistente na regra vira ataque perdido)
+- bench / compare / verify / rescore na linha de comando
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from script import CHARACTERS, DICE_TYPES
+
+class Ruleset:
+    """Parâmetros e fórmulas de uma geração do jogo. As CPUs seguem a mesma
+    política em todas: cura abaixo de 35% de vida, fury com 40% de chance
+    quando o oponente está abaixo da metade."""
+    name = 'v0.4'
+    description = "script0.4.py / script.py, batalha local"
+    characters = CHARACTERS
+    dice = DICE_TYPES
+    items = {'cura': 2, 'fury': 1}
+    heal = 10
+    fury_turns = 2
+    fury_works = True          # False: a escolha de fury vira ataque (v0.3)
+    decay_both = False         # True: buffs dos dois decaem a cada turno (rede)
+
+    def __init__(self, **overrides):
+        for key, value in overrides.items():
+            if not hasattr(self, key):
+                raise TypeError(f"parâmetro de regra desconhecido: {key}")
+            setattr(self, key, value)
+
+    def damage(self, atk, defense, buffed, debuffed, roll, sides):
+        """Dano de um ataque (mesma fórmula de attack_damage)"""
+        base = atk + roll - defense
+        if base < 0:
+            base = 0
+        multiplier = 1.0
+        if buffed:
+            multiplier += 0.5
+        if debuffed:
+            multiplier -= 0.25
+        damage = int(base * multiplier)
+        if roll == sides:
+            damage = int(damage * 1.5) + 1
+        return damage
+
+    def __repr__(self):
+        return f"<Ruleset {self.name}>"
+
+class ClassicRuleset(Ruleset):
+    """script0.1.py: 10 HP, só d6, 5 de dano no 6 e 1 nos demais, sem itens"""
+    name = 'v0.1'
+    description = "script0.1.py, Pica-Pau x Zeca Urubu"
+    characters = {
+        'Pica-Pau':   {'hp': 10, 'atk': 0, 'def': 0},
+        'Zeca Urubu': {'hp': 10, 'atk': 0, 'def': 0},
+    }
+    dice = {'d6': 6}
+    items = {'cura': 0, 'fury': 0}
+    crit_damage = 5
+    hit_damage = 1
+
+    def damage(self, atk, defense, buffed, debuffed, roll, sides):
+        return self.crit_damage if roll == sides else self.hit_damage
+
+RULESETS = {rules.name: rules for rules in (
+    ClassicRuleset(),
+    Ruleset(name='v0.2', description="Script0.2.py, personagens, itens e dados"),
+    Ruleset(name='v0.3', description="script0.3.py, fury da CPU não ativa", fury_works=False),
+    Ruleset(),
+    Ruleset(name='v0.4-rede', description="script.py em rede, buffs decaem a cada turno", decay_both=True),
+)}
+
+def play(rules, kind1, kind2, dice, rng=random):
+    """Uma batalha CPU vs CPU; devolve (vencedor 0/1, turnos, hp1, hp2).
+    O primeiro a agir é kind1, como em battle()."""
+    sides = rules.dice[dice]
+    # randint(1, n) do jogo é 1 + _randbelow(n): mesmo fluxo do gerador, sem a sobrecarga
+    randbelow = rng._randbelow
+    rand = rng.random
+    damage = rules.damage
+    stats = rules.characters[kind1], rules.characters[kind2]
+    hp = [stats[0]['hp'], stats[1]['hp']]
+    max_hp = hp[:]
+    atk = [stats[0]['atk'], stats[1]['atk']]
+    defense = [stats[0]['def'], stats[1]['def']]
+    cura = [rules.items['cura']] * 2
+    fury = [rules.items['fury']] * 2
+    buff = [0, 0]
+    heal, fury_turns, fury_works, decay_both = rules.heal, rules.fury_turns, rules.fury_works, rules.decay_both
+    seat, other, turns = 0, 1, 0
+    while True:
+        turns += 1
+        if hp[seat] <= max_hp[seat] * 0.35 and cura[seat] > 0:
+            hp[seat] = min(max_hp[seat], hp[seat] + heal)
+            cura[seat] -= 1
+        elif fury[seat] > 0 and hp[other] <= max_hp[other] * 0.5 and rand() < 0.4 and fury_works:
+            fury[seat] -= 1
+            buff[seat] = fury_turns
+        else:
+            roll = randbelow(sides) + 1
+            hp[other] -= damage(atk[seat], defense[other], buff[seat] > 0, False, roll, sides)
+            if hp[other] <= 0:
+                return seat, turns, max(0, hp[0]), max(0, hp[1])
+        if buff[seat] > 0:
+            buff[seat] -= 1
+        if decay_both and buff[other] > 0:
+            buff[other] -= 1
+        seat, other = other, seat
+
+def replay(rules, rep):
+    """Refaz as ações gravadas de um replay sob `rules`; devolve (vencedor ou None, turnos, hp1, hp2).
+    O vencedor é None se as ações acabam com os dois vivos (a regra mudou o desfecho)."""
+    sides = rules.dice[rep.dice]
+    stats = rules.characters[rep.kinds[0]], rules.characters[rep.kinds[1]]
+    hp = [stats[0]['hp'], stats[1]['hp']]
+    max_hp = hp[:]
+    base_def = [stats[0]['def'], stats[1]['def']]
+    defense = base_def[:]
+    cura = [rules.items['cura']] * 2
+    fury = [rules.items['fury']] * 2
+    buff, debuff = [0, 0], [0, 0]
+    turns = 0
+    for seat, action, roll in rep.steps():
+        other = 1 - seat
+        turns += 1
+        if action == 'heal' and cura[seat] > 0:
+            hp[seat] = min(max_hp[seat], hp[seat] + rules.heal)
+            cura[seat] -= 1
+        elif action == 'fury' and fury[seat] > 0 and rules.fury_works:
+            fury[seat] -= 1
+            buff[seat] = rules.fury_turns
+        elif action == 'defend':
+            defense[seat] += 1
+            debuff[seat] = 0
+        elif action == 'attack':
+            hit = rules.damage(stats[seat]['atk'], defense[other], buff[seat] > 0, debuff[other] > 0, roll, sides)
+            hp[other] = max(0, hp[other] - hit)
+            if not hp[other]:
+                return seat, turns, hp[0], hp[1]
+        for p in ((0, 1) if rules.decay_both else (seat,)):
+            if buff[p] > 0:
+                buff[p] -= 1
+            if debuff[p] > 0:
+                debuff[p] -= 1
+            if defense[p] > base_def[p] + 3:
+                defense[p] = base_def[p]
+    return None, turns, hp[0], hp[1]
+
+def matchups(rules, dice=None):
+    """Todos os confrontos (k1, k2, dado) de uma regra"""
+    return [(k1, k2, d) for d in (dice or rules.dice) for k1 in rules.characters for k2 in rules.characters]
+
+def compare(names, battles, seed):
+    """{regra: {(k1, k2, dado): vitórias de k1}} com `battles` batalhas por confronto"""
+    table = {}
+    for name in names:
+        rules = RULESETS[name]
+        rng = random.Random(seed)
+        table[name] = {key: sum(play(rules, *key, rng)[0] == 0 for _ in range(battles))
+                       for key in matchups(rules)}
+    return table
+
+def verify(battles, seed):
+    """Confere play(v0.4) contra battle() do script.py com as mesmas sementes; devolve divergências"""
+    import script
+    script.set_headless(True)
+    rules = RULESETS['v0.4']
+    rng = random.Random(seed)
+    kinds, dice = list(CHARACTERS), list(DICE_TYPES)
+    failures = 0
+    for _ in range(battles):
+        kind1, kind2, d, s = rng.choice(kinds), rng.choice(kinds), rng.choice(dice), rng.getrandbits(64)
+        p1, p2 = script.Combatant("A", kind1, True), script.Combatant("B", kind2, True)
+        winner = 0 if script.battle(p1, p2, d, s) is p1 else 1
+        expected = (winner, p1.hp, p2.hp)
+        got = play(rules, kind1, kind2, d, random.Random(s))
+        if (got[0], got[2], got[3]) != expected:
+            failures += 1
+            print(f"semente {s} {kind1} x {kind2} {d}: motor {got}, script.py {expected}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor rápido da Batalha de Dados com regras de cada versão")
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help="batalhas por segundo de cada regra (e de battle() do script.py)")
+    bench.add_argument('-n', '--battles', type=int, default=200000)
+    cmp = sub.add_parser('compare', help="taxa de vitória do primeiro a agir por confronto, lado a lado")
+    cmp.add_argument('--rules', nargs='*', choices=list(RULESETS), default=list(RULESETS))
+    cmp.add_argument('-n', '--battles', type=int, default=2000, help="batalhas por confronto")
+    cmp.add_argument('--seed', type=int, default=1)
+    ver = sub.add_parser('verify', help="confere o motor contra battle() do script.py")
+    ver.add_argument('-n', '--battles', type=int, default=20000)
+    ver.add_argument('--seed', type=int, default=1)
+    res = sub.add_parser('rescore', help="refaz replays gravados sob outra regra e conta desfechos trocados")
+    res.add_argument('file', help="arquivo do replay.py ou diretório do archive.py")
+    res.add_argument('--rules', choices=list(RULESETS), default='v0.4')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        for name, rules in RULESETS.items():
+            keys = matchups(rules)
+            rng = random.Random(1)
+            started = time.perf_counter()
+            for i in range(args.battles):
+                play(rules, *keys[i % len(keys)], rng)
+            elapsed = time.perf_counter() - started
+            print(f"{name:9s} {args.battles / elapsed:12,.0f} batalhas/s  {rules.description}")
+        import script
+        script.set_headless(True)
+        n = max(1, args.battles // 10)
+        started = time.perf_counter()
+        for i in range(n):
+            kind = list(CHARACTERS)[i % 3]
+            script.battle(script.Combatant("A", kind, True), script.Combatant("B", kind, True), 'd6')
+        elapsed = time.perf_counter() - started
+        print(f"{'battle()':9s} {n / elapsed:12,.0f} batalhas/s  script.py, para comparação")
+        return 0
+
+    if args.command == 'compare':
+        table = compare(args.rules, args.battles, args.seed)
+        keys = sorted({key for rows in table.values() for key in rows}, key=lambda k: (DICE_TYPES.get(k[2], 0), k))
+        print(f"{'confronto':32s}" + "".join(f"{name:>10s}" for name in args.rules))
+        for key in keys:
+            cells = "".join(f"{table[n][key] / args.battles:10.1%}" if key in table[n] else f"{'-':>10s}"
+                            for n in args.rules)
+            print(f"{key[2]:4s} {key[0]:12s} x {key[1]:12s}{cells}")
+        return 0
+
+    if args.command == 'verify':
+        started = time.perf_counter()
+        failures = verify(args.battles, args.seed)
+        print(f"{args.battles} batalhas, {failures} divergentes ({time.perf_counter() - started:.2f}s)")
+        return 1 if failures else 0
+
+    from analytics import replay_source
+    rules = RULESETS[args.rules]
+    total = flipped = undecided = skipped = 0
+    for rep in replay_source(args.file):
+        if rep.dice not in rules.dice or any(k not in rules.characters for k in rep.kinds):
+            skipped += 1
+            continue
+        total += 1
+        winner = replay(rules, rep)[0]
+        if winner is None:
+            undecided += 1
+        elif winner != rep.winner:
+            flipped += 1
+    print(f"{total} replays sob {rules.name}: {flipped} com outro vencedor, {undecided} sem desfecho, "
+          f"{skipped} fora da regra")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - proxy local que degrada a rede (TCP e UDP)
+- Fica entre dois AdvancedNetwork e aplica atraso, jitter, perda,
+  duplicação e reordenação, com semente para repetir a execução
+- TCP: os bytes chegam sempre em ordem (como no TCP real); a perda vira
+  atraso de retransmissão e o jitter nunca ultrapassa o pacote anterior
+- UDP: cada datagrama sofre perda, duplicação e reordenação de verdade
+- Usável pela linha de comando ou como relay do bench.py
+"""
+
+import argparse
+import heapq
+import random
+import socket
+import sys
+import threading
+import time
+
+class Impairment:
+    """Parâmetros da degradação; tempos em segundos, probabilidades de 0 a 1"""
+    def __init__(self, delay=0.0, jitter=0.0, loss=0.0, duplicate=0.0, reorder=0.0,
+                 reorder_delay=None, rto=0.2, seed=None):
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay if reorder_delay is not None else max(2 * jitter, 0.01)
+        self.rto = rto  # TCP: atraso extra por perda (retransmissão)
+        self.seed = seed
+
+    def __repr__(self):
+        return (f"Impairment(delay={self.delay}, jitter={self.jitter}, loss={self.loss}, "
+                f"duplicate={self.duplicate}, reorder={self.reorder}, seed={self.seed})")
+
+class Link:
+    """Um sentido do tráfego: decide o destino de cada pacote e entrega na hora marcada"""
+    def __init__(self, impairment, name, stats, ordered):
+        self.imp = impairment
+        # Semente por sentido: o resultado não depende da intercalação das threads
+        self.rng = random.Random(f"{impairment.seed}:{name}") if impairment.seed is not None else random.Random()
+        self.stats = stats
+        self.ordered = ordered  # TCP: nunca reordena
+        self.queue = []
+        self.seq = 0
+        self.last = 0.0
+        self.cond = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=f"link-{name}", daemon=True)
+        self.thread.start()
+
+    def _latency(self):
+        imp = self.imp
+        return max(0.0, imp.delay + (self.rng.uniform(-imp.jitter, imp.jitter) if imp.jitter else 0.0))
+
+    def submit(self, data, send):
+        """Agenda `send(data)`; data None marca o fim do fluxo (TCP)"""
+        imp = self.imp
+        now = time.monotonic()
+        copies = []
+        if data is None:
+            copies.append(now + self._latency())
+        elif self.ordered:
+            at = now + self._latency()
+            while imp.loss and self.rng.random() < imp.loss:
+                at += imp.rto  # retransmissão após o timeout
+                self.stats['retransmitted'] += 1
+            copies.append(at)
+        else:
+            if imp.loss and self.rng.random() < imp.loss:
+                self.stats['dropped'] += 1
+                return
+            at = now + self._latency()
+            if imp.reorder and self.rng.random() < imp.reorder:
+                at += imp.reorder_delay  # pacotes seguintes passam na frente
+                self.stats['reordered'] += 1
+            copies.append(at)
+            if imp.duplicate and self.rng.random() < imp.duplicate:
+                copies.append(at + self._latency() * 0.1)
+                self.stats['duplicated'] += 1
+        with self.cond:
+            for at in copies:
+                if self.ordered:
+                    at = self.last = max(at, self.last)
+                heapq.heappush(self.queue, (at, self.seq, data, send))
+                self.seq += 1
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.closed and (not self.queue or self.queue[0][0] > time.monotonic()):
+                    self.cond.wait(self.queue[0][0] - time.monotonic() if self.queue else None)
+                if self.closed:
+                    return
+                _, _, data, send = heapq.heappop(self.queue)
+            try:
+                send(data)
+                if data is not None:
+                    self.stats['packets'] += 1
+                    self.stats['bytes'] += len(data)
+            except OSError:
+                pass
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+class ImpairmentProxy:
+    """Relay local: clientes conectam em `port` e o tráfego segue para `target`"""
+    def __init__(self, target_port, impairment=None, use_tcp=True, target_host='127.0.0.1',
+                 listen_host='127.0.0.1', port=0):
+        self.target = (target_host, target_port)
+        self.impairment = impairment or Impairment()
+        self.use_tcp = use_tcp
+        self.listen_addr = (listen_host, port)
+        self.sock = None
+        self.port = None
+        self.running = False
+        self.links = []
+        self.sockets = []
+        self.peers = {}  # UDP: endereço do cliente -> socket para o alvo
+        self.lock = threading.Lock()
+        self.stats = {'connections': 0, 'packets': 0, 'bytes': 0, 'dropped': 0,
+                      'duplicated': 0, 'reordered': 0, 'retransmitted': 0}
+
+    def start(self):
+        """Abre a porta do proxy e devolve o número dela"""
+        if self.use_tcp:
+            self.sock = socket.create_server(self.listen_addr)
+            target = self._accept_loop
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind(self.listen_addr)
+            target = self._datagram_loop
+        self.port = self.sock.getsockname()[1]
+        self.running = True
+        threading.Thread(target=target, name="impair", daemon=True).start()
+        return self.port
+
+    def _link(self, name):
+        link = Link(self.impairment, f"{name}:{len(self.links)}", self.stats, ordered=self.use_tcp)
+        with self.lock:
+            self.links.append(link)
+        return link
+
+    # ---------- TCP ----------
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.sock.accept()
+                upstream = socket.create_connection(self.target)
+            except OSError:
+                if not self.running:
+                    break
+                continue
+            for s in (client, upstream):
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.sockets += [client, upstream]
+                self.stats['connections'] += 1
+            for src, dst, name in ((client, upstream, 'up'), (upstream, client, 'down')):
+                threading.Thread(target=self._pump, args=(src, dst, self._link(name)), daemon=True).start()
+
+    def _pump(self, src, dst, link):
+        def send(data):
+            if data is None:
+                dst.shutdown(socket.SHUT_WR)
+            else:
+                dst.sendall(data)
+        while True:
+            try:
+                data = src.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                link.submit(None, send)
+                return
+            link.submit(data, send)
+
+    # ---------- UDP ----------
+    def _datagram_loop(self):
+        while self.running:
+            try:
+                data, addr = self.sock.recvfrom(65536)
+            except OSError:
+                break
+            peer = self.peers.get(addr)
+            if peer is None:
+                upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                upstream.connect(self.target)
+                peer = self.peers[addr] = (upstream, self._link('up'), self._link('down'))
+                with self.lock:
+                    self.sockets.append(upstream)
+                    self.stats['connections'] += 1
+                threading.Thread(target=self._replies, args=(addr, peer), daemon=True).start()
+            upstream, up, _ = peer
+            up.submit(data, upstream.send)
+
+    def _replies(self, addr, peer):
+        upstream, _, down = peer
+        send = lambda data: self.sock.sendto(data, addr)
+        while self.running:
+            try:
+                data = upstream.recv(65536)
+            except OSError:
+                break
+            down.submit(data, send)
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            sockets = [self.sock] + self.sockets
+            links = list(self.links)
+        for s in sockets:
+            try:
+                s.close()
+            except OSError:
+                pass
+        for link in links:
+            link.close()
+
+def relay(impairment, use_tcp=True):
+    """Fábrica para bench.loopback_match: devolve (relay(porta) -> porta do proxy, lista de proxies)"""
+    proxies = []
+    def start(port):
+        proxy = ImpairmentProxy(port, impairment, use_tcp)
+        proxies.append(proxy)
+        return proxy.start()
+    return start, proxies
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy local que degrada a rede (atraso, perda, reordenação)")
+    parser.add_argument("--target", type=int, required=True, help="porta do host/servidor real")
+    parser.add_argument("--target-host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="porta do proxy (padrão: livre)")
+    parser.add_argument("--udp", action="store_true", help="encaminha UDP em vez de TCP")
+    parser.add_argument("--delay", type=float, default=0.0, help="atraso de ida em ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="variação do atraso em ms (±)")
+    parser.add_argument("--loss", type=float, default=0.0, help="probabilidade de perda (0-1)")
+    parser.add_argument("--duplicate", type=float, default=0.0, help="probabilidade de duplicar (UDP)")
+    parser.add_argument("--reorder", type=float, default=0.0, help="probabilidade de reordenar (UDP)")
+    parser.add_argument("--rto", type=float, default=200.0, help="atraso por perda no TCP, em ms")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    imp = Impairment(args.delay / 1000, args.jitter / 1000, args.loss, args.duplicate, args.reorder,
+                     rto=args.rto / 1000, seed=args.seed)
+    proxy = ImpairmentProxy(args.target, imp, not args.udp, args.target_host, port=args.port)
+    port = proxy.start()
+    print(f"Proxy {'UDP' if args.udp else 'TCP'} em 127.0.0.1:{port} -> {args.target_host}:{args.target}  {imp}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        proxy.stop()
+        print(" ".join(f"{k}={v}" for k, v in proxy.stats.items()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
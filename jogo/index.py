@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - índices secundários sobre o arquivo de replays
+- Uma lista de ids ordenada (postings) por termo: confronto, dado,
+  vencedor, duração, críticos e uso de itens
+- Consultas cruzam as listas dos termos pedidos, da menor para a maior,
+  sem abrir nenhum replay
+- Atualização incremental: só as partidas novas do archive.py são lidas e
+  cada gravação acrescenta um pedaço (chunk) com elas; os pedaços são
+  fundidos quando passam de MAX_CHUNKS
+Termos (chave=valor na linha de comando):
+  pair=Mago:Guardião (sem ordem)   kind=Mago (qualquer lado)   dice=d10
+  winner=Mago   rounds=1   crits=2   crit_round=1   finisher=crit|hit
+  item=heal|fury   items=0   mode=local|network
+"""
+
+import argparse
+import array
+import bisect
+import os
+import struct
+import sys
+import time
+
+from archive import Archive
+from script import DICE_TYPES, REPLAY_NETWORK
+
+INDEX_DIR = 'index'
+MAX_CHUNKS = 16
+CHUNK_HEADER = struct.Struct('<4sQQI')  # magic, primeiro id, último id, número de termos
+CHUNK_MAGIC = b'BDIX'
+TERM_HEADER = struct.Struct('<HI')  # tamanho do termo, número de ids
+
+def terms(rep):
+    """Termos indexados de um replay"""
+    sides = DICE_TYPES[rep.dice]
+    kinds = rep.kinds
+    found = {
+        'pair=' + ':'.join(sorted(kinds)),
+        'kind=' + kinds[0], 'kind=' + kinds[1],
+        'dice=' + rep.dice,
+        'winner=' + kinds[rep.winner],
+        f'rounds={rep.rounds}',
+        'mode=' + ('network' if rep.flags & REPLAY_NETWORK else 'local'),
+    }
+    crits = items = 0
+    finisher = None
+    for i, (_, action, roll) in enumerate(rep.steps()):
+        if action == 'attack':
+            finisher = 'crit' if roll == sides else 'hit'
+            if roll == sides:
+                crits += 1
+                found.add(f'crit_round={i // 2 + 1}')
+        else:
+            finisher = None
+            if action in ('heal', 'fury'):
+                items += 1
+                found.add('item=' + action)
+    found.add(f'crits={crits}')
+    found.add(f'items={items}')
+    if finisher:
+        found.add('finisher=' + finisher)
+    return found
+
+def normalize(term):
+    """Termo na forma indexada: pair=a:b sem ordem vira os dois nomes ordenados"""
+    key, _, value = term.partition('=')
+    if key == 'pair' and ':' in value:
+        return 'pair=' + ':'.join(sorted(value.split(':', 1)))
+    return term
+
+def intersect(lists):
+    """Interseção de listas ordenadas, começando pela menor (busca binária nas outras)"""
+    lists = sorted(lists, key=len)
+    if not lists:
+        return []
+    result = []
+    cursors = [0] * len(lists)
+    for match_id in lists[0]:
+        for k in range(1, len(lists)):
+            postings = lists[k]
+            pos = bisect.bisect_left(postings, match_id, cursors[k])
+            cursors[k] = pos
+            if pos == len(postings) or postings[pos] != match_id:
+                break
+        else:
+            result.append(match_id)
+    return result
+
+def _ids():
+    return array.array('Q')
+
+class ReplayIndex:
+    """Postings por termo, em memória, persistidos em pedaços incrementais"""
+    def __init__(self, archive):
+        self.archive = archive
+        self.directory = os.path.join(archive.directory, INDEX_DIR)
+        self.postings = {}
+        self.pending = {}   # termos das partidas ainda não gravadas
+        self.last_id = 0
+        self.saved_id = 0
+        self.chunks = []
+        os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.idx'):
+                path = os.path.join(self.directory, name)
+                self._merge_into(self.postings, self._read_chunk(path))
+                self.chunks.append(path)
+        self.saved_id = self.last_id
+
+    # ---------- Pedaços em disco ----------
+    def _read_chunk(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, first, last, count = CHUNK_HEADER.unpack_from(data)
+        if magic != CHUNK_MAGIC:
+            raise ValueError(f"{path} não é um pedaço de índice")
+        self.last_id = max(self.last_id, last)
+        offset = CHUNK_HEADER.size
+        chunk = {}
+        for _ in range(count):
+            size, n = TERM_HEADER.unpack_from(data, offset)
+            offset += TERM_HEADER.size
+            term = data[offset:offset + size].decode('utf-8')
+            offset += size
+            ids = _ids()
+            ids.frombytes(data[offset:offset + n * ids.itemsize])
+            if sys.byteorder == 'big':
+                ids.byteswap()
+            offset += n * ids.itemsize
+            chunk[term] = ids
+        return chunk
+
+    def _write_chunk(self, postings, first, last):
+        path = os.path.join(self.directory, f"{first:016d}-{last:016d}.idx")
+        with open(path + '.tmp', 'wb') as f:
+            f.write(CHUNK_HEADER.pack(CHUNK_MAGIC, first, last, len(postings)))
+            for term, ids in sorted(postings.items()):
+                encoded = term.encode('utf-8')
+                f.write(TERM_HEADER.pack(len(encoded), len(ids)))
+                f.write(encoded)
+                if sys.byteorder == 'big':
+                    ids = array.array('Q', ids)
+                    ids.byteswap()
+                f.write(ids.tobytes())
+        os.replace(path + '.tmp', path)
+        return path
+
+    @staticmethod
+    def _merge_into(target, chunk):
+        """Os ids crescem de um pedaço para o outro: basta concatenar"""
+        for term, ids in chunk.items():
+            target.setdefault(term, _ids()).extend(ids)
+
+    # ---------- Atualização ----------
+    def add(self, match_id, rep):
+        for term in terms(rep):
+            self.pending.setdefault(term, _ids()).append(match_id)
+            self.postings.setdefault(term, _ids()).append(match_id)
+        self.last_id = match_id
+
+    def update(self):
+        """Indexa as partidas acrescentadas ao arquivo desde a última chamada"""
+        count = 0
+        for match_id, rep in self.archive.range(self.last_id + 1):
+            self.add(match_id, rep)
+            count += 1
+        return count
+
+    def save(self):
+        """Grava só as partidas novas num pedaço; funde os pedaços quando são muitos"""
+        if not self.pending:
+            return
+        self.chunks.append(self._write_chunk(self.pending, self.saved_id + 1, self.last_id))
+        self.pending = {}
+        self.saved_id = self.last_id
+        if len(self.chunks) > MAX_CHUNKS:
+            self.merge()
+
+    def merge(self):
+        path = self._write_chunk(self.postings, 1, self.last_id)
+        for old in self.chunks:
+            if old != path:
+                os.remove(old)
+        self.chunks = [path]
+
+    # ---------- Consulta ----------
+    def query(self, *wanted):
+        """Ids das partidas que têm todos os termos (menos as apagadas)"""
+        lists = [self.postings.get(normalize(term), ()) for term in wanted]
+        deleted = self.archive.deleted
+        return [match_id for match_id in intersect(lists) if not deleted(match_id)]
+
+    def count(self, term):
+        return len(self.postings.get(term, ()))
+
+    def terms(self, prefix=''):
+        return sorted(term for term in self.postings if term.startswith(prefix))
+
+def main():
+    parser = argparse.ArgumentParser(description="Índices secundários dos replays arquivados")
+    parser.add_argument('directory', help="diretório do archive.py")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('update', help="indexa as partidas novas")
+    query = sub.add_parser('query', help="partidas com todos os termos (ex.: pair=Mago:Guardião dice=d10)")
+    query.add_argument('terms', nargs='+')
+    query.add_argument('--show', type=int, default=10, help="ids listados")
+    query.add_argument('--scan', action='store_true', help="compara com a varredura completa dos replays")
+    terms_cmd = sub.add_parser('terms', help="termos indexados e tamanho das listas")
+    terms_cmd.add_argument('prefix', nargs='?', default='')
+    args = parser.parse_args()
+
+    archive = Archive(args.directory)
+    try:
+        started = time.perf_counter()
+        index = ReplayIndex(archive)
+        loaded = time.perf_counter() - started
+        if args.command == 'update':
+            started = time.perf_counter()
+            count = index.update()
+            index.save()
+            print(f"{count} partidas novas indexadas em {time.perf_counter() - started:.2f}s "
+                  f"(índice carregado em {loaded:.2f}s, até o id {index.last_id})")
+        elif args.command == 'terms':
+            for term in index.terms(args.prefix):
+                print(f"{term:28s} {index.count(term):10d}")
+        else:
+            pending = sum(1 for _ in archive.range(index.last_id + 1)) if index.last_id else None
+            started = time.perf_counter()
+            ids = index.query(*args.terms)
+            elapsed = time.perf_counter() - started
+            print(f"{len(ids)} partidas em {elapsed * 1000:.2f} ms: {ids[:args.show]}"
+                  + (" ..." if len(ids) > args.show else ""))
+            if pending:
+                print(f"({pending} partidas ainda não indexadas: rode 'update')")
+            if args.scan:
+                started = time.perf_counter()
+                wanted = {normalize(term) for term in args.terms}
+                scanned = [match_id for match_id, rep in archive.range(1, index.last_id + 1)
+                           if wanted <= terms(rep)]
+                print(f"varredura: {len(scanned)} partidas em {time.perf_counter() - started:.2f}s "
+                      f"({'confere' if scanned == ids else 'DIVERGE'})")
+    finally:
+        archive.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
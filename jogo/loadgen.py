@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - gerador de carga com bots sem interface
+- N clientes asyncio por processo, opcionalmente em vários processos
+- Cada bot faz HANDSHAKE, GAME_CONFIG / CHARACTER_SELECT e joga as
+  partidas completas contra o servidor usando a política da CPU
+- Relatório: conexões/s, turnos/s e latência de turno p50/p95/p99
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import random
+import socket
+import struct
+import sys
+import time
+
+import script
+from script import (
+    GameProtocol, MessageType, Combatant, CHARACTERS, DEFAULT_PORT, PROTOCOL_VERSION,
+    MESSAGE_HEADER_SIZE, apply_game_state, cpu_network_action, decay_buffs
+)
+
+def percentile(sorted_values, p):
+    """Percentil por posição mais próxima (lista já ordenada)"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+class BotStats:
+    def __init__(self):
+        self.connections = 0
+        self.failures = 0
+        self.battles = 0
+        self.turns = 0
+        self.connect_latencies = []  # s: abrir conexão + handshake
+        self.turn_latencies = []     # s: envio do TURN_RESULT do bot até a resposta do servidor
+
+    def merge(self, other):
+        self.connections += other['connections']
+        self.failures += other['failures']
+        self.battles += other['battles']
+        self.turns += other['turns']
+        self.connect_latencies.extend(other['connect_latencies'])
+        self.turn_latencies.extend(other['turn_latencies'])
+
+    def to_dict(self):
+        return dict(vars(self))
+
+class ProtocolBot:
+    """Cliente do protocolo em asyncio; joga como a CPU do modo de rede"""
+    def __init__(self, host, port, stats, rng):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.rng = rng
+        self.reader = None
+        self.writer = None
+
+    async def send(self, msg_type, data):
+        self.writer.write(GameProtocol.encode_message(msg_type, data))
+        await self.writer.drain()
+
+    async def receive(self):
+        head = await self.reader.readexactly(MESSAGE_HEADER_SIZE)
+        data_size = struct.unpack('!I', head[:4])[0]
+        body = await self.reader.readexactly(data_size)
+        return GameProtocol.decode_message(head + body)
+
+    async def run(self):
+        """Uma sessão completa; devolve False se a conexão falhou"""
+        started = time.perf_counter()
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            await self.send(MessageType.HANDSHAKE, {
+                'version': PROTOCOL_VERSION, 'client_info': 'Batalha de Dados Bot', 'role': 'player'
+            })
+            msg = await self.receive()
+            if not msg or msg['type'] != MessageType.HANDSHAKE or msg['data'].get('status') != 'accepted':
+                raise ConnectionError("handshake recusado")
+            self.stats.connect_latencies.append(time.perf_counter() - started)
+            self.stats.connections += 1
+            await self.play()
+            return True
+        except (OSError, asyncio.IncompleteReadError, ConnectionError):
+            self.stats.failures += 1
+            return False
+        finally:
+            if self.writer:
+                self.writer.close()
+
+    async def play(self):
+        kind = self.rng.choice(list(CHARACTERS.keys()))
+        me = Combatant("Bot", kind, is_cpu=True)
+        host = None
+        dice = 'd6'
+        my_turn = False
+        sent_at = None
+        while True:
+            msg = await self.receive()
+            if msg is None:
+                return
+            mtype, data = msg['type'], msg['data']
+
+            if mtype == MessageType.GAME_CONFIG:
+                dice = data.get('dice_type', dice)
+                host = Combatant("Host", data.get('host_character', 'Guerreiro'))
+                me.reset_round()
+                await self.send(MessageType.CHARACTER_SELECT, {'character': kind})
+                continue
+            if mtype == MessageType.GAME_END:
+                if 'winner_index' not in data:
+                    return  # fim da série/sessão
+                self.stats.battles += 1
+                continue
+            if mtype == MessageType.HEARTBEAT:
+                if 'ping' in data:
+                    await self.send(MessageType.HEARTBEAT, {'pong': data['ping']})
+                continue
+            if mtype == MessageType.GAME_STATE:
+                _, my_turn = apply_game_state(me, host, data, False)
+            elif mtype == MessageType.TURN_RESULT:
+                if sent_at is not None:
+                    self.stats.turn_latencies.append(time.perf_counter() - sent_at)
+                    sent_at = None
+                self.stats.turns += 1
+                players_data = data.get('players_state', [])
+                if len(players_data) >= 2:
+                    me.from_dict(players_data[1])
+                    host.from_dict(players_data[0])
+                if not me.alive() or not host.alive():
+                    continue  # o host fez a jogada final e enviará o GAME_END
+                decay_buffs(me)
+                decay_buffs(host)
+                my_turn = True
+            else:
+                continue
+
+            if my_turn:
+                action = cpu_network_action(me, host, dice)
+                await self.send(MessageType.TURN_RESULT, {
+                    'round': 0, 'player': 1, 'action': action,
+                    'players_state': [me.to_dict(), host.to_dict()]
+                })
+                sent_at = time.perf_counter()
+                self.stats.turns += 1
+                if not host.alive():
+                    await self.send(MessageType.GAME_END, {'winner': me.name, 'winner_index': 1})
+                    self.stats.battles += 1
+                else:
+                    decay_buffs(me)
+                    decay_buffs(host)
+                my_turn = False
+
+async def run_bots(host, port, bots, sessions, ramp, seed):
+    stats = BotStats()
+    rng = random.Random(seed)
+
+    async def bot_loop(i):
+        await asyncio.sleep(ramp * i / max(1, bots))
+        for _ in range(sessions):
+            await ProtocolBot(host, port, stats, random.Random(rng.random())).run()
+
+    await asyncio.gather(*(bot_loop(i) for i in range(bots)))
+    return stats
+
+def worker(host, port, bots, sessions, ramp, seed, results):
+    """Processo de carga: roda seus bots num loop asyncio próprio"""
+    script.set_headless(True)
+    stats = asyncio.run(run_bots(host, port, bots, sessions, ramp, seed))
+    results.put(stats.to_dict())
+
+def report(stats, elapsed, bots, processes):
+    turns = sorted(stats.turn_latencies)
+    conns = sorted(stats.connect_latencies)
+    return {
+        'bots': bots,
+        'processes': processes,
+        'elapsed_s': elapsed,
+        'connections': stats.connections,
+        'failures': stats.failures,
+        'battles': stats.battles,
+        'turns': stats.turns,
+        'connections_per_s': stats.connections / elapsed if elapsed else 0.0,
+        'turns_per_s': stats.turns / elapsed if elapsed else 0.0,
+        'turn_latency_ms': {f'p{p}': percentile(turns, p) * 1000 for p in (50, 95, 99)},
+        'connect_latency_ms': {f'p{p}': percentile(conns, p) * 1000 for p in (50, 95, 99)},
+    }
+
+def run_load(host, port, bots, processes=1, sessions=1, ramp=0.0, seed=None):
+    """Executa a carga e devolve o relatório (usado também pelo benchmark)"""
+    seed = seed if seed is not None else random.randrange(2 ** 32)
+    processes = max(1, min(processes, bots))
+    stats = BotStats()
+    started = time.perf_counter()
+    if processes == 1:
+        stats = asyncio.run(run_bots(host, port, bots, sessions, ramp, seed))
+    else:
+        results = multiprocessing.Queue()
+        share = [bots // processes + (1 if i < bots % processes else 0) for i in range(processes)]
+        procs = [multiprocessing.Process(target=worker, args=(host, port, n, sessions, ramp, seed + i, results))
+                 for i, n in enumerate(share)]
+        for proc in procs:
+            proc.start()
+        for _ in procs:
+            stats.merge(results.get())
+        for proc in procs:
+            proc.join()
+    return report(stats, time.perf_counter() - started, bots, processes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga da Batalha de Dados")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--bots", type=int, default=50, help="clientes simultâneos")
+    parser.add_argument("--processes", type=int, default=1, help="processos de carga")
+    parser.add_argument("--sessions", type=int, default=1, help="conexões sequenciais por bot")
+    parser.add_argument("--ramp", type=float, default=0.0, help="segundos para abrir todas as conexões")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--spawn-server", action="store_true", help="sobe um servidor dedicado local")
+    parser.add_argument("--json", help="grava o relatório neste arquivo")
+    args = parser.parse_args()
+
+    script.set_headless(True)
+    server_proc = None
+    if args.spawn_server:
+        server_proc = multiprocessing.Process(target=_serve, args=(args.port,), daemon=True)
+        server_proc.start()
+        wait_server(args.host, args.port)
+
+    try:
+        result = run_load(args.host, args.port, args.bots, args.processes, args.sessions, args.ramp, args.seed)
+    finally:
+        if server_proc:
+            server_proc.terminate()
+
+    print(f"Bots: {result['bots']} em {result['processes']} processo(s), {result['elapsed_s']:.2f}s")
+    print(f"Conexões: {result['connections']} ({result['connections_per_s']:.1f}/s), falhas: {result['failures']}")
+    print(f"Batalhas: {result['battles']}  Turnos: {result['turns']} ({result['turns_per_s']:.1f}/s)")
+    lat = result['turn_latency_ms']
+    print(f"Latência de turno (ms): p50 {lat['p50']:.2f}  p95 {lat['p95']:.2f}  p99 {lat['p99']:.2f}")
+    lat = result['connect_latency_ms']
+    print(f"Conexão + handshake (ms): p50 {lat['p50']:.2f}  p95 {lat['p95']:.2f}  p99 {lat['p99']:.2f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0 if result['failures'] == 0 else 1
+
+def wait_server(host, port, timeout=10):
+    """Espera o servidor aceitar conexões (tentativas até o prazo)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"servidor em {host}:{port} não respondeu")
+
+def _serve(port):
+    import server
+    script.set_headless(True)
+    server.MatchServer(port=port).serve_forever()
+
+if __name__ == '__main__':
+    sys.exit(main())
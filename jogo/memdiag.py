@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - diagnóstico de memória com tracemalloc
+- match: instantâneos no início e no fim de cada partida; crescimento
+  líquido por partida, por local de alocação, e objetos suspeitos vivos
+  (Combatant, AdvancedNetwork, buffers de recepção)
+- soak: milhares de partidas seguidas; falha se a memória em regime
+  (depois do aquecimento) continuar subindo
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+import script
+from script import AdvancedNetwork, Combatant, MessageReceiver, battle
+
+SUSPECTS = (Combatant, AdvancedNetwork, MessageReceiver)
+
+def play_battle(dice):
+    battle(Combatant("CPU-A", 'Mago', True), Combatant("CPU-B", 'Guardião', True), dice)
+
+def play_network(dice):
+    import bench
+    bench.loopback_match(True, dice)
+
+def play_udp(dice):
+    import bench
+    bench.loopback_match(False, dice)
+
+KINDS = {
+    'battle': play_battle,
+    'network': play_network,
+    'udp': play_udp,
+}
+
+def live_suspects():
+    """Instâncias vivas das classes suspeitas e bytes retidos em AdvancedNetwork.buffer"""
+    counts = {cls.__name__: 0 for cls in SUSPECTS}
+    buffered = 0
+    for obj in gc.get_objects():
+        if isinstance(obj, SUSPECTS):
+            counts[type(obj).__name__] += 1
+            if isinstance(obj, AdvancedNetwork):
+                buffered += len(obj.buffer)
+    counts['buffer_bytes'] = buffered
+    return counts
+
+def settle():
+    """Coleta lixo e dá tempo para threads de partidas encerradas terminarem"""
+    time.sleep(0.01)
+    gc.collect()
+
+def match_report(kind, matches, dice, top, frames):
+    """Crescimento por partida; devolve a lista de diferenças por partida"""
+    play = KINDS[kind]
+    tracemalloc.start(frames)
+    play(dice)  # aquecimento: caches, imports e pools de threads
+    settle()
+    growth = []
+    totals = {}
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]  # os próprios instantâneos
+    for i in range(matches):
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        play(dice)
+        settle()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        diff = after.compare_to(before, 'traceback' if frames > 1 else 'lineno')
+        del before, after
+        net = sum(stat.size_diff for stat in diff)
+        growth.append(net)
+        for stat in diff:
+            if stat.size_diff:
+                key = stat.traceback
+                totals[key] = totals.get(key, 0) + stat.size_diff
+        print(f"partida {i + 1:4d}: {net:+8d} bytes  {live_suspects()}")
+    tracemalloc.stop()
+
+    print(f"\nCrescimento líquido médio: {sum(growth) / max(1, len(growth)):+.1f} bytes/partida")
+    print(f"Locais com maior crescimento acumulado em {matches} partidas:")
+    for tb, size in sorted(totals.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {size:+9d} B  {tb[-1]}")
+        for frame in list(tb)[-2::-1][:frames - 1]:
+            print(f"               chamado de {frame}")
+    return growth
+
+def slope(points):
+    """Inclinação por mínimos quadrados (bytes por partida)"""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var if var else 0.0
+
+def soak(kind, matches, dice, every, warmup, max_growth, top):
+    """Roda `matches` partidas; falha se a memória em regime crescer mais que
+    `max_growth` bytes a cada 1000 partidas. Devolve (passou, inclinação)."""
+    play = KINDS[kind]
+    tracemalloc.start()
+    samples = []
+    baseline = None
+    started = time.perf_counter()
+    for i in range(1, matches + 1):
+        play(dice)
+        if i % every == 0 or i == matches:
+            settle()
+            current = tracemalloc.get_traced_memory()[0]
+            samples.append((i, current))
+            if baseline is None and i >= matches * warmup:
+                baseline = tracemalloc.take_snapshot()
+            print(f"{i:6d} partidas  {current / 1024:9.1f} KiB  {time.perf_counter() - started:7.1f}s")
+    steady = [(x, y) for x, y in samples if x >= matches * warmup]
+    rate = slope(steady)
+    per_thousand = rate * 1000
+    passed = per_thousand <= max_growth
+    print(f"\nRegime (após {warmup:.0%} das partidas): {per_thousand / 1024:+.2f} KiB a cada 1000 partidas"
+          f" (limite {max_growth / 1024:.1f} KiB)")
+    if not passed and baseline is not None:
+        print("Locais que mais cresceram desde o fim do aquecimento:")
+        for stat in tracemalloc.take_snapshot().compare_to(baseline, 'lineno')[:top]:
+            print(f"  {stat}")
+    tracemalloc.stop()
+    print("OK: memória estável" if passed else "FALHA: memória continua subindo")
+    return passed, rate
+
+def main():
+    parser = argparse.ArgumentParser(description="Diagnóstico de memória da Batalha de Dados")
+    parser.add_argument('mode', choices=['match', 'soak'])
+    parser.add_argument('--kind', choices=sorted(KINDS), default='network', help="tipo de partida")
+    parser.add_argument('-n', '--matches', type=int, help="partidas (padrão: 20 em match, 3000 em soak)")
+    parser.add_argument('--dice', default='d6')
+    parser.add_argument('--top', type=int, default=10, help="locais de alocação listados")
+    parser.add_argument('--frames', type=int, default=1, help="quadros de pilha por alocação (match)")
+    parser.add_argument('--every', type=int, default=50, help="partidas entre amostras (soak)")
+    parser.add_argument('--warmup', type=float, default=0.2, help="fração inicial ignorada (soak)")
+    parser.add_argument('--max-growth', type=float, default=16, help="KiB tolerados a cada 1000 partidas (soak)")
+    args = parser.parse_args()
+
+    script.set_headless(True)
+    if args.mode == 'match':
+        match_report(args.kind, args.matches or 20, args.dice, args.top, max(1, args.frames))
+        return 0
+    passed, _ = soak(args.kind, args.matches or 3000, args.dice, args.every, args.warmup,
+                     args.max_growth * 1024, args.top)
+    return 0 if passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - perfilamento determinístico (cProfile)
+- Cenários: batalhas sem interface, séries, torneio, partida em loopback
+  e sessão do servidor dedicado sob carga de bots
+- Grava <saída>.pstats e <saída>.collapsed (pilhas colapsadas, lidas
+  diretamente por flamegraph.pl, inferno e speedscope)
+- Tabela de tempo por função do motor e do codec
+- BATALHA_PROFILE=<saída> perfila o jogo (script.py) ou o servidor (server.py)
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import threading
+
+PROFILE_ENV = 'BATALHA_PROFILE'
+
+ENGINE_FUNCTIONS = {
+    'roll_die', 'attack_roll', 'attack_damage', 'play_turn', 'decay_buffs', 'battle', 'cpu_choose_action',
+    'cpu_network_action', 'snapshot_state', 'apply_game_state',
+    'alive', 'heal', 'take_damage', 'reset_round', 'to_dict', 'from_dict',
+}
+CODEC_FUNCTIONS = {
+    'encode_message', 'decode_message', 'send_message', 'receive_message', 'poll_message',
+    '_read_message', '_receive_raw',
+}
+
+class ProfileCollector:
+    """Junta os perfis de várias threads (o cProfile só mede a thread em que foi ativado).
+
+    No Python 3.12+ só um cProfile pode estar ativo no processo: a thread
+    que não consegue ativar o seu roda a função sem perfil (contada em
+    `unprofiled`) em vez de falhar.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.unprofiled = 0
+
+    def run(self, func, *args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except (ValueError, RuntimeError):  # "Another profiling tool is already active"
+            with self.lock:
+                self.unprofiled += 1
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self.lock:
+                self.profiles.append(profiler)
+
+    def stats(self):
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        return stats
+
+def frame_label(func):
+    filename, lineno, name = func
+    if filename == '~':
+        return name.replace(';', ',')  # funções nativas: "<built-in method ...>"
+    return f"{name} ({os.path.basename(filename)}:{lineno})".replace(';', ',')
+
+def collapsed_stacks(stats, unit=1e-6):
+    """Pilhas colapsadas {"a;b;c": microssegundos} a partir do grafo de chamadas.
+
+    O cProfile guarda só pares chamador -> chamado, então o tempo de cada
+    função é repartido entre os caminhos na proporção do tempo recebido
+    de cada chamador (a mesma aproximação do gprof2dot e do flameprof).
+    """
+    entries = stats.stats
+    children = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+    stacks = {}
+    path = []
+    on_path = set()
+
+    def walk(func, share):
+        _, _, tottime, _, _ = entries[func]
+        path.append(frame_label(func))
+        on_path.add(func)
+        self_time = tottime * share
+        if self_time >= unit:
+            key = ';'.join(path)
+            stacks[key] = stacks.get(key, 0) + self_time
+        for child, edge_time in children.get(func, ()):
+            child_total = entries[child][3]
+            if child in on_path or child_total <= 0 or edge_time * share < unit:
+                continue
+            walk(child, share * min(1.0, edge_time / child_total))
+        on_path.discard(func)
+        path.pop()
+
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(func, 1.0)
+    return {stack: int(round(t / unit)) for stack, t in stacks.items() if t >= unit}
+
+def category(func):
+    filename, _, name = func
+    if os.path.basename(filename) == 'script.py':
+        if name in CODEC_FUNCTIONS:
+            return 'codec'
+        if name in ENGINE_FUNCTIONS:
+            return 'motor'
+    elif f"{os.sep}json{os.sep}" in filename or '_json' in name:
+        return 'codec'  # json.dumps/loads e o acelerador em C chamados pelo protocolo
+    return None
+
+def breakdown(stats):
+    """Linhas (categoria, função, chamadas, tottime, cumtime) do motor e do codec"""
+    rows = []
+    for func, (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        cat = category(func)
+        if cat:
+            rows.append((cat, frame_label(func), ncalls, tottime, cumtime))
+    rows.sort(key=lambda row: (row[0], -row[3]))
+    return rows
+
+def print_breakdown(stats, limit=15):
+    total = stats.total_tt or 1e-12
+    print(f"Tempo total medido: {stats.total_tt:.3f}s")
+    for cat in ('motor', 'codec'):
+        rows = [row for row in breakdown(stats) if row[0] == cat]
+        own = sum(row[3] for row in rows)
+        print(f"\n[{cat}] {own:.4f}s próprios ({own / total:.1%} do total)")
+        print(f"  {'função':48s} {'chamadas':>9s} {'tottime':>9s} {'cumtime':>9s} {'us/chamada':>11s}")
+        for _, label, ncalls, tottime, cumtime in rows[:limit]:
+            print(f"  {label:48.48s} {ncalls:9d} {tottime:9.4f} {cumtime:9.4f} {tottime / ncalls * 1e6:11.2f}")
+
+def write_profile(stats, output):
+    """Grava <output>.pstats e <output>.collapsed; devolve os dois caminhos"""
+    pstats_path = output + '.pstats'
+    collapsed_path = output + '.collapsed'
+    stats.dump_stats(pstats_path)
+    with open(collapsed_path, 'w') as f:
+        for stack, count in sorted(collapsed_stacks(stats).items()):
+            f.write(f"{stack} {count}\n")
+    return pstats_path, collapsed_path
+
+def profile_call(func, *args, output='perfil', **kwargs):
+    """Executa func sob o cProfile e grava os arquivos mesmo se ela for interrompida"""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        paths = write_profile(pstats.Stats(profiler), output)
+        print(f"Perfil gravado em {paths[0]} e {paths[1]}", file=sys.stderr)
+
+# ---------- Cenários ----------
+def scenario_battle(count, dice):
+    from script import Combatant, battle
+    for _ in range(count):
+        battle(Combatant("CPU-A", 'Mago', True), Combatant("CPU-B", 'Guardião', True), dice or 'd8')
+
+def scenario_series(count, dice):
+    import tournament
+    for _ in range(count):
+        tournament.play_series('Guerreiro', 'Mago', dice or 'd8')
+
+def scenario_tournament(count, dice):
+    import tournament
+    tournament.run_tournament(dice=[dice] if dice else None, series=count)
+
+def scenario_network(count, dice):
+    """Partidas em loopback TCP; mede o lado do cliente (thread principal)"""
+    import bench
+    for _ in range(count):
+        bench.loopback_match(True, dice or 'd6')
+
+def run_server_session(bots, dice):
+    """Servidor dedicado no loopback com `bots` clientes; devolve (perfil das conexões,
+    conexões que rodaram sem perfil)"""
+    import loadgen
+    import server
+    match_server = server.MatchServer('127.0.0.1', 0, dice=dice)
+    match_server.profiler = ProfileCollector()
+    port = match_server.start()
+    try:
+        loadgen.run_load('127.0.0.1', port, bots, seed=1)
+    finally:
+        match_server.stop()
+    return match_server.profiler.stats(), match_server.profiler.unprofiled
+
+SCENARIOS = {
+    'battle': scenario_battle,
+    'series': scenario_series,
+    'tournament': scenario_tournament,
+    'network': scenario_network,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfilamento da Batalha de Dados (cProfile)")
+    parser.add_argument('scenario', choices=sorted(SCENARIOS) + ['server', 'report'])
+    parser.add_argument('-n', '--count', type=int, default=200,
+                        help="batalhas, séries, séries por confronto, partidas ou bots")
+    parser.add_argument('--dice', help="dado usado no cenário")
+    parser.add_argument('-o', '--output', default='perfil', help="prefixo dos arquivos gerados")
+    parser.add_argument('--input', help="arquivo .pstats para o cenário report")
+    parser.add_argument('--limit', type=int, default=15, help="linhas por categoria na tabela")
+    args = parser.parse_args()
+
+    import random
+    import script
+    script.set_headless(True)
+    random.seed(1234)
+
+    if args.scenario == 'report':
+        if not args.input:
+            parser.error("report exige --input arquivo.pstats")
+        print_breakdown(pstats.Stats(args.input), args.limit)
+        return 0
+    if args.scenario == 'server':
+        stats, unprofiled = run_server_session(args.count, args.dice)
+        if unprofiled:
+            print(f"{unprofiled} conexões rodaram sem perfil (outro cProfile já estava ativo).",
+                  file=sys.stderr)
+        if stats is None:
+            print("Nenhuma conexão foi perfilada.", file=sys.stderr)
+            return 1
+        paths = write_profile(stats, args.output)
+    else:
+        profiler = cProfile.Profile()
+        profiler.runcall(SCENARIOS[args.scenario], args.count, args.dice)
+        stats = pstats.Stats(profiler)
+        paths = write_profile(stats, args.output)
+    print_breakdown(stats, args.limit)
+    print(f"\nPerfil gravado em {paths[0]} e {paths[1]}")
+    print(f"Flamegraph: flamegraph.pl {paths[1]} > perfil.svg  (ou abra o .collapsed no speedscope)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - ratings Glicko dos jogadores em rede
+- Atualização incremental a cada batalha (Glicko-1 com um período por
+  partida; o desvio RD encolhe com as partidas e tem piso)
+- Posição no ranking em O(log n) por uma árvore de Fenwick sobre os
+  ratings arredondados; top-K desce a mesma árvore
+- Gravação binária compacta (nomes + registros fixos) e carga rápida na
+  partida do servidor
+- pair(): emparelha jogadores em espera pelo rating, para um lobby; o
+  server.py --ratings usa nearest() para escolher o personagem da CPU
+"""
+
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+import threading
+import time
+
+INITIAL_RATING = 1500.0
+INITIAL_RD = 350.0
+MIN_RD = 30.0       # piso do desvio: o rating nunca congela
+MAX_RATING = 4000   # faixa da árvore de ranking (0..MAX_RATING)
+Q = math.log(10) / 400
+
+FILE_MAGIC = b'BDR2'                  # nomes com prefixo de tamanho
+OLD_FILE_MAGIC = b'BDRT'              # nomes separados por "\n" (ainda lido)
+FILE_HEADER = struct.Struct('<4sII')  # magic, jogadores, bytes de nomes
+NAME_LENGTH = struct.Struct('<H')     # bytes UTF-8 de cada nome
+PLAYER = struct.Struct('<ddII')       # rating, rd, partidas, vitórias
+MAX_NAME = 64                         # caracteres de um nome de jogador
+CPU_PREFIX = 'CPU-'                   # reservado aos ratings das CPUs do servidor
+
+def valid_name(name):
+    """Nome aceitável no ranking: texto curto, não vazio e fora do prefixo das CPUs"""
+    return isinstance(name, str) and 0 < len(name) <= MAX_NAME and not name.startswith(CPU_PREFIX)
+
+def _g(rd):
+    return 1 / math.sqrt(1 + 3 * Q * Q * rd * rd / (math.pi * math.pi))
+
+def expected(rating, opp_rating, opp_rd):
+    """Chance de vitória esperada contra o oponente"""
+    return 1 / (1 + 10 ** (-_g(opp_rd) * (rating - opp_rating) / 400))
+
+def glicko_update(rating, rd, opp_rating, opp_rd, score):
+    """Novo (rating, rd) depois de uma partida com resultado score (1, 0,5 ou 0)"""
+    g = _g(opp_rd)
+    e = 1 / (1 + 10 ** (-g * (rating - opp_rating) / 400))
+    d2 = 1 / (Q * Q * g * g * e * (1 - e))
+    denom = 1 / (rd * rd) + 1 / d2
+    return rating + Q / denom * g * (score - e), max(MIN_RD, math.sqrt(1 / denom))
+
+class Fenwick:
+    """Contagens por posição com prefixo e k-ésimo elemento em O(log n)"""
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self.top_bit = 1 << (size.bit_length() - 1)
+
+    def add(self, i, delta):
+        i += 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        """Soma das posições 0..i"""
+        i += 1
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, k):
+        """Menor posição cujo prefixo alcança k (k a partir de 1)"""
+        pos = 0
+        bit = self.top_bit
+        while bit:
+            nxt = pos + bit
+            if nxt <= self.size and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            bit >>= 1
+        return pos
+
+class RatingBook:
+    """Ratings de todos os jogadores, seguro para as threads do servidor"""
+    def __init__(self):
+        self.players = {}   # nome -> [rating, rd, partidas, vitórias]
+        self.buckets = {}   # rating arredondado -> nomes
+        self.tree = Fenwick(MAX_RATING + 1)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _bucket(rating):
+        return min(MAX_RATING, max(0, int(round(rating))))
+
+    def _place(self, name, rating, delta):
+        bucket = self._bucket(rating)
+        self.tree.add(bucket, delta)
+        if delta > 0:
+            self.buckets.setdefault(bucket, set()).add(name)
+        else:
+            members = self.buckets[bucket]
+            members.discard(name)
+            if not members:
+                del self.buckets[bucket]
+
+    def _entry(self, name):
+        entry = self.players.get(name)
+        if entry is None:
+            entry = self.players[name] = [INITIAL_RATING, INITIAL_RD, 0, 0]
+            self._place(name, INITIAL_RATING, +1)
+        return entry
+
+    def _set(self, name, entry, rating, rd):
+        if self._bucket(rating) != self._bucket(entry[0]):
+            self._place(name, entry[0], -1)
+            self._place(name, rating, +1)
+        entry[0], entry[1] = rating, rd
+
+    def record(self, winner, loser):
+        """Atualiza os dois jogadores depois de uma batalha"""
+        with self.lock:
+            a, b = self._entry(winner), self._entry(loser)
+            ra, rda, rb, rdb = a[0], a[1], b[0], b[1]
+            self._set(winner, a, *glicko_update(ra, rda, rb, rdb, 1.0))
+            self._set(loser, b, *glicko_update(rb, rdb, ra, rda, 0.0))
+            a[2] += 1
+            a[3] += 1
+            b[2] += 1
+
+    def rating(self, name):
+        entry = self.players.get(name)
+        return (entry[0], entry[1]) if entry else (INITIAL_RATING, INITIAL_RD)
+
+    def rank(self, name):
+        """Posição (1 = melhor) em O(log n); empates no mesmo rating arredondado dividem a posição"""
+        entry = self.players.get(name)
+        if entry is None:
+            return None
+        with self.lock:
+            return len(self.players) - self.tree.prefix(self._bucket(entry[0])) + 1
+
+    def top(self, k=10):
+        """Os k melhores: [(nome, rating, rd, partidas, vitórias)]"""
+        rows = []
+        with self.lock:
+            total = len(self.players)
+            position = 1
+            while len(rows) < k and position <= total:
+                bucket = self.tree.find(total - position + 1)  # k-ésimo a partir do topo
+                members = sorted(self.buckets[bucket], key=lambda n: -self.players[n][0])
+                rows += [(n, *self.players[n]) for n in members]
+                position += len(members)
+        return rows[:k]
+
+    def nearest(self, name, candidates):
+        """O candidato de rating mais próximo do jogador (ex.: personagem da CPU do servidor)"""
+        rating = self.rating(name)[0]
+        return min(candidates, key=lambda c: abs(self.rating(c)[0] - rating))
+
+    def pair(self, waiting):
+        """Emparelha jogadores em espera pelo rating: ordena e junta vizinhos.
+        Devolve (pares, quem sobrou)."""
+        ordered = sorted(waiting, key=lambda n: self.rating(n)[0])
+        pairs = [(ordered[i], ordered[i + 1]) for i in range(0, len(ordered) - 1, 2)]
+        return pairs, ordered[len(pairs) * 2:]
+
+    # ---------- Persistência ----------
+    def save(self, path):
+        with self.lock:
+            names = list(self.players)
+            records = b"".join(PLAYER.pack(*self.players[n]) for n in names)
+        blob = b"".join(NAME_LENGTH.pack(len(raw)) + raw for raw in (n.encode('utf-8') for n in names))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(FILE_HEADER.pack(FILE_MAGIC, len(names), len(blob)))
+            f.write(blob)
+            f.write(records)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        book = cls()
+        if not os.path.exists(path):
+            return book
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, count, size = FILE_HEADER.unpack_from(data)
+        start = FILE_HEADER.size
+        if magic == FILE_MAGIC:
+            names = []
+            offset = start
+            for _ in range(count):
+                (length,) = NAME_LENGTH.unpack_from(data, offset)
+                offset += NAME_LENGTH.size
+                names.append(data[offset:offset + length].decode('utf-8'))
+                offset += length
+        elif magic == OLD_FILE_MAGIC:
+            names = data[start:start + size].decode('utf-8').split("\n") if count else []
+        else:
+            raise ValueError(f"{path} não é um arquivo de ratings")
+        records = PLAYER.iter_unpack(data[start + size:start + size + count * PLAYER.size])
+        counts = [0] * (MAX_RATING + 1)
+        for name, record in zip(names, records):
+            book.players[name] = list(record)
+            bucket = cls._bucket(record[0])
+            book.buckets.setdefault(bucket, set()).add(name)
+            counts[bucket] += 1
+        # Monta a árvore de uma vez (O(n)) em vez de n inserções
+        tree = book.tree.tree
+        for i, c in enumerate(counts, 1):
+            tree[i] += c
+            parent = i + (i & -i)
+            if parent <= book.tree.size:
+                tree[parent] += tree[i]
+        return book
+
+def main():
+    parser = argparse.ArgumentParser(description="Ratings Glicko dos jogadores em rede")
+    parser.add_argument('file', help="arquivo de ratings (server.py --ratings)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    top = sub.add_parser('top', help="os melhores jogadores")
+    top.add_argument('k', type=int, nargs='?', default=20)
+    rank = sub.add_parser('rank', help="posição e rating de um jogador")
+    rank.add_argument('name')
+    bench = sub.add_parser('bench', help="popula com jogadores sintéticos e mede as operações")
+    bench.add_argument('--players', type=int, default=200000)
+    bench.add_argument('--matches', type=int, default=1000000)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        book = RatingBook()
+        rng = random.Random(1)
+        names = [f"p{i}" for i in range(args.players)]
+        skill = {n: rng.gauss(0, 1) for n in names}
+        started = time.perf_counter()
+        for _ in range(args.matches):
+            a, b = rng.choice(names), rng.choice(names)
+            if a == b:
+                continue
+            if rng.random() < 1 / (1 + math.exp(skill[b] - skill[a])):
+                book.record(a, b)
+            else:
+                book.record(b, a)
+        elapsed = time.perf_counter() - started
+        print(f"{args.matches} partidas em {elapsed:.2f}s ({elapsed / args.matches * 1e6:.1f} us cada)")
+        started = time.perf_counter()
+        for name in names[:10000]:
+            book.rank(name)
+        print(f"rank: {(time.perf_counter() - started) / 10000 * 1e6:.1f} us")
+        started = time.perf_counter()
+        book.top(100)
+        print(f"top 100: {(time.perf_counter() - started) * 1000:.2f} ms")
+        started = time.perf_counter()
+        book.save(args.file)
+        print(f"gravação: {(time.perf_counter() - started) * 1000:.0f} ms ({os.path.getsize(args.file)} bytes)")
+        started = time.perf_counter()
+        loaded = RatingBook.load(args.file)
+        print(f"carga: {(time.perf_counter() - started) * 1000:.0f} ms")
+        assert loaded.top(100) == book.top(100)
+        return 0
+
+    book = RatingBook.load(args.file)
+    if args.command == 'top':
+        for position, (name, rating, rd, games, wins) in enumerate(book.top(args.k), 1):
+            print(f"{position:4d}. {name:24s} {rating:7.1f} ±{2 * rd:5.0f}  {wins}/{games}")
+        return 0
+    if args.name not in book.players:
+        print(f"{args.name} não tem partidas avaliadas")
+        return 1
+    rating, rd = book.rating(args.name)
+    print(f"{args.name}: {rating:.1f} ±{2 * rd:.0f}, posição {book.rank(args.name)} de {len(book.players)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
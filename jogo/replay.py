@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - replays compactos: gravação, leitura e verificação
+- Cada batalha vira algumas dezenas de bytes: configuração, semente e um
+  byte por ação (BATALHA_REPLAYS=<arquivo> no script.py, --replays no
+  server.py ou o modo `record` daqui)
+- verify: refaz cada partida pelo motor a partir das ações e confere o
+  estado final; com --rerun as partidas com semente também são jogadas de
+  novo por battle() e precisam sair idênticas byte a byte
+- show: lista as ações de uma partida
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import script
+from script import (Combatant, DICE_TYPES, REPLAY_ACTIONS, REPLAY_DICE, REPLAY_FOOTER, REPLAY_HEADER,
+                    REPLAY_KINDS, REPLAY_LENGTH, REPLAY_NETWORK, REPLAY_SEEDED, ReplayWriter,
+                    attack_damage, battle, decay_buffs, replay_items)
+
+class Replay:
+    """Um replay decodificado; `raw` guarda o registro original (com o prefixo)"""
+    __slots__ = ('flags', 'kinds', 'dice', 'protocol', 'seed', 'actions', 'winner', 'final', 'rounds', 'raw')
+
+    def __init__(self, raw):
+        payload = memoryview(raw)[REPLAY_LENGTH.size:]
+        version, self.flags, kind1, kind2, dice, major, minor, seed = REPLAY_HEADER.unpack_from(payload)
+        if version != script.REPLAY_FORMAT:
+            raise ValueError(f"formato de replay desconhecido: {version}")
+        self.kinds = (REPLAY_KINDS[kind1], REPLAY_KINDS[kind2])
+        self.dice = REPLAY_DICE[dice]
+        self.protocol = f"{major}.{minor}"
+        self.seed = seed if self.flags & REPLAY_SEEDED else None
+        self.actions = bytes(payload[REPLAY_HEADER.size:len(payload) - REPLAY_FOOTER.size])
+        self.winner, hp1, items1, hp2, items2, self.rounds = REPLAY_FOOTER.unpack_from(
+            payload, len(payload) - REPLAY_FOOTER.size)
+        self.final = (hp1, items1, hp2, items2)
+        self.raw = bytes(raw)
+
+    def steps(self):
+        """(assento, ação, valor do dado) de cada byte de ação"""
+        for byte in self.actions:
+            yield byte >> 7, REPLAY_ACTIONS[byte >> 4 & 0x7], byte & 0xF
+
+def iter_records(data, offset=0, end=None):
+    """Registros crus (prefixo incluso) de um buffer: bytes, mmap ou memoryview"""
+    end = len(data) if end is None else end
+    while offset + REPLAY_LENGTH.size <= end:
+        (size,) = REPLAY_LENGTH.unpack_from(data, offset)
+        stop = offset + REPLAY_LENGTH.size + size
+        if stop > end:
+            break  # registro incompleto no fim (gravação interrompida)
+        yield offset, data[offset:stop]
+        offset = stop
+
+def read_replays(path, chunk_size=1 << 20):
+    """Replays de um arquivo, lido em pedaços: memória constante em arquivos de qualquer tamanho"""
+    with open(path, 'rb') as f:
+        tail = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            data = tail + chunk
+            offset = 0
+            for offset, raw in iter_records(data):
+                offset += len(raw)
+                yield Replay(raw)
+            tail = data[offset:]
+
+def apply_action(actor, target, action, roll, dice):
+    """Aplica uma ação gravada com as mesmas regras do motor; devolve o dano causado
+    (0 fora de ataques) ou None se não dá para refazer"""
+    damage = 0
+    if action == 'attack':
+        damage = attack_damage(actor, target, roll, DICE_TYPES[dice])[1]
+        target.take_damage(damage)
+    elif action == 'heal':
+        actor.heal(10)
+        actor.items['cura'] -= 1
+    elif action == 'fury':
+        actor.items['fury'] -= 1
+        actor.buff_turns = 2
+    elif action == 'defend':
+        actor.defense += 1
+        actor.debuff_turns = 0
+    else:
+        return None  # item_used de um par antigo: não se sabe qual item
+    return damage
+
+def replay_steps(rep, players=None):
+    """Refaz a partida pelo motor uma ação por vez: (assento, ação, dado, dano).
+    Para na primeira ação que não dá para refazer (dano None)."""
+    players = players or (Combatant("A", rep.kinds[0], True), Combatant("B", rep.kinds[1], True))
+    network = rep.flags & REPLAY_NETWORK
+    for seat, action, roll in rep.steps():
+        actor, target = players[seat], players[1 - seat]
+        damage = apply_action(actor, target, action, roll, rep.dice)
+        yield seat, action, roll, damage
+        if damage is None:
+            return
+        if network:
+            decay_buffs(players[0])  # em rede os dois decaem a cada turno
+            decay_buffs(players[1])
+        else:
+            decay_buffs(actor)
+
+def replay_match(rep):
+    """Refaz a partida pelo motor; devolve (vencedor, estado final) ou None se não dá"""
+    players = (Combatant("A", rep.kinds[0], True), Combatant("B", rep.kinds[1], True))
+    for *_, damage in replay_steps(rep, players):
+        if damage is None:
+            return None
+    p1, p2 = players
+    winner = 0 if p1.alive() else 1
+    return winner, (p1.hp, replay_items(p1), p2.hp, replay_items(p2))
+
+class _Capture:
+    """Toma o lugar do ReplayWriter para capturar o replay de uma nova execução"""
+    def __init__(self):
+        self.parts = None
+
+    def submit(self, *parts):
+        self.parts = parts
+
+def rerun(rep):
+    """Joga de novo uma partida com semente; devolve o registro produzido"""
+    saved, capture = script.REPLAYS, _Capture()
+    script.REPLAYS = capture
+    try:
+        battle(Combatant("CPU-A", rep.kinds[0], True), Combatant("CPU-B", rep.kinds[1], True), rep.dice, rep.seed)
+    finally:
+        script.REPLAYS = saved
+    return ReplayWriter.encode(*capture.parts)
+
+def verify(rep, rerun_seeded=False):
+    """'' se o replay confere; senão o motivo"""
+    result = replay_match(rep)
+    if result is None:
+        return "ação não reproduzível (item_used)"
+    if result != (rep.winner, rep.final):
+        return f"estado final {result} difere do gravado {(rep.winner, rep.final)}"
+    if rep.rounds != (len(rep.actions) + 1) // 2:
+        return f"{rep.rounds} rounds gravados para {len(rep.actions)} ações"
+    if rerun_seeded and rep.seed is not None and rerun(rep) != rep.raw:
+        return "nova execução com a mesma semente divergiu"
+    return ''
+
+def record(path, matches, seed, dice=None):
+    """Grava `matches` batalhas CPU vs CPU com semente própria cada uma"""
+    script.set_headless(True)
+    writer = script.enable_replays(path)
+    rng = random.Random(seed)
+    for _ in range(matches):
+        kind1, kind2 = rng.choice(REPLAY_KINDS), rng.choice(REPLAY_KINDS)
+        battle(Combatant("CPU-A", kind1, True), Combatant("CPU-B", kind2, True),
+               dice or rng.choice(REPLAY_DICE), rng.getrandbits(64))
+    writer.close()
+    return writer.count
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays compactos da Batalha de Dados")
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record', help="grava batalhas CPU vs CPU com semente")
+    rec.add_argument('-n', '--matches', type=int, default=1000)
+    rec.add_argument('--seed', type=int, default=1)
+    rec.add_argument('--dice', choices=REPLAY_DICE, help="dado fixo (padrão: sorteado)")
+    rec.add_argument('-o', '--output', default='replays.bin')
+    ver = sub.add_parser('verify', help="refaz as partidas pelo motor e confere o estado final")
+    ver.add_argument('file')
+    ver.add_argument('--rerun', action='store_true', help="joga de novo as partidas com semente")
+    show = sub.add_parser('show', help="mostra as ações de uma partida")
+    show.add_argument('file')
+    show.add_argument('index', type=int, nargs='?', default=0)
+    args = parser.parse_args()
+
+    script.set_headless(True)
+    if args.command == 'record':
+        started = time.perf_counter()
+        count = record(args.output, args.matches, args.seed, args.dice)
+        print(f"{count} replays gravados em {args.output} em {time.perf_counter() - started:.2f}s")
+        return 0
+
+    if args.command == 'show':
+        for i, rep in enumerate(read_replays(args.file)):
+            if i == args.index:
+                print(f"{rep.kinds[0]} x {rep.kinds[1]}  {rep.dice}  protocolo v{rep.protocol}  "
+                      f"semente {rep.seed}  {'rede' if rep.flags & REPLAY_NETWORK else 'local'}  "
+                      f"{len(rep.raw)} bytes")
+                for seat, action, roll in rep.steps():
+                    print(f"  {rep.kinds[seat]:10s} {action}" + (f" {roll}" if action == 'attack' else ""))
+                print(f"Vencedor: {rep.kinds[rep.winner]} em {rep.rounds} rounds; estado final {rep.final}")
+                return 0
+        print(f"Não há partida {args.index} em {args.file}")
+        return 1
+
+    started = time.perf_counter()
+    total = size = failed = 0
+    for rep in read_replays(args.file):
+        total += 1
+        size += len(rep.raw)
+        reason = verify(rep, args.rerun)
+        if reason:
+            failed += 1
+            print(f"partida {total - 1}: {reason}")
+    elapsed = time.perf_counter() - started
+    print(f"{total} replays ({size / max(1, total):.1f} bytes em média), {failed} divergentes, "
+          f"{total / elapsed if elapsed else 0:.0f} replays/s")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
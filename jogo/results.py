@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - resultados das partidas em SQLite
+- Uma linha por batalha: origem (local, tournament, network), personagens,
+  dado, vencedor e rounds; BATALHA_RESULTS=<arquivo> no script.py,
+  --results no server.py e no tournament.py
+- Gravação em lote numa thread própria (WAL, uma transação por lote): a
+  partida só enfileira a tupla
+- Totais por confronto mantidos junto com cada lote, então a taxa de
+  vitória de um confronto é uma leitura de linha única
+"""
+
+import argparse
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+BATCH_SIZE = 10000   # linhas por transação
+FLUSH_INTERVAL = 1.0  # segundos até gravar um lote incompleto
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    kind1 TEXT NOT NULL,
+    kind2 TEXT NOT NULL,
+    dice TEXT NOT NULL,
+    winner INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    ended REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_matchup ON results (kind1, kind2, dice, winner);
+CREATE TABLE IF NOT EXISTS matchup_totals (
+    source TEXT NOT NULL,
+    kind1 TEXT NOT NULL,
+    kind2 TEXT NOT NULL,
+    dice TEXT NOT NULL,
+    wins1 INTEGER NOT NULL,
+    wins2 INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    PRIMARY KEY (kind1, kind2, dice, source)
+);
+"""
+
+def connect(path):
+    db = sqlite3.connect(path, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")  # em WAL, perde no máximo o último lote numa queda de energia
+    db.executescript(SCHEMA)
+    return db
+
+class ResultStore:
+    """Fila de resultados gravada em lotes por uma thread própria"""
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.source = 'local'  # origem das batalhas locais (o tournament.py troca)
+        self.queue = queue.SimpleQueue()
+        self.written = 0
+        connect(path).close()  # cria o esquema antes de aceitar leituras
+        self.thread = threading.Thread(target=self._run, name="results", daemon=True)
+        self.thread.start()
+
+    def add(self, source, kind1, kind2, dice, winner, rounds):
+        """winner: 0 se kind1 venceu, 1 se kind2 venceu"""
+        self.queue.put((source, kind1, kind2, dice, winner, rounds, time.time()))
+
+    def _run(self):
+        db = connect(self.path)
+        done = False
+        while not done:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if row is None:
+                    done = True
+                    break
+                batch.append(row)
+            if batch:
+                self._write(db, batch)
+        db.close()
+
+    def _write(self, db, batch):
+        totals = {}
+        for source, kind1, kind2, dice, winner, rounds, _ in batch:
+            key = (source, kind1, kind2, dice)
+            total = totals.get(key)
+            if total is None:
+                total = totals[key] = [0, 0, 0]
+            total[winner] += 1
+            total[2] += rounds
+        with db:  # uma transação por lote
+            db.executemany("INSERT INTO results (source, kind1, kind2, dice, winner, rounds, ended) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            db.executemany("INSERT INTO matchup_totals VALUES (?, ?, ?, ?, ?, ?, ?) "
+                           "ON CONFLICT (kind1, kind2, dice, source) DO UPDATE SET "
+                           "wins1 = wins1 + excluded.wins1, wins2 = wins2 + excluded.wins2, "
+                           "rounds = rounds + excluded.rounds",
+                           [key + tuple(total) for key, total in totals.items()])
+        self.written += len(batch)
+
+    def close(self):
+        """Grava o que falta na fila e encerra a thread"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+# ---------- Consultas ----------
+def matchup(db, kind1, kind2, dice=None, source=None):
+    """(vitórias de kind1, vitórias de kind2, média de rounds), somando os dois lados da mesa"""
+    sql = ("SELECT kind1, SUM(wins1), SUM(wins2), SUM(rounds) FROM matchup_totals "
+           "WHERE ((kind1 = ? AND kind2 = ?) OR (kind1 = ? AND kind2 = ?))")
+    params = [kind1, kind2, kind2, kind1]
+    if dice:
+        sql += " AND dice = ?"
+        params.append(dice)
+    if source:
+        sql += " AND source = ?"
+        params.append(source)
+    wins = [0, 0]
+    rounds = 0
+    for first, w1, w2, r in db.execute(sql + " GROUP BY kind1", params):
+        if first == kind1:
+            wins[0] += w1
+            wins[1] += w2
+        else:
+            wins[0] += w2
+            wins[1] += w1
+        rounds += r
+    played = wins[0] + wins[1]
+    return wins[0], wins[1], rounds / played if played else 0.0
+
+def win_rates(db, dice=None, source=None):
+    """{personagem: (vitórias, partidas)} somando todos os confrontos"""
+    sql = "SELECT kind1, kind2, SUM(wins1), SUM(wins2) FROM matchup_totals WHERE 1"
+    params = []
+    if dice:
+        sql += " AND dice = ?"
+        params.append(dice)
+    if source:
+        sql += " AND source = ?"
+        params.append(source)
+    rates = {}
+    for kind1, kind2, w1, w2 in db.execute(sql + " GROUP BY kind1, kind2", params):
+        for kind, won in ((kind1, w1), (kind2, w2)):
+            total = rates.setdefault(kind, [0, 0])
+            total[0] += won
+            total[1] += w1 + w2
+    return {kind: tuple(v) for kind, v in rates.items()}
+
+def main():
+    from script import CHARACTERS, DICE_TYPES
+    parser = argparse.ArgumentParser(description="Resultados das partidas (SQLite)")
+    parser.add_argument('database')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rates = sub.add_parser('winrates', help="taxa de vitória por personagem")
+    rates.add_argument('--dice', choices=list(DICE_TYPES.keys()))
+    rates.add_argument('--source', choices=['local', 'tournament', 'network'])
+    duel = sub.add_parser('matchup', help="vitórias de um confronto")
+    duel.add_argument('kind1', choices=list(CHARACTERS.keys()))
+    duel.add_argument('kind2', choices=list(CHARACTERS.keys()))
+    duel.add_argument('--dice', choices=list(DICE_TYPES.keys()))
+    duel.add_argument('--source', choices=['local', 'tournament', 'network'])
+    bench = sub.add_parser('bench', help="mede a vazão de gravação com resultados sintéticos")
+    bench.add_argument('-n', '--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        store = ResultStore(args.database)
+        kinds, dice = list(CHARACTERS.keys()), list(DICE_TYPES.keys())
+        rng = random.Random(1)
+        started = time.perf_counter()
+        for _ in range(args.rows):
+            store.add('tournament', rng.choice(kinds), rng.choice(kinds), rng.choice(dice),
+                      rng.getrandbits(1), rng.randint(2, 12))
+        queued = time.perf_counter() - started
+        store.close()
+        elapsed = time.perf_counter() - started
+        print(f"{args.rows} resultados: enfileirados em {queued:.2f}s, gravados em {elapsed:.2f}s "
+              f"({args.rows / elapsed * 60:,.0f} por minuto)")
+        return 0
+
+    db = connect(args.database)
+    started = time.perf_counter()
+    if args.command == 'matchup':
+        w1, w2, rounds = matchup(db, args.kind1, args.kind2, args.dice, args.source)
+        elapsed = time.perf_counter() - started
+        played = w1 + w2
+        print(f"{args.kind1} x {args.kind2}: {w1} x {w2} em {played} partidas "
+              f"({w1 / played if played else 0:.1%}), {rounds:.1f} rounds em média")
+    else:
+        rows = win_rates(db, args.dice, args.source)
+        elapsed = time.perf_counter() - started
+        for kind, (won, played) in sorted(rows.items(), key=lambda item: -item[1][0] / max(1, item[1][1])):
+            print(f"{kind:10s} {won / played if played else 0:6.1%}  ({won}/{played})")
+    print(f"consulta em {elapsed * 1000:.2f} ms")
+    db.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
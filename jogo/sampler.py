@@ -0,0 +1,134 @@
+"""
+Batalha de Dados - amostrador de pilhas de baixo custo
+- Uma thread lê as pilhas de todas as outras (sys._current_frames) em intervalos
+- O intervalo se ajusta sozinho para o custo ficar abaixo de ~1% de uma CPU
+- Agrega pilhas colapsadas numa janela deslizante (fatias de alguns segundos)
+- No Linux ignora threads bloqueadas (estado != R em /proc), mostrando só onde
+  há CPU sendo gasta: decodificação JSON, cópias de buffer em _receive_raw...
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+class StackSampler:
+    def __init__(self, interval=0.01, window=60, slot=5, max_overhead=0.01, cpu_only=None):
+        self.interval = interval          # intervalo mínimo entre amostras (s)
+        self.window = window              # janela mantida (s)
+        self.slot = slot                  # duração de cada fatia da janela (s)
+        self.max_overhead = max_overhead  # fração de CPU que a amostragem pode usar
+        if cpu_only is None:
+            cpu_only = os.path.isdir('/proc/self/task')
+        self.cpu_only = cpu_only
+        self.current_interval = interval
+        self.cost = 0.0      # custo médio de uma amostra (s)
+        self.samples = 0
+        self.slots = deque()  # (início monotônico, {pilha: amostras})
+        self.labels = {}      # code -> rótulo (cache)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.current_interval):
+            first = not self.samples  # _sample() já conta a amostra
+            started = time.perf_counter()
+            self._sample(me)
+            cost = time.perf_counter() - started
+            self.cost = cost if first else 0.9 * self.cost + 0.1 * cost
+            self.current_interval = max(self.interval, self.cost / self.max_overhead)
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            label = self.labels[code] = label.replace(';', ',')
+        return label
+
+    def _running(self, native_id):
+        """Estado do escalonador da thread (Linux); na dúvida conta como ativa"""
+        try:
+            with open(f'/proc/self/task/{native_id}/stat', 'rb') as f:
+                stat = f.read()
+            state = stat.rindex(b')') + 2  # o nome da thread pode conter espaços e parênteses
+            return stat[state:state + 1] == b'R'
+        except (OSError, ValueError):
+            return True
+
+    def _sample(self, me):
+        frames = sys._current_frames()
+        native = {t.ident: t.native_id for t in threading.enumerate()} if self.cpu_only else None
+        stacks = []
+        for ident, frame in frames.items():
+            if ident == me:
+                continue
+            if native is not None and ident in native and not self._running(native[ident]):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stacks.append(';'.join(reversed(stack)))
+        del frames
+
+        now = time.monotonic()
+        with self.lock:
+            if not self.slots or now - self.slots[-1][0] >= self.slot:
+                self.slots.append((now, {}))
+            while self.slots and self.slots[0][0] < now - self.window:
+                self.slots.popleft()
+            counts = self.slots[-1][1]
+            for stack in stacks:
+                counts[stack] = counts.get(stack, 0) + 1
+            self.samples += 1
+
+    def snapshot(self, seconds=None):
+        """Pilhas somadas das fatias dos últimos `seconds` (padrão: janela toda)"""
+        since = time.monotonic() - (seconds if seconds is not None else self.window)
+        merged = {}
+        with self.lock:
+            for start, counts in self.slots:
+                if start + self.slot < since:
+                    continue
+                for stack, n in counts.items():
+                    merged[stack] = merged.get(stack, 0) + n
+        return merged
+
+    def collapsed(self, seconds=None):
+        """Formato de pilhas colapsadas (flamegraph.pl, speedscope)"""
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.snapshot(seconds).items()))
+
+    def top(self, n=20, seconds=None):
+        """Funções mais amostradas: (rótulo, amostras próprias, amostras inclusivas)"""
+        own = {}
+        inclusive = {}
+        for stack, count in self.snapshot(seconds).items():
+            frames = stack.split(';')
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for label in set(frames):
+                inclusive[label] = inclusive.get(label, 0) + count
+        ranked = sorted(inclusive, key=lambda label: (-own.get(label, 0), -inclusive[label]))
+        return [(label, own.get(label, 0), inclusive[label]) for label in ranked[:n]]
+
+    def status(self):
+        return {
+            'samples': self.samples,
+            'interval_s': self.current_interval,
+            'sample_cost_s': self.cost,
+            'overhead': self.cost / self.current_interval if self.current_interval else 0.0,
+            'cpu_only': self.cpu_only,
+            'window_s': self.window,
+        }
@@ -17,6 +17,17 @@ import threading
 import json
 import ipaddress
 import struct
+import secrets
+import selectors
+import select
+import queue
+import errno
+import concurrent.futures
+import bisect
+import itertools
+import http.server
+import atexit
+from collections import deque
 from enum import Enum
 
 colorama.init()
@@ -26,6 +37,15 @@ DEFAULT_PORT = 12345
 BUFFER_SIZE = 4096
 PROTOCOL_VERSION = "1.0"
 MESSAGE_HEADER_SIZE = 8
+SESSION_GRACE_PERIOD = 30  # segundos para o cliente reconectar e retomar a partida
+SPECTATOR_PORT_OFFSET = 1  # espectadores usam a porta do jogo + 1
+SPECTATOR_MAX_BACKLOG = 64 * 1024  # bytes pendentes antes de cair para keyframe
+CONNECT_TIMEOUT = 10         # segundos para estabelecer a conexão TCP
+HAPPY_EYEBALLS_DELAY = 0.25  # intervalo entre tentativas paralelas (RFC 8305)
+DNS_CACHE_TTL = 300          # segundos que uma resolução de nome fica em cache
+DNS_CACHE_SIZE = 64          # entradas no cache de nomes; as mais antigas saem primeiro
+HEARTBEAT_INTERVAL = 5       # segundos entre HEARTBEATs da thread de recepção
+HEARTBEAT_TIMEOUT = 30       # segundos sem nenhum frame antes de declarar a conexão perdida
 
 # ---------- Protocolo de Camada de Aplicação ----------
 class MessageType(Enum):
@@ -41,8 +61,12 @@ class MessageType(Enum):
 
 class GameProtocol:
     @staticmethod
-    def encode_message(msg_type, data):
-        """Codifica mensagem no protocolo de aplicação"""
+    def encode_message(msg_type, data, trace=None):
+        """Codifica mensagem no protocolo de aplicação.
+        
+        Com `trace`, o envelope leva o id de rastreamento e o relógio
+        monotônico do remetente no início da serialização ('mono').
+        """
         try:
             message = {
                 'type': msg_type.value,
@@ -50,6 +74,9 @@ class GameProtocol:
                 'timestamp': time.time(),
                 'version': PROTOCOL_VERSION
             }
+            if trace is not None:
+                message['trace'] = trace
+                message['mono'] = time.monotonic()
             
             json_data = json.dumps(message)
             data_bytes = json_data.encode('utf-8')
@@ -61,7 +88,7 @@ class GameProtocol:
             return header + data_bytes
             
         except Exception as e:
-            print(color(f"Erro ao codificar mensagem: {e}", C.RED))
+            notify(f"Erro ao codificar mensagem: {e}", C.RED)
             return b""
     
     @staticmethod
@@ -85,18 +112,35 @@ class GameProtocol:
                 'type': MessageType(parsed['type']),
                 'data': parsed['data'],
                 'timestamp': parsed['timestamp'],
-                'version': parsed['version']
+                'version': parsed['version'],
+                'trace': parsed.get('trace'),
+                'mono': parsed.get('mono')
             }
             
         except Exception as e:
-            print(color(f"Erro ao decodificar mensagem: {e}", C.RED))
+            notify(f"Erro ao decodificar mensagem: {e}", C.RED)
             return None
 
 # ---------- Utilitários ----------
+HEADLESS = False  # sem interface: servidor dedicado, bots e benchmarks
+
+def set_headless(enabled=True):
+    """Desliga telas, animações e pausas para rodar partidas sem interface"""
+    global HEADLESS
+    HEADLESS = enabled
+
 def clear():
+    if HEADLESS:
+        return
     os.system('cls' if os.name == 'nt' else 'clear')
 
+def pause(seconds):
+    if not HEADLESS:
+        time.sleep(seconds)
+
 def slowprint(text, delay=0.008):
+    if HEADLESS:
+        return
     for c in text:
         sys.stdout.write(c)
         sys.stdout.flush()
@@ -118,6 +162,13 @@ class C:
 def color(text, col):
     return f"{col}{text}{C.RESET}"
 
+def notify(text, col):
+    """Mensagem de status; no modo headless só os erros aparecem (em stderr)"""
+    if not HEADLESS:
+        print(color(text, col))
+    elif col == C.RED:
+        print(text, file=sys.stderr)
+
 # ---------- Game Data ----------
 CHARACTERS = {
     'Guerreiro': {'hp': 28, 'atk': 5, 'def': 2, 'desc': 'Equilibrado: dano e defesa.'},
@@ -131,6 +182,474 @@ DICE_TYPES = {
     'd10': 10
 }
 
+# ---------- Métricas ----------
+METRICS = None  # instância de Metrics quando habilitado; None = custo quase zero
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CODEC_BUCKETS = (5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2)
+
+METRIC_FAMILIES = {
+    'batalha_messages_sent_total': ('counter', 'Mensagens enviadas por tipo'),
+    'batalha_messages_received_total': ('counter', 'Mensagens recebidas por tipo'),
+    'batalha_bytes_sent_total': ('counter', 'Bytes enviados por tipo de mensagem'),
+    'batalha_bytes_received_total': ('counter', 'Bytes recebidos por tipo de mensagem'),
+    'batalha_encode_seconds': ('histogram', 'Tempo de encode_message por tipo'),
+    'batalha_decode_seconds': ('histogram', 'Tempo de decode_message por tipo'),
+    'batalha_decode_errors_total': ('counter', 'Frames que não puderam ser decodificados'),
+    'batalha_socket_reads_total': ('counter', 'Chamadas recv/recvfrom feitas por _receive_raw'),
+    'batalha_receive_buffer_bytes': ('gauge', 'Bytes restantes no buffer após o último frame'),
+    'batalha_turn_wait_seconds': ('histogram', 'Espera pela jogada do oponente em network_battle'),
+    'batalha_active_matches': ('gauge', 'Batalhas em rede em andamento'),
+    'batalha_matches_total': ('counter', 'Batalhas em rede encerradas por resultado'),
+    'batalha_rounds_total': ('counter', 'Rounds jogados em batalhas em rede'),
+    'batalha_disconnects_total': ('counter', 'Quedas de conexão durante batalhas'),
+    'batalha_resumes_total': ('counter', 'Sessões retomadas após queda'),
+}
+
+class Metrics:
+    """Contadores, gauges e histogramas expostos no formato texto do Prometheus"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}      # (nome, labels) -> valor
+        self.histograms = {}  # (nome, labels) -> [contagens por bucket, soma, total]
+        self.buckets = {
+            'batalha_encode_seconds': CODEC_BUCKETS,
+            'batalha_decode_seconds': CODEC_BUCKETS,
+            'batalha_turn_wait_seconds': LATENCY_BUCKETS,
+        }
+        
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+            
+    def set(self, name, value, labels=()):
+        with self.lock:
+            self.values[(name, labels)] = value
+            
+    def observe(self, name, value, labels=()):
+        bounds = self.buckets[name]
+        key = (name, labels)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [[0] * (len(bounds) + 1), 0.0, 0]
+            hist[0][bisect.bisect_left(bounds, value)] += 1
+            hist[1] += value
+            hist[2] += 1
+    
+    def render(self):
+        """Exposição no formato texto do Prometheus (versão 0.0.4)"""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+            
+        with self.lock:
+            values = dict(self.values)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self.histograms.items()}
+        lines = []
+        for name, (kind, help_text) in METRIC_FAMILIES.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'histogram':
+                bounds = self.buckets[name]
+                for (hname, labels), (counts, total, count) in sorted(histograms.items()):
+                    if hname != name:
+                        continue
+                    cumulative = 0
+                    for bound, n in zip(bounds, counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{fmt_labels(labels, [('le', repr(float(bound)))])} {cumulative}")
+                    lines.append(f"{name}_bucket{fmt_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {total}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {count}")
+            else:
+                for (vname, labels), value in sorted(values.items()):
+                    if vname == name:
+                        lines.append(f"{name}{fmt_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics' or METRICS is None:
+            self.send_error(404)
+            return
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def log_message(self, format, *args):
+        pass
+
+def enable_metrics(port=None, host='127.0.0.1'):
+    """Liga a coleta de métricas e, se `port` for dado, serve /metrics via HTTP local"""
+    global METRICS
+    if METRICS is None:
+        METRICS = Metrics()
+    if port is not None:
+        httpd = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+        notify(f"Métricas em http://{host}:{httpd.server_address[1]}/metrics", C.CYAN)
+        return httpd
+    return None
+
+def _type_label(msg_type):
+    return (('type', msg_type.name),)
+
+# ---------- Rastreamento de Latência ----------
+TRACER = None  # instância de Tracer quando habilitado
+
+class Tracer:
+    """Grava um evento JSON por linha para cada mensagem enviada e consumida.
+    
+    send: serialize (encode) e send (sendall) no remetente.
+    recv: transit (do início da serialização no par até o frame completo
+    aqui, já corrigido pelo deslocamento de relógio), decode e queue (da
+    decodificação até a aplicação consumir a mensagem).
+    O tracing.py junta os dois lados pelo id e separa o tempo de fio.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        
+    def record(self, event, **fields):
+        fields['ev'] = event
+        fields['host'] = self.host
+        fields['pid'] = self.pid
+        line = json.dumps(fields) + "\n"
+        with self.lock:
+            self.file.write(line)
+            
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+            
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def enable_tracing(path):
+    """Passa a gravar o rastreamento por mensagem em `path` (JSON Lines)"""
+    global TRACER
+    if TRACER is None:
+        TRACER = Tracer(path)
+    return TRACER
+
+class ClockSync:
+    """Deslocamento entre o relógio monotônico do par e o nosso, estilo NTP.
+    
+    Cada troca ping/pong fornece t0 (ping enviado), t1 (ping recebido no
+    par), t2 (pong enviado pelo par) e t3 (pong recebido). Das últimas
+    amostras vale a de menor RTT, que tem a menor incerteza (±RTT/2).
+    """
+    def __init__(self, window=8):
+        self.samples = deque(maxlen=window)
+        self.offset = None  # relógio do par - relógio local
+        self.rtt = None
+        
+    def update(self, t0, t1, t2, t3):
+        rtt = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        self.samples.append((rtt, offset))
+        self.rtt, self.offset = min(self.samples)
+        return rtt
+        
+    def to_local(self, peer_time):
+        if self.offset is None:
+            return None
+        return peer_time - self.offset
+
+# ---------- Captura de Frames ----------
+CAPTURE = None  # instância de Capture quando habilitada
+CAPTURE_MAGIC = b'BDCP'
+CAPTURE_VERSION = 2
+CAPTURE_HEADER = struct.Struct('<4sHddQ')  # magic, versão, relógio de parede e monotônico na abertura, execução
+CAPTURE_RECORD = struct.Struct('<BIdI')   # direção, conexão, monotônico, bytes do frame
+CAPTURE_IN, CAPTURE_OUT = 0, 1
+_connection_ids = itertools.count(1)
+
+class Capture:
+    """Grava cada frame enviado e recebido (cru, com cabeçalho) para análise
+    e replay offline (capture.py).
+    
+    Cada registro leva a direção, o id da conexão no processo e o relógio
+    monotônico do momento em que o frame saiu ou ficou completo. Passando
+    de `max_bytes` o arquivo gira como um log: path -> path.1 -> ... ->
+    path.<backups>, e o mais antigo é descartado. Um arquivo que já existe
+    gira na abertura, e o cabeçalho de cada arquivo leva o id aleatório da
+    execução: os ids de conexão recomeçam em 1 a cada processo, então o
+    leitor separa as conexões por (execução, conexão).
+    """
+    def __init__(self, path, max_bytes=64 << 20, backups=4):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.run_id = int.from_bytes(os.urandom(8), 'little')
+        self.lock = threading.Lock()
+        self.file = None
+        if os.path.exists(path) and os.path.getsize(path):
+            self._shift()
+        self._open()
+        
+    def _open(self):
+        self.file = open(self.path, 'wb')
+        self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, time.time(), time.monotonic(),
+                                            self.run_id))
+            
+    def _rotate(self):
+        self.file.close()
+        self._shift()
+        self._open()
+
+    def _shift(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        
+    def record(self, direction, conn, frame):
+        now = time.monotonic()
+        with self.lock:
+            self.file.write(CAPTURE_RECORD.pack(direction, conn, now, len(frame)))
+            self.file.write(frame)
+            if self.file.tell() >= self.max_bytes:
+                self._rotate()
+                
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def enable_capture(path, max_bytes=64 << 20, backups=4):
+    """Passa a gravar todos os frames de AdvancedNetwork em `path` (capture.py lê)"""
+    global CAPTURE
+    if CAPTURE is None:
+        CAPTURE = Capture(path, max_bytes, backups)
+        atexit.register(CAPTURE.close)
+    return CAPTURE
+
+# ---------- Replays ----------
+REPLAYS = None  # instância de ReplayWriter quando habilitado
+
+# Cada replay é um registro de tamanho prefixado (u16) num arquivo só de acréscimo:
+#   cabeçalho: versão do formato, flags, personagens, dado, versão do protocolo e semente
+#   uma ação por byte: assento (bit 7), ação (bits 4-6) e valor do dado (bits 0-3)
+#   rodapé: assento vencedor, HP e itens finais de cada lado e número de rounds
+REPLAY_FORMAT = 1
+REPLAY_LENGTH = struct.Struct('<H')
+REPLAY_HEADER = struct.Struct('<BBBBBBBQ')
+REPLAY_FOOTER = struct.Struct('<BBBBBH')
+REPLAY_NETWORK = 0x01   # regras da partida em rede (buffs decaem para os dois a cada turno)
+REPLAY_SEEDED = 0x02    # a semente reproduz a partida inteira com battle(..., seed=)
+REPLAY_RESUMED = 0x04   # houve retomada de sessão: o estado pode ter sido corrigido pelo host
+REPLAY_ACTIONS = ('attack', 'heal', 'fury', 'defend', 'item_used')
+REPLAY_KINDS = list(CHARACTERS.keys())
+REPLAY_DICE = list(DICE_TYPES.keys())
+
+def replay_action(seat, action, roll=0):
+    """Um byte por ação; seat 0/1 na perspectiva do host (ou de p1 na partida local)"""
+    return seat << 7 | REPLAY_ACTIONS.index(action) << 4 | roll
+
+def replay_items(p):
+    return p.items['cura'] << 1 | p.items['fury']
+
+class ReplayWriter:
+    """Grava replays em segundo plano: a partida só enfileira as partes cruas.
+    
+    O empacotamento e a escrita ficam na thread do gravador, então battle()
+    e network_battle() não esperam disco nem struct.pack.
+    """
+    def __init__(self, path):
+        self.path = path
+        if os.path.isdir(path):
+            import archive  # diretório: arquivo segmentado com índice (archive.py)
+            self.file = archive.Archive(path).start_compactor()
+        else:
+            self.file = open(path, 'ab')
+        self.queue = queue.SimpleQueue()
+        self.count = 0
+        self.thread = threading.Thread(target=self._run, name="replays", daemon=True)
+        self.thread.start()
+        
+    def submit(self, flags, kinds, dice, seed, actions, winner, final, rounds):
+        self.queue.put((flags, kinds, dice, seed, actions, winner, final, rounds))
+        
+    @staticmethod
+    def encode(flags, kinds, dice, seed, actions, winner, final, rounds):
+        major, _, minor = PROTOCOL_VERSION.partition('.')
+        header = REPLAY_HEADER.pack(REPLAY_FORMAT, flags, REPLAY_KINDS.index(kinds[0]),
+                                    REPLAY_KINDS.index(kinds[1]), REPLAY_DICE.index(dice),
+                                    int(major), int(minor or 0), seed or 0)
+        footer = REPLAY_FOOTER.pack(winner, *final, rounds)
+        payload = header + bytes(actions) + footer
+        return REPLAY_LENGTH.pack(len(payload)) + payload
+        
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self.file.write(self.encode(*item))
+            self.count += 1
+            if self.queue.empty():
+                self.file.flush()
+        self.file.close()
+        
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+def enable_replays(path):
+    """Passa a gravar um replay compacto por batalha em `path` (arquivo ou diretório do archive.py)"""
+    global REPLAYS
+    if REPLAYS is None:
+        REPLAYS = ReplayWriter(path)
+        atexit.register(REPLAYS.close)
+    return REPLAYS
+
+# ---------- Resultados ----------
+RESULTS = None  # instância de results.ResultStore quando habilitado
+
+def enable_results(path):
+    """Passa a guardar o resultado de cada batalha no SQLite em `path` (results.py)"""
+    global RESULTS
+    if RESULTS is None:
+        import results
+        RESULTS = results.ResultStore(path)
+        atexit.register(RESULTS.close)
+    return RESULTS
+
+# ---------- Resolução de Endereços ----------
+_dns_cache = {}
+_dns_lock = threading.Lock()
+_resolver = None
+
+def resolve_async(host, port, use_tcp=True):
+    """Inicia (ou reaproveita do cache) a resolução de nome em segundo plano.
+    
+    Retorna um Future com o resultado de getaddrinfo; chamar cedo (enquanto
+    o jogador ainda está nos menus) esconde a latência do DNS.
+    """
+    global _resolver
+    socktype = socket.SOCK_STREAM if use_tcp else socket.SOCK_DGRAM
+    key = (host, port, socktype)
+    now = time.monotonic()
+    with _dns_lock:
+        entry = _dns_cache.get(key)
+        if entry:
+            expires, future = entry
+            failed = future.done() and future.exception() is not None
+            if expires > now and not failed:
+                return future
+        if _resolver is None:
+            _resolver = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="dns")
+        future = _resolver.submit(socket.getaddrinfo, host, port, 0, socktype)
+        _dns_cache.pop(key, None)
+        _dns_cache[key] = (now + DNS_CACHE_TTL, future)
+        # Cada porta é uma entrada: sem limite, o cache cresce a cada partida nova
+        while len(_dns_cache) > DNS_CACHE_SIZE:
+            del _dns_cache[next(iter(_dns_cache))]
+        return future
+
+def interleave_families(infos):
+    """Alterna IPv6/IPv4 mantendo a preferência da primeira família (RFC 8305)"""
+    if not infos:
+        return []
+    first = infos[0][0]
+    preferred = [i for i in infos if i[0] == first]
+    others = [i for i in infos if i[0] != first]
+    result = []
+    while preferred or others:
+        if preferred:
+            result.append(preferred.pop(0))
+        if others:
+            result.append(others.pop(0))
+    return result
+
+_CONNECT_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN,
+                        getattr(errno, 'WSAEWOULDBLOCK', 10035))
+
+def happy_eyeballs_connect(host, port, timeout=CONNECT_TIMEOUT, delay=HAPPY_EYEBALLS_DELAY):
+    """Conecta via TCP disparando tentativas escalonadas entre os endereços
+    resolvidos; a primeira a completar vence e as demais são canceladas."""
+    deadline = time.monotonic() + timeout
+    infos = resolve_async(host, port).result(timeout=timeout)
+    addrs = interleave_families(infos)
+    selector = selectors.DefaultSelector()
+    pending = []
+    last_error = None
+    next_attempt = time.monotonic()
+    try:
+        while True:
+            now = time.monotonic()
+            if addrs and (now >= next_attempt or not pending):
+                family, socktype, proto, _, sockaddr = addrs.pop(0)
+                sock = None
+                try:
+                    sock = socket.socket(family, socktype, proto)
+                    sock.setblocking(False)
+                    err = sock.connect_ex(sockaddr)
+                    if err not in _CONNECT_IN_PROGRESS:
+                        raise OSError(err, os.strerror(err))
+                    selector.register(sock, selectors.EVENT_WRITE, sockaddr)
+                    pending.append(sock)
+                    next_attempt = now + delay
+                except OSError as e:
+                    last_error = e
+                    if sock:
+                        sock.close()
+                continue
+                
+            if not pending:
+                raise last_error or OSError(f"Nenhum endereço para {host}")
+            if now >= deadline:
+                raise socket.timeout(f"Tempo de conexão esgotado ({timeout}s)")
+                
+            wait = deadline - now
+            if addrs:
+                wait = min(wait, max(0, next_attempt - now))
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                selector.unregister(sock)
+                pending.remove(sock)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    sock.setblocking(True)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # turnos são mensagens pequenas
+                    return sock, key.data
+                sock.close()
+                last_error = OSError(err, os.strerror(err))
+                next_attempt = time.monotonic()  # falhou: próxima tentativa imediata
+    finally:
+        for sock in pending:
+            sock.close()
+        selector.close()
+
+def listen_family(host):
+    """Escolhe família para escutar; host vazio usa um socket IPv6 dual-stack"""
+    if not host:
+        if socket.has_dualstack_ipv6():
+            return socket.AF_INET6, "::", True
+        return socket.AF_INET, "0.0.0.0", False
+    try:
+        if ipaddress.ip_address(host).version == 6:
+            return socket.AF_INET6, host, False
+    except ValueError:
+        pass
+    return socket.AF_INET, host, False
+
 # ---------- Rede Aprimorada ----------
 class AdvancedNetwork:
     def __init__(self):
@@ -139,6 +658,21 @@ class AdvancedNetwork:
         self.is_tcp = True
         self.peer_addr = None
         self.buffer = b""
+        self.listener = None       # socket de escuta mantido pelo host (TCP)
+        self.server_addr = None    # endereço usado pelo cliente para reconectar
+        self.session_token = None  # token da sessão emitido no handshake
+        self.last_state = None     # último GAME_STATE autoritativo (host)
+        self.resumed = False
+        self.role = 'player'       # 'player' ou 'spectator'
+        self.player = None         # nome do jogador no ranking (cliente); o do par no servidor
+        self.spectators = None     # SpectatorHub do host, se habilitado
+        self.receiver = None       # MessageReceiver (thread de E/S), se habilitado
+        self.background = False
+        self.send_lock = threading.Lock()
+        self.clock = ClockSync()
+        self.trace_prefix = secrets.token_hex(4)  # ids de rastreamento: <prefixo>:<sequência>
+        self.trace_ids = itertools.count(1)
+        self.conn_id = next(_connection_ids)  # identifica a conexão na captura
         
     def is_ipv6_address(self, addr):
         try:
@@ -151,49 +685,53 @@ class AdvancedNetwork:
         """Cria servidor com protocolo cliente-servidor"""
         self.is_tcp = use_tcp
         try:
-            # Escolher família de endereços (IPv4 ou IPv6)
-            if host and self.is_ipv6_address(host):
-                family = socket.AF_INET6
-                if not host: host = "::"
-            else:
-                family = socket.AF_INET
-                if not host: host = "0.0.0.0"
+            # Escolher família de endereços (vazio = IPv6 dual-stack, aceita IPv4 também)
+            family, host, dualstack = listen_family(host)
+            families = "IPv4 + IPv6" if dualstack else ("IPv6" if family == socket.AF_INET6 else "IPv4")
                 
             # Criar socket
             if use_tcp:
                 self.socket = socket.socket(family, socket.SOCK_STREAM)
                 self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                if dualstack:
+                    self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
                 self.socket.bind((host, port))
                 self.socket.listen(1)
-                print(color(f"Servidor TCP criado em {host}:{port}", C.GREEN))
+                notify(f"Servidor TCP criado em {host}:{port} ({families})", C.GREEN)
             else:
                 self.socket = socket.socket(family, socket.SOCK_DGRAM)
+                if dualstack:
+                    self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
                 self.socket.bind((host, port))
-                print(color(f"Servidor UDP criado em {host}:{port}", C.GREEN))
+                notify(f"Servidor UDP criado em {host}:{port} ({families})", C.GREEN)
                 
             return True
         except Exception as e:
-            print(color(f"Erro ao criar servidor: {e}", C.RED))
+            notify(f"Erro ao criar servidor: {e}", C.RED)
             return False
     
     def wait_connection(self):
         """Aguarda conexão com handshake do protocolo"""
         try:
             if self.is_tcp:
-                print(color("Aguardando conexão TCP...", C.YELLOW))
-                client_sock, addr = self.socket.accept()
+                notify("Aguardando conexão TCP...", C.YELLOW)
+                self.listener = self.socket
+                client_sock, addr = self.listener.accept()
+                client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 self.socket = client_sock
                 self.peer_addr = addr
-                print(color(f"Cliente conectado: {addr[0]}:{addr[1]}", C.GREEN))
+                notify(f"Cliente conectado: {addr[0]}:{addr[1]}", C.GREEN)
                 
                 # Handshake do protocolo
                 return self._perform_handshake_server()
                 
             else:
-                print(color("Aguardando primeira mensagem UDP...", C.YELLOW))
+                notify("Aguardando primeira mensagem UDP...", C.YELLOW)
                 data, addr = self.socket.recvfrom(BUFFER_SIZE)
                 self.peer_addr = addr
-                print(color(f"Cliente UDP: {addr[0]}:{addr[1]}", C.GREEN))
+                notify(f"Cliente UDP: {addr[0]}:{addr[1]}", C.GREEN)
+                if CAPTURE is not None:
+                    CAPTURE.record(CAPTURE_IN, self.conn_id, data)
                 
                 # Processar handshake UDP
                 msg = GameProtocol.decode_message(data)
@@ -205,36 +743,35 @@ class AdvancedNetwork:
                         {'version': PROTOCOL_VERSION, 'status': 'accepted'}
                     )
                     self.socket.sendto(response, addr)
+                    if CAPTURE is not None:
+                        CAPTURE.record(CAPTURE_OUT, self.conn_id, response)
                     return True
                     
         except Exception as e:
-            print(color(f"Erro na conexão: {e}", C.RED))
+            notify(f"Erro na conexão: {e}", C.RED)
             return False
     
     def connect_to_server(self, host, port, use_tcp=True):
         """Conecta ao servidor com handshake do protocolo"""
         self.is_tcp = use_tcp
         try:
-            # Escolher família
-            if self.is_ipv6_address(host):
-                family = socket.AF_INET6
-            else:
-                family = socket.AF_INET
-                
+            self.server_addr = (host, port)
             if use_tcp:
-                self.socket = socket.socket(family, socket.SOCK_STREAM)
-                self.socket.connect((host, port))
-                print(color(f"Conectado via TCP: {host}:{port}", C.GREEN))
+                # Tentativas paralelas em todos os endereços resolvidos (IPv6 e IPv4)
+                self.socket, sockaddr = happy_eyeballs_connect(host, port)
+                notify(f"Conectado via TCP: {sockaddr[0]}:{sockaddr[1]}", C.GREEN)
             else:
-                self.socket = socket.socket(family, socket.SOCK_DGRAM)
-                self.peer_addr = (host, port)
-                print(color(f"Conectado via UDP: {host}:{port}", C.GREEN))
+                infos = resolve_async(host, port, use_tcp=False).result(timeout=CONNECT_TIMEOUT)
+                family, socktype, proto, _, sockaddr = infos[0]
+                self.socket = socket.socket(family, socktype, proto)
+                self.peer_addr = sockaddr
+                notify(f"Conectado via UDP: {sockaddr[0]}:{sockaddr[1]}", C.GREEN)
                 
             # Handshake do protocolo
             return self._perform_handshake_client()
             
         except Exception as e:
-            print(color(f"Erro na conexão: {e}", C.RED))
+            notify(f"Erro na conexão: {e}", C.RED)
             return False
     
     def _perform_handshake_server(self):
@@ -250,14 +787,32 @@ class AdvancedNetwork:
                 return False
                 
             client_version = msg['data'].get('version', '0.0')
-            print(color(f"Handshake recebido (versão {client_version})", C.CYAN))
+            notify(f"Handshake recebido (versão {client_version})", C.CYAN)
+            self.player = msg['data'].get('player')
+            
+            # Sessão: novo token ou retomada de uma partida em andamento
+            resume_token = msg['data'].get('resume')
+            if msg['data'].get('role', 'player') != 'player':
+                # Espectadores usam a porta própria (SpectatorHub)
+                status = 'rejected'
+            elif resume_token:
+                accepted = (self.session_token is not None and self.last_state is not None
+                            and secrets.compare_digest(resume_token, self.session_token))
+                status = 'resumed' if accepted else 'rejected'
+            elif self.session_token is not None:
+                # Partida em andamento: não aceita um novo cliente no lugar do atual
+                status = 'rejected'
+            else:
+                self.session_token = secrets.token_hex(16)
+                status = 'accepted'
             
             # Responder handshake
             response = GameProtocol.encode_message(
                 MessageType.HANDSHAKE,
                 {
                     'version': PROTOCOL_VERSION,
-                    'status': 'accepted',
+                    'status': status,
+                    'session': self.session_token if status != 'rejected' else None,
                     'server_info': 'Batalha de Dados Server'
                 }
             )
@@ -266,31 +821,43 @@ class AdvancedNetwork:
                 self.socket.sendall(response)
             else:
                 self.socket.sendto(response, self.peer_addr)
+            if CAPTURE is not None:
+                CAPTURE.record(CAPTURE_OUT, self.conn_id, response)
+                
+            if status == 'rejected':
+                notify("Handshake rejeitado (sessão inválida)", C.RED)
+                return False
                 
             self.connected = True
-            print(color("Handshake concluído!", C.GREEN))
+            self.resumed = status == 'resumed'
+            notify("Handshake concluído!", C.GREEN)
             return True
             
         except Exception as e:
-            print(color(f"Erro no handshake: {e}", C.RED))
+            notify(f"Erro no handshake: {e}", C.RED)
             return False
     
-    def _perform_handshake_client(self):
+    def _perform_handshake_client(self, resume_token=None):
         """Handshake do cliente usando protocolo de aplicação"""
         try:
             # Enviar handshake
-            handshake = GameProtocol.encode_message(
-                MessageType.HANDSHAKE,
-                {
-                    'version': PROTOCOL_VERSION,
-                    'client_info': 'Batalha de Dados Client'
-                }
-            )
+            handshake_data = {
+                'version': PROTOCOL_VERSION,
+                'client_info': 'Batalha de Dados Client',
+                'role': self.role
+            }
+            if resume_token:
+                handshake_data['resume'] = resume_token
+            if self.player:
+                handshake_data['player'] = self.player
+            handshake = GameProtocol.encode_message(MessageType.HANDSHAKE, handshake_data)
             
             if self.is_tcp:
                 self.socket.sendall(handshake)
             else:
                 self.socket.sendto(handshake, self.peer_addr)
+            if CAPTURE is not None:
+                CAPTURE.record(CAPTURE_OUT, self.conn_id, handshake)
                 
             # Receber resposta
             data = self._receive_raw()
@@ -301,17 +868,20 @@ class AdvancedNetwork:
             if not response or response['type'] != MessageType.HANDSHAKE:
                 return False
                 
-            if response['data'].get('status') != 'accepted':
-                print(color("Handshake rejeitado pelo servidor", C.RED))
+            status = response['data'].get('status')
+            if status not in ('accepted', 'resumed'):
+                notify("Handshake rejeitado pelo servidor", C.RED)
                 return False
                 
             self.connected = True
+            self.resumed = status == 'resumed'
+            self.session_token = response['data'].get('session')
             server_version = response['data'].get('version', '0.0')
-            print(color(f"Handshake aceito (servidor v{server_version})", C.GREEN))
+            notify(f"Handshake aceito (servidor v{server_version})", C.GREEN)
             return True
             
         except Exception as e:
-            print(color(f"Erro no handshake: {e}", C.RED))
+            notify(f"Erro no handshake: {e}", C.RED)
             return False
     
     def send_message(self, msg_type, data):
@@ -320,24 +890,115 @@ class AdvancedNetwork:
             return False
             
         try:
-            message = GameProtocol.encode_message(msg_type, data)
+            trace = f"{self.trace_prefix}:{next(self.trace_ids)}"
+            metrics = METRICS
+            tracer = TRACER
+            if metrics is None and tracer is None:
+                message = GameProtocol.encode_message(msg_type, data, trace)
+            else:
+                started = time.monotonic()
+                message = GameProtocol.encode_message(msg_type, data, trace)
+                encoded = time.monotonic()
+                if metrics is not None:
+                    metrics.observe('batalha_encode_seconds', encoded - started, _type_label(msg_type))
             if not message:
                 return False
                 
-            if self.is_tcp:
-                self.socket.sendall(message)
-            else:
-                self.socket.sendto(message, self.peer_addr)
+            # A thread de recepção também envia (HEARTBEAT): serializar escritas
+            with self.send_lock:
+                if self.is_tcp:
+                    self.socket.sendall(message)
+                else:
+                    self.socket.sendto(message, self.peer_addr)
+            if CAPTURE is not None:
+                CAPTURE.record(CAPTURE_OUT, self.conn_id, message)
+            
+            if tracer is not None:
+                tracer.record('send', trace=trace, type=msg_type.name, mono=started,
+                              serialize=encoded - started, send=time.monotonic() - encoded,
+                              bytes=len(message), round=data.get('round') if isinstance(data, dict) else None)
+            
+            if metrics is not None:
+                metrics.inc('batalha_messages_sent_total', _type_label(msg_type))
+                metrics.inc('batalha_bytes_sent_total', _type_label(msg_type), len(message))
+                
+            if self.spectators and msg_type in SPECTATOR_MESSAGES:
+                # Mesmo buffer já codificado vai para todos os espectadores
+                if msg_type == MessageType.GAME_STATE:
+                    self.spectators.update_state(data, message)
+                else:
+                    self.spectators.publish(message)
                 
             return True
             
         except Exception as e:
-            print(color(f"Erro ao enviar: {e}", C.RED))
+            notify(f"Erro ao enviar: {e}", C.RED)
             self.connected = False
             return False
     
-    def receive_message(self):
+    def receive_message(self, timeout=None):
         """Recebe mensagem usando protocolo de aplicação"""
+        if self.receiver is not None:
+            msg = self.receiver.get(timeout)
+        else:
+            msg = self._read_message()
+        if msg and TRACER is not None:
+            self.trace_received(msg)
+        return msg
+    
+    def poll_message(self):
+        """Retorna uma mensagem já recebida em segundo plano, sem bloquear"""
+        if self.receiver is None:
+            return None
+        msg = self.receiver.poll()
+        if msg and TRACER is not None:
+            self.trace_received(msg)
+        return msg
+    
+    def trace_received(self, msg):
+        """Registra os tempos de uma mensagem no momento em que é consumida"""
+        tracer = TRACER
+        if tracer is None or 'received' not in msg:
+            return
+        now = time.monotonic()
+        sent = self.clock.to_local(msg['mono']) if msg.get('mono') is not None else None
+        data = msg['data']
+        tracer.record('recv', trace=msg.get('trace'), type=msg['type'].name,
+                      peer_mono=msg.get('mono'), received=msg['received'],
+                      transit=msg['received'] - sent if sent is not None else None,
+                      decode=msg['decode'], queue=now - msg['decoded'],
+                      offset=self.clock.offset, rtt=self.clock.rtt,
+                      round=data.get('round') if isinstance(data, dict) else None)
+    
+    def answer_ping(self, msg):
+        """Responde um ping com os carimbos t1 (recebido) e t2 (enviado) do NTP"""
+        received = msg.get('received') or time.monotonic()
+        self.send_message(MessageType.HEARTBEAT, {
+            'pong': msg['data']['ping'], 'recv': received, 'sent': time.monotonic()
+        })
+    
+    def handle_pong(self, msg):
+        """Atualiza a sincronização de relógio; devolve o RTT medido"""
+        data = msg['data']
+        now = msg.get('received') or time.monotonic()
+        if 'recv' in data and 'sent' in data:
+            return self.clock.update(data['pong'], data['recv'], data['sent'], now)
+        return now - data['pong']  # par antigo: só o RTT
+    
+    def start_receiver(self):
+        """Passa a drenar o socket numa thread de E/S (modo interativo)"""
+        self.background = True
+        self.receiver = MessageReceiver(self)
+        self.receiver.start()
+    
+    def _has_buffered_frame(self):
+        if len(self.buffer) < MESSAGE_HEADER_SIZE:
+            return False
+        data_size = struct.unpack('!I', self.buffer[:4])[0]
+        return len(self.buffer) >= MESSAGE_HEADER_SIZE + data_size
+    
+    def _read_message(self):
+        """Lê e decodifica um frame diretamente do socket"""
         if not self.connected:
             return None
             
@@ -346,20 +1007,44 @@ class AdvancedNetwork:
             if not data:
                 return None
                 
-            return GameProtocol.decode_message(data)
+            metrics = METRICS
+            if metrics is None and TRACER is None:
+                msg = GameProtocol.decode_message(data)
+            else:
+                started = time.monotonic()
+                msg = GameProtocol.decode_message(data)
+                decoded = time.monotonic()
+                elapsed = decoded - started
+                if msg:
+                    msg['received'] = started
+                    msg['decode'] = elapsed
+                    msg['decoded'] = decoded
+                if metrics is not None and msg:
+                    labels = _type_label(msg['type'])
+                    metrics.observe('batalha_decode_seconds', elapsed, labels)
+                    metrics.inc('batalha_messages_received_total', labels)
+                    metrics.inc('batalha_bytes_received_total', labels, len(data))
+                elif metrics is not None:
+                    metrics.inc('batalha_decode_errors_total')
+            if msg and self.spectators and msg['type'] in SPECTATOR_MESSAGES:
+                # Repassa o frame recebido sem recodificar
+                self.spectators.publish(data)
+            return msg
             
         except Exception as e:
-            print(color(f"Erro ao receber: {e}", C.RED))
+            notify(f"Erro ao receber: {e}", C.RED)
             self.connected = False
             return None
     
     def _receive_raw(self):
         """Recebe dados brutos do socket"""
+        reads = 0
         try:
             if self.is_tcp:
                 # Para TCP, ler header primeiro
                 while len(self.buffer) < MESSAGE_HEADER_SIZE:
                     chunk = self.socket.recv(BUFFER_SIZE)
+                    reads += 1
                     if not chunk:
                         return b""
                     self.buffer += chunk
@@ -371,6 +1056,7 @@ class AdvancedNetwork:
                 # Ler resto da mensagem
                 while len(self.buffer) < total_size:
                     chunk = self.socket.recv(BUFFER_SIZE)
+                    reads += 1
                     if not chunk:
                         return b""
                     self.buffer += chunk
@@ -378,22 +1064,466 @@ class AdvancedNetwork:
                 # Extrair mensagem completa
                 message_data = self.buffer[:total_size]
                 self.buffer = self.buffer[total_size:]
+                if CAPTURE is not None:
+                    CAPTURE.record(CAPTURE_IN, self.conn_id, message_data)
                 
                 return message_data
             else:
                 # UDP recebe mensagem completa
                 data, addr = self.socket.recvfrom(BUFFER_SIZE)
+                reads += 1
+                if CAPTURE is not None:
+                    CAPTURE.record(CAPTURE_IN, self.conn_id, data)
                 return data
                 
         except Exception as e:
-            print(color(f"Erro ao receber dados: {e}", C.RED))
+            notify(f"Erro ao receber dados: {e}", C.RED)
             return b""
+        finally:
+            if METRICS is not None and reads:
+                METRICS.inc('batalha_socket_reads_total', value=reads)
+                METRICS.set('batalha_receive_buffer_bytes', len(self.buffer))
+    
+    def resume_session(self, grace=SESSION_GRACE_PERIOD):
+        """Retoma a sessão após queda da conexão TCP.
+        
+        O host aguarda a reconexão do cliente e reenvia o último GAME_STATE;
+        o cliente reconecta com o token da sessão e recebe esse estado.
+        Retorna o estado da partida ou None se a janela de graça expirar.
+        """
+        if not self.is_tcp or not self.session_token:
+            return None
+        if self.listener is None and self.server_addr is None:
+            return None  # conexão aceita por outro servidor (ex.: servidor dedicado)
+            
+        self.connected = False
+        try:
+            self.socket.close()
+        except Exception:
+            pass
+        if self.receiver is not None:
+            self.receiver.stop()
+            self.receiver = None
+            
+        deadline = time.monotonic() + grace
+        notify(f"Conexão perdida! Aguardando retomada por até {grace}s...", C.YELLOW)
+        if self.listener is not None:
+            state = self._await_resume(deadline)
+        else:
+            state = self._reconnect(deadline)
+        if state and self.background:
+            self.start_receiver()
+        return state
+    
+    def _await_resume(self, deadline):
+        """Host: aceita reconexões até o cliente apresentar o token da sessão"""
+        while time.monotonic() < deadline:
+            try:
+                self.listener.settimeout(max(0.1, deadline - time.monotonic()))
+                client_sock, addr = self.listener.accept()
+            except socket.timeout:
+                break
+            except Exception as e:
+                notify(f"Erro ao aguardar reconexão: {e}", C.RED)
+                break
+            finally:
+                self.listener.settimeout(None)
+                
+            client_sock.settimeout(max(0.1, deadline - time.monotonic()))
+            client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socket = client_sock
+            self.peer_addr = addr
+            self.buffer = b""
+            if self._perform_handshake_server() and self.resumed:
+                client_sock.settimeout(None)
+                notify(f"Cliente reconectado: {addr[0]}:{addr[1]}", C.GREEN)
+                if self.send_message(MessageType.GAME_STATE, self.last_state):
+                    return self.last_state
+            client_sock.close()
+            self.connected = False
+            
+        notify("Tempo de reconexão esgotado.", C.RED)
+        return None
+    
+    def _reconnect(self, deadline):
+        """Cliente: reconecta com o token da sessão e recebe o estado atual"""
+        host, port = self.server_addr
+        while time.monotonic() < deadline:
+            try:
+                remaining = max(0.1, deadline - time.monotonic())
+                self.socket, _ = happy_eyeballs_connect(host, port, timeout=min(remaining, CONNECT_TIMEOUT))
+                self.socket.settimeout(max(0.1, deadline - time.monotonic()))
+                self.buffer = b""
+                if self._perform_handshake_client(self.session_token) and self.resumed:
+                    msg = self.receive_message()
+                    if msg and msg['type'] == MessageType.GAME_STATE:
+                        self.socket.settimeout(None)
+                        notify("Sessão retomada!", C.GREEN)
+                        return msg['data']
+                self.socket.close()
+                self.connected = False
+                return None
+            except Exception:
+                self.socket.close()
+                time.sleep(1)
+                
+        notify("Não foi possível retomar a sessão.", C.RED)
+        return None
+    
+    def open_spectators(self, host, port):
+        """Abre a porta de espectadores para esta partida"""
+        hub = SpectatorHub()
+        if hub.start(host, port):
+            self.spectators = hub
+        return self.spectators is not None
     
     def close(self):
+        if self.receiver is not None:
+            self.receiver.stop()
         if self.socket:
             self.socket.close()
+        if self.listener:
+            self.listener.close()
+        if self.spectators:
+            self.spectators.stop()
         self.connected = False
 
+# ---------- Recepção em Segundo Plano ----------
+class MessageReceiver:
+    """Thread de E/S que drena o socket para uma fila thread-safe.
+    
+    Mensagens fora de banda (HEARTBEAT) são tratadas aqui mesmo, sem esperar
+    a thread da interface, que pode estar presa em input(); as demais são
+    despachadas por MessageType para a fila. None na fila indica conexão perdida.
+    """
+    def __init__(self, network):
+        self.network = network
+        self.queue = queue.Queue()
+        self.pushback = deque()  # mensagens devolvidas pelo consumidor, lidas antes da fila
+        self.handlers = {MessageType.HEARTBEAT: self._on_heartbeat}
+        self.running = False
+        self.thread = None
+        self.last_seen = time.monotonic()
+        self.last_ping = 0
+        self.rtt = None
+        
+    def on(self, msg_type, handler):
+        """Registra um tratador executado na própria thread de E/S"""
+        self.handlers[msg_type] = handler
+        
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="receiver", daemon=True)
+        self.thread.start()
+        
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+    
+    def get(self, timeout=None):
+        if self.pushback:
+            return self.pushback.popleft()
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def poll(self):
+        if self.pushback:
+            return self.pushback.popleft()
+        try:
+            msg = self.queue.get_nowait()
+        except queue.Empty:
+            return None
+        if msg is None:
+            self.queue.put(None)  # mantém o aviso de desconexão para a leitura bloqueante
+        return msg
+    
+    def unget(self, msg):
+        """Devolve uma mensagem lida antes da hora; get() e poll() a entregam primeiro.
+        Só a thread consumidora chama get/poll/unget, então a deque dispensa trava."""
+        self.pushback.append(msg)
+    
+    def _run(self):
+        net = self.network
+        while self.running:
+            if not self._tick():
+                break
+            if not net._has_buffered_frame():
+                try:
+                    readable, _, _ = select.select([net.socket], [], [], 0.5)
+                except (OSError, ValueError):
+                    break
+                if not readable:
+                    continue
+                    
+            msg = net._read_message()
+            if msg is None:
+                break
+            self.last_seen = time.monotonic()
+            handler = self.handlers.get(msg['type'])
+            if handler:
+                handler(msg)
+            else:
+                self.queue.put(msg)
+                
+        if self.running:
+            self.running = False
+            self.queue.put(None)
+    
+    def _tick(self):
+        now = time.monotonic()
+        if now - self.last_seen > HEARTBEAT_TIMEOUT:
+            notify("Oponente não responde (timeout de heartbeat).", C.RED)
+            self.network.connected = False
+            return False
+        if now - self.last_ping >= HEARTBEAT_INTERVAL:
+            self.last_ping = now
+            self.network.send_message(MessageType.HEARTBEAT, {'ping': now})
+        return True
+    
+    def _on_heartbeat(self, msg):
+        self.network.trace_received(msg)
+        data = msg['data']
+        if 'ping' in data:
+            self.network.answer_ping(msg)
+        elif 'pong' in data:
+            self.rtt = self.network.handle_pong(msg)
+
+# ---------- Espectadores ----------
+SPECTATOR_MESSAGES = (MessageType.GAME_STATE, MessageType.TURN_RESULT, MessageType.GAME_END)
+
+class _Spectator:
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.inbuf = b""
+        self.joined = False
+        self.queue = deque()   # frames compartilhados (bytes imutáveis)
+        self.offset = 0        # bytes já enviados do primeiro frame
+        self.pending = 0
+        self.drops = 0
+        self.writing = False
+
+class SpectatorHub:
+    """Transmite a partida para espectadores somente leitura.
+    
+    Cada mensagem é codificada uma única vez e o mesmo buffer é enfileirado
+    para todos os inscritos. Uma única thread com selectors faz os envios
+    não bloqueantes; espectadores lentos perdem o histórico pendente e
+    recebem apenas o estado atual (keyframe), sem atrasar a partida.
+    """
+    def __init__(self, max_backlog=SPECTATOR_MAX_BACKLOG):
+        self.max_backlog = max_backlog
+        self.listener = None
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.dirty = set()
+        self.state = None
+        self.keyframe = None
+        self.running = False
+        self.thread = None
+        self._wake_r, self._wake_w = socket.socketpair()
+        
+    def start(self, host, port):
+        try:
+            family, host, dualstack = listen_family(host)
+            self.listener = socket.create_server((host, port), family=family, backlog=128,
+                                                 dualstack_ipv6=dualstack)
+            self.listener.setblocking(False)
+            self._wake_r.setblocking(False)
+            self._wake_w.setblocking(False)
+            self.selector.register(self.listener, selectors.EVENT_READ)
+            self.selector.register(self._wake_r, selectors.EVENT_READ)
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+            notify(f"Espectadores podem assistir na porta {port}", C.CYAN)
+            return True
+        except Exception as e:
+            notify(f"Erro ao abrir porta de espectadores: {e}", C.RED)
+            return False
+    
+    def update_state(self, state, frame=None):
+        """Atualiza o keyframe; a codificação é adiada até alguém precisar"""
+        with self.lock:
+            self.state = state
+            self.keyframe = frame
+        if frame:
+            self.publish(frame)
+    
+    def _keyframe(self):
+        if self.keyframe is None and self.state is not None:
+            self.keyframe = GameProtocol.encode_message(MessageType.GAME_STATE, self.state)
+        return self.keyframe
+    
+    def publish(self, frame):
+        """Enfileira o mesmo frame para todos os espectadores"""
+        with self.lock:
+            for sub in self.subscribers.values():
+                if not sub.joined:
+                    continue
+                if sub.pending + len(frame) > self.max_backlog:
+                    self._drop_to_keyframe(sub)
+                sub.queue.append(frame)
+                sub.pending += len(frame)
+                self.dirty.add(sub)
+        self._wake()
+    
+    def _drop_to_keyframe(self, sub):
+        # Mantém apenas o frame parcialmente enviado para não quebrar o enquadramento
+        head = sub.queue[0] if sub.queue and sub.offset else None
+        sub.queue.clear()
+        sub.pending = 0
+        if head is not None:
+            sub.queue.append(head)
+            sub.pending = len(head) - sub.offset
+        else:
+            sub.offset = 0
+        frame = self._keyframe()
+        if frame:
+            sub.queue.append(frame)
+            sub.pending += len(frame)
+        sub.drops += 1
+    
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+    
+    def _run(self):
+        while self.running:
+            try:
+                events = self.selector.select(timeout=1.0)
+            except OSError:
+                break
+            for key, mask in events:
+                if key.fileobj is self.listener:
+                    self._accept()
+                elif key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    sub = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read(sub)
+                    if mask & selectors.EVENT_WRITE:
+                        with self.lock:
+                            self.dirty.add(sub)
+            self._flush_dirty()
+    
+    def _accept(self):
+        try:
+            while True:
+                sock, addr = self.listener.accept()
+                sock.setblocking(False)
+                sub = _Spectator(sock, addr)
+                with self.lock:
+                    self.subscribers[sock] = sub
+                self.selector.register(sock, selectors.EVENT_READ, sub)
+        except (BlockingIOError, OSError):
+            pass
+    
+    def _read(self, sub):
+        try:
+            data = sub.sock.recv(BUFFER_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._remove(sub)
+            return
+        if sub.joined:
+            return  # somente leitura: entrada do espectador é descartada
+            
+        sub.inbuf += data
+        if len(sub.inbuf) < MESSAGE_HEADER_SIZE:
+            return
+        data_size = struct.unpack('!I', sub.inbuf[:4])[0]
+        if len(sub.inbuf) < MESSAGE_HEADER_SIZE + data_size:
+            return
+        msg = GameProtocol.decode_message(sub.inbuf)
+        sub.inbuf = b""
+        if not msg or msg['type'] != MessageType.HANDSHAKE or msg['data'].get('role') != 'spectator':
+            self._remove(sub)
+            return
+            
+        response = GameProtocol.encode_message(
+            MessageType.HANDSHAKE,
+            {'version': PROTOCOL_VERSION, 'status': 'accepted', 'server_info': 'Batalha de Dados Spectator'}
+        )
+        with self.lock:
+            sub.joined = True
+            sub.queue.append(response)
+            sub.pending += len(response)
+            frame = self._keyframe()
+            if frame:
+                sub.queue.append(frame)
+                sub.pending += len(frame)
+            self.dirty.add(sub)
+    
+    def _flush_dirty(self):
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            for sub in dirty:
+                if sub.sock not in self.subscribers:
+                    continue
+                try:
+                    while sub.queue:
+                        frame = sub.queue[0]
+                        sent = sub.sock.send(memoryview(frame)[sub.offset:])
+                        sub.offset += sent
+                        sub.pending -= sent
+                        if sub.offset < len(frame):
+                            break
+                        sub.queue.popleft()
+                        sub.offset = 0
+                except (BlockingIOError, InterruptedError):
+                    pass
+                except OSError:
+                    self._remove(sub, locked=True)
+                    continue
+                writing = bool(sub.queue)
+                if writing != sub.writing:
+                    sub.writing = writing
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+                    self.selector.modify(sub.sock, events, sub)
+    
+    def _remove(self, sub, locked=False):
+        if not locked:
+            with self.lock:
+                return self._remove(sub, locked=True)
+        self.subscribers.pop(sub.sock, None)
+        try:
+            self.selector.unregister(sub.sock)
+        except (KeyError, ValueError):
+            pass
+        sub.sock.close()
+    
+    def count(self):
+        with self.lock:
+            return sum(1 for sub in self.subscribers.values() if sub.joined)
+    
+    def stop(self):
+        self.running = False
+        self._wake()
+        if self.thread:
+            self.thread.join(timeout=2)
+        with self.lock:
+            for sub in list(self.subscribers.values()):
+                self._remove(sub, locked=True)
+        for sock in (self.listener, self._wake_r, self._wake_w):
+            if sock:
+                sock.close()
+        self.selector.close()
+
 # ---------- Player Class ----------
 class Combatant:
     def __init__(self, name, kind, is_cpu=False):
@@ -442,6 +1572,7 @@ class Combatant:
     def from_dict(self, data):
         """Atualiza estado a partir de dicionário"""
         self.hp = data.get('hp', self.hp)
+        self.defense = data.get('defense', self.defense)
         self.items = data.get('items', self.items)
         self.buff_turns = data.get('buff_turns', self.buff_turns)
         self.debuff_turns = data.get('debuff_turns', self.debuff_turns)
@@ -453,6 +1584,11 @@ def roll_die(sides):
 def attack_roll(attacker, defender, dice='d6'):
     sides = DICE_TYPES.get(dice, 6)
     roll = roll_die(sides)
+    crit, damage = attack_damage(attacker, defender, roll, sides)
+    return roll, crit, damage
+
+def attack_damage(attacker, defender, roll, sides):
+    """Dano de um ataque com o valor do dado já conhecido (usado também pelos replays)"""
     crit = roll == sides
     base = attacker.atk + roll - defender.defense
     if base < 0:
@@ -465,10 +1601,12 @@ def attack_roll(attacker, defender, dice='d6'):
     damage = int(base * multiplier)
     if crit:
         damage = int(damage * 1.5) + 1
-    return roll, crit, damage
+    return crit, damage
 
 # ---------- Display ----------
 def header():
+    if HEADLESS:
+        return
     clear()
     print(color(r"""
 ________  .____________ ___________  __      __  _____ __________  _________
@@ -481,6 +1619,8 @@ ________  .____________ ___________  __      __  _____ __________  _________
     print(color("            BATALHA DE DADOS...\n", C.YELLOW))
 
 def show_stats(p1, p2):
+    if HEADLESS:
+        return
     print(color(f" {p1.name} ({p1.kind})", C.GREEN))
     print(f"  HP: {p1.hp}/{p1.max_hp}  ATK: {p1.atk}  DEF: {p1.defense}  Items: {p1.items}")
     if p1.buff_turns > 0:
@@ -514,9 +1654,10 @@ def choose_mode():
     print(" 3. Hospedar partida (servidor)")
     print(" 4. Conectar à partida (cliente)")
     print(" 5. CPU vs CPU (demonstração)")
+    print(" 6. Assistir partida (espectador)")
     while True:
-        c = input("Escolha modo (1-5): ").strip()
-        if c in ('1','2','3','4','5'):
+        c = input("Escolha modo (1-6): ").strip()
+        if c in ('1','2','3','4','5','6'):
             return c
         print(color("Escolha inválida.", C.RED))
 
@@ -669,8 +1810,8 @@ def use_item(player):
             healed = player.heal(10)
             player.items['cura'] -= 1
             print(color(f"{player.name} usou Cura e recuperou {healed} HP!", C.GREEN))
-            time.sleep(1.2)
-            return True
+            pause(1.2)
+            return 'heal'
         if c == '2':
             if player.items['fury'] <= 0:
                 print(color("Sem Fury restantes.", C.RED))
@@ -678,40 +1819,41 @@ def use_item(player):
             player.items['fury'] -= 1
             player.buff_turns = 2
             print(color(f"{player.name} ativou FURY! Próximos ataques +50% por 2 turnos!", C.YELLOW))
-            time.sleep(1.2)
-            return True
+            pause(1.2)
+            return 'fury'
         if c == '3':
             return False
         print(color("Escolha inválida.", C.RED))
 
 # ---------- Round Logic ----------
 def play_turn(attacker, defender, dice):
+    """Joga um turno; devolve (ação, valor do dado) para o replay"""
     if attacker.is_cpu:
         action = cpu_choose_action(attacker, defender)
         if action == 'heal':
             healed = attacker.heal(10)
             attacker.items['cura'] -= 1
             slowprint(color(f"{attacker.name} (CPU) usou Cura e recuperou {healed} HP!", C.MAG), 0.003)
-            time.sleep(1)
-            return
+            pause(1)
+            return 'heal', 0
         if action == 'fury':
             attacker.items['fury'] -= 1
             attacker.buff_turns = 2
             slowprint(color(f"{attacker.name} (CPU) ativou modo FURY! +50% por 2 turnos.", C.YELLOW), 0.003)
-            time.sleep(1)
-            return
+            pause(1)
+            return 'fury', 0
     else:
         choice = player_choose_action(attacker)
         if choice == '2':
             used = use_item(attacker)
             if used:
-                return
+                return used, 0
         elif choice == '3':
             attacker.defense += 1
             attacker.debuff_turns = 0
             slowprint(color(f"{attacker.name} defendeu e aumentou DEF em 1.", C.CYAN), 0.003)
-            time.sleep(0.9)
-            return
+            pause(0.9)
+            return 'defend', 0
 
     # Realizar ataque
     roll, crit, damage = attack_roll(attacker, defender, dice)
@@ -722,7 +1864,8 @@ def play_turn(attacker, defender, dice):
         slowprint(color(f"{attacker.name} rolou {sroll} (CRÍTICO!) e causou {sdam} de dano!", C.MAG), 0.002)
     else:
         slowprint(f"{attacker.name} rolou {sroll} e causou {sdam} de dano.", 0.002)
-    time.sleep(0.9)
+    pause(0.9)
+    return 'attack', roll
 
 def decay_buffs(p):
     if p.buff_turns > 0:
@@ -734,75 +1877,165 @@ def decay_buffs(p):
         p.defense = base_def
 
 # ---------- Match Flow ----------
-def battle(p1, p2, dice):
+def battle(p1, p2, dice, seed=None):
+    """Batalha local; `seed` ressemeia o RNG para que o replay possa refazê-la inteira"""
+    if seed is not None:
+        random.seed(seed)
+    log = bytearray() if REPLAYS is not None else None
     round_no = 1
     while p1.alive() and p2.alive():
         header()
-        print(color(f"--- Round {round_no} ---", C.BLUE))
+        notify(f"--- Round {round_no} ---", C.BLUE)
         show_stats(p1, p2)
 
         # Turno jogador 1
         slowprint(color(f"Vez de {p1.name}!", C.GREEN), 0.002)
-        play_turn(p1, p2, dice)
+        action = play_turn(p1, p2, dice)
+        if log is not None:
+            log.append(replay_action(0, *action))
         decay_buffs(p1)
         if not p2.alive():
             break
 
         # Turno jogador 2
         slowprint(color(f"Vez de {p2.name}!", C.RED), 0.002)
-        play_turn(p2, p1, dice)
+        action = play_turn(p2, p1, dice)
+        if log is not None:
+            log.append(replay_action(1, *action))
         decay_buffs(p2)
 
         round_no += 1
 
     winner = p1 if p1.alive() else p2
+    if log is not None:
+        REPLAYS.submit(REPLAY_SEEDED if seed is not None else 0, (p1.kind, p2.kind), dice, seed, log,
+                       0 if winner is p1 else 1, (p1.hp, replay_items(p1), p2.hp, replay_items(p2)), (len(log) + 1) // 2)
+    if RESULTS is not None:
+        # round_no já avançou se o golpe final foi de p2
+        RESULTS.add(RESULTS.source, p1.kind, p2.kind, dice, 0 if winner is p1 else 1,
+                    round_no if winner is p1 else round_no - 1)
     slowprint(color(f"\n>>> {winner.name} venceu a batalha! <<<\n", C.BOLD + C.GREEN if winner==p1 else C.BOLD + C.RED), 0.004)
-    time.sleep(1.2)
+    pause(1.2)
     return winner
 
+# Jogada da CPU em rede: aplica a ação e devolve os dados do TURN_RESULT
+def cpu_network_action(cpu, opponent, dice):
+    action = cpu_choose_action(cpu, opponent)
+    if action == 'heal' and cpu.items['cura'] > 0:
+        healed = cpu.heal(10)
+        cpu.items['cura'] -= 1
+        return {'type': 'heal', 'amount': healed}
+    if action == 'fury' and cpu.items['fury'] > 0:
+        cpu.items['fury'] -= 1
+        cpu.buff_turns = 2
+        return {'type': 'fury', 'turns': 2}
+    roll, crit, damage = attack_roll(cpu, opponent, dice)
+    opponent.take_damage(damage)
+    return {'type': 'attack', 'roll': roll, 'crit': crit, 'damage': damage}
+
+def next_game_message(network):
+    """Próxima mensagem de jogo; sem thread de recepção, responde HEARTBEATs aqui"""
+    while True:
+        msg = network.receive_message()
+        if not msg or msg['type'] != MessageType.HEARTBEAT:
+            return msg
+        if 'ping' in msg['data']:
+            network.answer_ping(msg)
+        elif 'pong' in msg['data']:
+            network.handle_pong(msg)
+
+# Estado autoritativo da partida (sempre na perspectiva do host)
+def snapshot_state(round_no, host, guest, host_turn, dice):
+    return {
+        'round': round_no,
+        'players': [host.to_dict(), guest.to_dict()],
+        'current_player': 0 if host_turn else 1,
+        'dice': dice
+    }
+
+def apply_game_state(p1, p2, state, is_host):
+    """Aplica um GAME_STATE recebido; retorna (round, my_turn)"""
+    players_data = state.get('players', [])
+    if len(players_data) >= 2:
+        mine, theirs = (players_data[0], players_data[1]) if is_host else (players_data[1], players_data[0])
+        p1.from_dict(mine)
+        p2.from_dict(theirs)
+    host_turn = state.get('current_player', 0) == 0
+    return state.get('round', 1), host_turn == is_host
+
 # Batalha em rede usando protocolo de aplicação
 def network_battle(p1, p2, dice, network, is_host):
+    metrics = METRICS
+    if metrics is None:
+        return _play_network_battle(p1, p2, dice, network, is_host)
+    metrics.inc('batalha_active_matches')
+    winner = None
+    try:
+        winner = _play_network_battle(p1, p2, dice, network, is_host)
+        return winner
+    finally:
+        metrics.inc('batalha_active_matches', value=-1)
+        result = 'aborted' if winner is None else ('win' if winner is p1 else 'loss')
+        metrics.inc('batalha_matches_total', (('result', result),))
+
+def _record_disconnect(state):
+    if METRICS is not None:
+        METRICS.inc('batalha_disconnects_total')
+        if state:
+            METRICS.inc('batalha_resumes_total')
+
+def _replay_network_action(seat, action):
+    """Byte de replay de um action_data do TURN_RESULT"""
+    action_type = action.get('type', '')
+    if action_type == 'item_used':
+        action_type = action.get('item', action_type)
+    if action_type not in REPLAY_ACTIONS:
+        action_type = 'item_used'
+    return replay_action(seat, action_type, action.get('roll', 0) if action_type == 'attack' else 0)
+
+def _play_network_battle(p1, p2, dice, network, is_host):
     round_no = 1
     my_turn = is_host  # Host sempre começa
+    log = bytearray() if REPLAYS is not None else None
+    replay_flags = REPLAY_NETWORK
+    seat = 0 if is_host else 1  # assento no replay (perspectiva do host)
     
-    # Sincronizar estado inicial usando protocolo
-    game_state_data = {
-        'round': round_no,
-        'players': [p1.to_dict(), p2.to_dict()],
-        'current_player': 0 if my_turn else 1,
-        'dice': dice
-    }
-    network.send_message(MessageType.GAME_STATE, game_state_data)
+    # Host sincroniza o estado inicial (autoritativo) usando protocolo
+    if is_host:
+        network.last_state = snapshot_state(round_no, p1, p2, my_turn, dice)
+        network.send_message(MessageType.GAME_STATE, network.last_state)
     
     while p1.alive() and p2.alive():
         header()
-        print(color(f"--- Round {round_no} (Rede) ---", C.BLUE))
+        notify(f"--- Round {round_no} (Rede) ---", C.BLUE)
         show_stats(p1, p2)
         
         if my_turn:
+            # Mensagens que chegaram em segundo plano (ex.: GAME_END antecipado)
+            early = network.poll_message()
+            if early:
+                if early['type'] == MessageType.GAME_END:
+                    notify("Oponente encerrou a partida.", C.YELLOW)
+                    return None
+                if early['type'] == MessageType.GAME_STATE:
+                    round_no, my_turn = apply_game_state(p1, p2, early['data'], is_host)
+                    continue
+                # Qualquer outra (ex.: TURN_RESULT depois de uma retomada) fica para
+                # a vez do oponente, na mesma ordem em que chegou
+                network.receiver.unget(early)
+                
             # Minha vez
             slowprint(color("SUA VEZ!", C.GREEN), 0.002)
             
             # Executar ação
             if p1.is_cpu:
-                action = cpu_choose_action(p1, p2)
-                if action == 'heal' and p1.items['cura'] > 0:
-                    healed = p1.heal(10)
-                    p1.items['cura'] -= 1
-                    action_data = {'type': 'heal', 'amount': healed}
-                elif action == 'fury' and p1.items['fury'] > 0:
-                    p1.items['fury'] -= 1
-                    p1.buff_turns = 2
-                    action_data = {'type': 'fury', 'turns': 2}
-                else:
-                    roll, crit, damage = attack_roll(p1, p2, dice)
-                    p2.take_damage(damage)
-                    action_data = {'type': 'attack', 'roll': roll, 'crit': crit, 'damage': damage}
+                action_data = cpu_network_action(p1, p2, dice)
             else:
                 choice = player_choose_action(p1)
                 if choice == '2':
-                    if use_item(p1):
-                        action_data = {'type': 'item_used'}
+                    item = use_item(p1)
+                    if item:
+                        action_data = {'type': 'item_used', 'item': item}
                     else:
                         continue
                 elif choice == '3':
@@ -812,29 +2045,53 @@ def network_battle(p1, p2, dice, network, is_host):
                     roll, crit, damage = attack_roll(p1, p2, dice)
                     p2.take_damage(damage)
                     action_data = {'type': 'attack', 'roll': roll, 'crit': crit, 'damage': damage}
+            if log is not None:
+                log.append(_replay_network_action(seat, action_data))
             
             # Enviar resultado da ação usando protocolo
             turn_result_data = {
                 'round': round_no,
-                'player': 0,
+                'player': 0 if is_host else 1,  # índice na perspectiva do host
                 'action': action_data,
                 'players_state': [p1.to_dict(), p2.to_dict()]
             }
             
             if not network.send_message(MessageType.TURN_RESULT, turn_result_data):
-                print(color("Erro ao enviar jogada!", C.RED))
-                return None
+                # Retomar a sessão a partir do último estado autoritativo
+                state = network.resume_session()
+                _record_disconnect(state)
+                replay_flags |= REPLAY_RESUMED
+                if not state:
+                    notify("Erro ao enviar jogada!", C.RED)
+                    return None
+                round_no, my_turn = apply_game_state(p1, p2, state, is_host)
+                continue
                 
         else:
             # Vez do oponente
             slowprint(color("Aguardando jogada do oponente...", C.YELLOW), 0.002)
             
-            msg = network.receive_message()
+            waited = time.perf_counter()
+            msg = next_game_message(network)
             if not msg:
-                print(color("Conexão perdida!", C.RED))
-                return None
+                state = network.resume_session()
+                _record_disconnect(state)
+                replay_flags |= REPLAY_RESUMED
+                if not state:
+                    notify("Conexão perdida!", C.RED)
+                    return None
+                round_no, my_turn = apply_game_state(p1, p2, state, is_host)
+                continue
+            
+            if msg['type'] == MessageType.GAME_STATE:
+                # Estado autoritativo do host: sincroniza sem consumir o turno
+                round_no, my_turn = apply_game_state(p1, p2, msg['data'], is_host)
+                continue
+            
             
             if msg['type'] == MessageType.TURN_RESULT:
+                if METRICS is not None:
+                    METRICS.observe('batalha_turn_wait_seconds', time.perf_counter() - waited)
                 # Processar jogada do oponente
                 players_data = msg['data'].get('players_state', [])
                 if len(players_data) >= 2:
@@ -844,6 +2101,8 @@ def network_battle(p1, p2, dice, network, is_host):
                     
                 action = msg['data'].get('action', {})
                 action_type = action.get('type', '')
+                if log is not None:
+                    log.append(_replay_network_action(1 - seat, action))
                 
                 if action_type == 'attack':
                     roll = action.get('roll', 1)
@@ -863,17 +2122,36 @@ def network_battle(p1, p2, dice, network, is_host):
                     
             elif msg['type'] == MessageType.GAME_END:
                 winner_data = msg['data'].get('winner')
-                print(color(f"{winner_data} venceu a partida!", C.YELLOW))
+                notify(f"{winner_data} venceu a partida!", C.YELLOW)
                 return None
+            
+            else:
+                continue
         
         # Verificar fim do jogo
         if not p1.alive() or not p2.alive():
             winner = p1 if p1.alive() else p2
             
-            # Notificar fim do jogo usando protocolo
-            end_data = {'winner': winner.name}
-            network.send_message(MessageType.GAME_END, end_data)
+            if my_turn:
+                # Quem fez a jogada final notifica o fim do jogo (uma única vez)
+                end_data = {
+                    'winner': winner.name,
+                    'winner_index': 0 if (winner is p1) == is_host else 1  # perspectiva do host
+                }
+                network.send_message(MessageType.GAME_END, end_data)
+            else:
+                # Consome o GAME_END do oponente para a conexão seguir limpa para a próxima batalha
+                msg = next_game_message(network)
+                while msg and msg['type'] != MessageType.GAME_END:
+                    msg = next_game_message(network)
             
+            if log is not None:
+                host, guest = (p1, p2) if is_host else (p2, p1)
+                REPLAYS.submit(replay_flags, (host.kind, guest.kind), dice, None, log,
+                               0 if winner is host else 1,
+                               (host.hp, replay_items(host), guest.hp, replay_items(guest)), (len(log) + 1) // 2)
+            if RESULTS is not None and is_host:  # só o host grava: a partida não entra duas vezes
+                RESULTS.add('network', p1.kind, p2.kind, dice, 0 if winner is p1 else 1, round_no)
             slowprint(color(f"\n>>> {winner.name} venceu a batalha! <<<\n", C.BOLD + C.GREEN), 0.004)
             return winner
         
@@ -885,12 +2163,215 @@ def network_battle(p1, p2, dice, network, is_host):
         my_turn = not my_turn
         if my_turn:
             round_no += 1
+            if METRICS is not None:
+                METRICS.inc('batalha_rounds_total')
+        
+        # Host guarda o estado autoritativo para uma eventual retomada
+        if is_host:
+            network.last_state = snapshot_state(round_no, p1, p2, my_turn, dice)
+            if network.spectators:
+                network.spectators.update_state(network.last_state)
             
-        time.sleep(1)
+        pause(1)
+
+# Série melhor de 3 em rede: todas as batalhas e revanches usam a mesma conexão
+def send_game_config(network, kind, dice, battle_no, score):
+    game_info = {
+        'host_character': kind,
+        'dice_type': dice,
+        'protocol_version': PROTOCOL_VERSION,
+        'battle': battle_no,
+        'score': score
+    }
+    return network.send_message(MessageType.GAME_CONFIG, game_info)
+
+def host_series(network, kind1, dice):
+    p1 = Combatant("Você", kind1)
+    p2 = None
+    while True:
+        score = [0, 0]
+        send_game_config(network, kind1, dice, 1, score)
+        
+        for match in range(1, 4):
+            # Receber resposta do cliente (nas batalhas seguintes já chegou durante o placar)
+            client_msg = next_game_message(network)
+            if not client_msg or client_msg['type'] != MessageType.CHARACTER_SELECT:
+                if client_msg and client_msg['type'] == MessageType.GAME_END:
+                    print(color("Oponente recusou a revanche.", C.YELLOW))
+                else:
+                    print(color("Conexão perdida!", C.RED))
+                return
+                
+            opp_char = client_msg['data'].get('character', 'Guerreiro')
+            if opp_char not in CHARACTERS:
+                opp_char = 'Guerreiro'
+            if p2 is None or p2.kind != opp_char:
+                p2 = Combatant("Oponente", opp_char)
+            p1.reset_round()
+            p2.reset_round()
+            
+            if match == 1:
+                slowprint(f"Oponente escolheu: {opp_char}", 0.003)
+                input("Pressione Enter para começar batalha em rede...")
+            header()
+            slowprint(color(f"=== Batalha {match} ===", C.CYAN), 0.003)
+            
+            winner = network_battle(p1, p2, dice, network, True)
+            if winner is None:
+                return
+            score[0 if winner is p1 else 1] += 1
+            
+            series_over = max(score) == 2
+            if not series_over:
+                # Pipeline: próximo GAME_CONFIG segue enquanto o placar está na tela
+                send_game_config(network, kind1, dice, match + 1, score)
+                
+            slowprint(f"Placar: {p1.name} {score[0]} x {score[1]} {p2.name}\n", 0.003)
+            if series_over:
+                break
+            input("Próxima batalha: pressione Enter...")
+            
+        if score[0] > score[1]:
+            slowprint(color(f"{p1.name} venceu a série!", C.GREEN), 0.003)
+        else:
+            slowprint(color(f"{p2.name} venceu a série!", C.GREEN), 0.003)
+            
+        again = input("Revanche na mesma conexão? (s/n): ").strip().lower()
+        if again != 's':
+            network.send_message(MessageType.GAME_END, {'reason': 'series_over'})
+            return
+
+def client_series(network, kind1, dice):
+    p1 = Combatant("Você", kind1)
+    p2 = None
+    score = [0, 0]
+    
+    # Receber configuração do host
+    host_msg = next_game_message(network)
+    while host_msg and host_msg['type'] == MessageType.GAME_CONFIG:
+        config = host_msg['data']
+        host_char = config.get('host_character', 'Guerreiro')
+        if host_char not in CHARACTERS:
+            host_char = 'Guerreiro'
+        dice = config.get('dice_type', dice)
+        battle_no = config.get('battle', 1)
+        
+        if battle_no == 1:
+            if p2 is not None:
+                again = input("Host propôs revanche. Aceitar? (s/n): ").strip().lower()
+                if again != 's':
+                    network.send_message(MessageType.GAME_END, {'reason': 'rematch_declined'})
+                    return
+            host_version = config.get('protocol_version', '1.0')
+            print(color(f"Protocolo do servidor: v{host_version}", C.CYAN))
+            score = [0, 0]
+        
+        # Enviar seleção de personagem
+        network.send_message(MessageType.CHARACTER_SELECT, {'character': kind1})
+        
+        if p2 is None or p2.kind != host_char:
+            p2 = Combatant("Host", host_char)
+        p1.reset_round()
+        p2.reset_round()
+        
+        if battle_no == 1:
+            slowprint(f"Host escolheu: {host_char}", 0.003)
+            slowprint(f"Usando dados: {dice}", 0.003)
+            input("Pressione Enter para começar batalha em rede...")
+        else:
+            input("Próxima batalha: pressione Enter...")
+        header()
+        slowprint(color(f"=== Batalha {battle_no} ===", C.CYAN), 0.003)
+        
+        winner = network_battle(p1, p2, dice, network, False)
+        if winner is None:
+            return
+        score[0 if winner is p1 else 1] += 1
+        slowprint(f"Placar: {p1.name} {score[0]} x {score[1]} {p2.name}\n", 0.003)
+        
+        if max(score) == 2:
+            if score[0] > score[1]:
+                slowprint(color(f"{p1.name} venceu a série!", C.GREEN), 0.003)
+            else:
+                slowprint(color(f"{p2.name} venceu a série!", C.GREEN), 0.003)
+            slowprint("Aguardando o host (revanche?)...", 0.003)
+            
+        # Próximo GAME_CONFIG (já em trânsito) ou fim da série
+        host_msg = next_game_message(network)
+        
+    if host_msg and host_msg['type'] == MessageType.GAME_END:
+        print(color("Host encerrou a série.", C.YELLOW))
+    elif not host_msg:
+        print(color("Conexão encerrada.", C.RED))
+
+# Espectador: acompanha a partida do host sem interferir
+def spectate(network):
+    host_p = guest_p = None
+    while True:
+        msg = network.receive_message()
+        if not msg:
+            print(color("Transmissão encerrada.", C.RED))
+            return
+            
+        if msg['type'] == MessageType.GAME_STATE:
+            players_data = msg['data'].get('players', [])
+            if len(players_data) < 2:
+                continue
+            host_p = Combatant("Host", players_data[0]['kind'])
+            guest_p = Combatant("Convidado", players_data[1]['kind'])
+            host_p.from_dict(players_data[0])
+            guest_p.from_dict(players_data[1])
+            header()
+            print(color(f"--- Round {msg['data'].get('round', 1)} (Espectador) ---", C.BLUE))
+            show_stats(host_p, guest_p)
+            
+        elif msg['type'] == MessageType.TURN_RESULT and host_p:
+            players_data = msg['data'].get('players_state', [])
+            by_host = msg['data'].get('player', 0) == 0
+            if len(players_data) >= 2:
+                host_data, guest_data = players_data if by_host else players_data[::-1]
+                host_p.from_dict(host_data)
+                guest_p.from_dict(guest_data)
+            actor = host_p.name if by_host else guest_p.name
+            action = msg['data'].get('action', {})
+            action_type = action.get('type', '')
+            header()
+            print(color(f"--- Round {msg['data'].get('round', 1)} (Espectador) ---", C.BLUE))
+            show_stats(host_p, guest_p)
+            if action_type == 'attack':
+                crit = " (CRÍTICO!)" if action.get('crit') else ""
+                print(f"{actor} rolou {action.get('roll', 1)}{crit} e causou {action.get('damage', 0)} de dano.")
+            elif action_type == 'heal':
+                print(color(f"{actor} se curou em {action.get('amount', 0)} HP!", C.GREEN))
+            elif action_type == 'fury':
+                print(color(f"{actor} ativou FURY!", C.YELLOW))
+            elif action_type == 'defend':
+                print(color(f"{actor} defendeu!", C.CYAN))
+            else:
+                print(f"{actor} usou um item.")
+                
+        elif msg['type'] == MessageType.GAME_END:
+            winner_index = msg['data'].get('winner_index')
+            if winner_index is None:
+                print(color("Série encerrada pelo host.", C.YELLOW))
+                return
+            winner_name = "Host" if winner_index == 0 else "Convidado"
+            print(color(f"\n>>> Fim da batalha: {winner_name} venceu! <<<\n", C.BOLD + C.YELLOW))
 
 # ---------- Main Menu & Loop ----------
 def main():
     random.seed()
+    metrics_port = os.environ.get('BATALHA_METRICS_PORT')
+    if metrics_port:
+        enable_metrics(int(metrics_port))
+    if os.environ.get('BATALHA_TRACE'):
+        enable_tracing(os.environ['BATALHA_TRACE'])
+    if os.environ.get('BATALHA_REPLAYS'):
+        enable_replays(os.environ['BATALHA_REPLAYS'])
+    if os.environ.get('BATALHA_RESULTS'):
+        enable_results(os.environ['BATALHA_RESULTS'])
+    if os.environ.get('BATALHA_CAPTURE'):
+        enable_capture(os.environ['BATALHA_CAPTURE'])
     while True:
         header()
         print("Bem-vindo à Batalha de Dados!")
@@ -919,11 +2400,28 @@ def main():
             print("- Protocolo de aplicação estruturado")
             print("- Modo cliente-servidor aprimorado")
             print("- Sincronização automática de estado")
+            print("- Retomada da partida após queda da conexão (TCP)")
+            print("- Série melhor de 3 e revanches na mesma conexão")
+            print(f"- Espectadores assistem na porta do jogo + {SPECTATOR_PORT_OFFSET}")
             input("\nPressione Enter para voltar...")
             continue
             
         if choice == '1':
             mode = choose_mode()
+            
+            if mode == '6':
+                # Espectador conecta na porta de espectadores do host
+                host, port = get_network_config(is_server=False)
+                network = AdvancedNetwork()
+                network.role = 'spectator'
+                try:
+                    if network.connect_to_server(host, port + SPECTATOR_PORT_OFFSET, True):
+                        spectate(network)
+                    input("Pressione Enter para voltar ao menu...")
+                finally:
+                    network.close()
+                continue
+                
             dice = choose_dice()
             
             if mode in ('1', '2', '5'):
@@ -979,6 +2477,7 @@ def main():
                 use_tcp = choose_protocol()
                 
                 network = AdvancedNetwork()
+                network.player = os.environ.get('BATALHA_PLAYER')  # nome no ranking do servidor
                 
                 try:
                     if mode == '3':  # Hospedar (servidor)
@@ -988,39 +2487,23 @@ def main():
                         if not network.create_server(host or "", port, use_tcp):
                             input("Erro ao criar servidor. Pressione Enter...")
                             continue
+                        
+                        if use_tcp:
+                            network.open_spectators(host or "", port + SPECTATOR_PORT_OFFSET)
                             
                         slowprint("Aguardando conexão...", 0.003)
                         if not network.wait_connection():
                             input("Erro na conexão. Pressione Enter...")
                             continue
                         
-                        # Trocar informações do jogo usando protocolo
-                        game_info = {
-                            'host_character': kind1,
-                            'dice_type': dice,
-                            'protocol_version': PROTOCOL_VERSION
-                        }
-                        network.send_message(MessageType.GAME_CONFIG, game_info)
-                        
-                        # Receber resposta do cliente
-                        client_msg = network.receive_message()
-                        if client_msg and client_msg['type'] == MessageType.CHARACTER_SELECT:
-                            opp_char = client_msg['data'].get('character', 'Guerreiro')
-                        else:
-                            opp_char = 'Guerreiro'
-                        
-                        p1 = Combatant("Você", kind1)
-                        p2 = Combatant("Oponente", opp_char)
-                        
-                        slowprint(f"Oponente escolheu: {opp_char}", 0.003)
-                        input("Pressione Enter para começar batalha em rede...")
-                        
-                        winner = network_battle(p1, p2, dice, network, True)
+                        network.start_receiver()
+                        host_series(network, kind1, dice)
                         
                     else:  # mode == '4' - Conectar (cliente)
                         host, port = get_network_config(is_server=False)
                         if not host:
                             host = "127.0.0.1"
+                        resolve_async(host, port, use_tcp)  # resolve enquanto o jogador escolhe
                             
                         kind1 = choose_character("Seu personagem")
                         
@@ -1028,28 +2511,8 @@ def main():
                             input("Erro na conexão. Pressione Enter...")
                             continue
                             
-                        # Receber configuração do host
-                        host_msg = network.receive_message()
-                        if host_msg and host_msg['type'] == MessageType.GAME_CONFIG:
-                            host_char = host_msg['data'].get('host_character', 'Guerreiro')
-                            dice = host_msg['data'].get('dice_type', dice)
-                            host_version = host_msg['data'].get('protocol_version', '1.0')
-                            print(color(f"Protocolo do servidor: v{host_version}", C.CYAN))
-                        else:
-                            host_char = 'Guerreiro'
-                        
-                        # Enviar seleção de personagem
-                        char_data = {'character': kind1}
-                        network.send_message(MessageType.CHARACTER_SELECT, char_data)
-                        
-                        p1 = Combatant("Você", kind1)
-                        p2 = Combatant("Host", host_char)
-                        
-                        slowprint(f"Host escolheu: {host_char}", 0.003)
-                        slowprint(f"Usando dados: {dice}", 0.003)
-                        input("Pressione Enter para começar batalha em rede...")
-                        
-                        winner = network_battle(p1, p2, dice, network, False)
+                        network.start_receiver()
+                        client_series(network, kind1, dice)
                     
                     input("Pressione Enter para voltar ao menu...")
                     
@@ -1064,7 +2527,11 @@ def main():
 
 if __name__ == '__main__':
     try:
-        main()
+        if os.environ.get('BATALHA_PROFILE'):
+            import profiling
+            profiling.profile_call(main, output=os.environ['BATALHA_PROFILE'])
+        else:
+            main()
     except KeyboardInterrupt:
         print("\nSaindo... até logo!")
         sys.exit(0)
\ No newline at end of file
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - servidor dedicado (sem interface)
+- Aceita vários clientes ao mesmo tempo (uma thread por conexão, TCP)
+- Cada cliente joga séries melhor de 3 contra a CPU do servidor
+- Usa o mesmo protocolo de aplicação do modo host (script.py)
+- Amostrador de pilhas sempre ligado; porta de administração local
+  (status, profile, top, ladder) para inspecionar o servidor sob carga real
+- --ratings: ratings Glicko dos clientes contra cada personagem da CPU,
+  que também escolhem o personagem da CPU mais próximo do jogador
+"""
+
+import argparse
+import gc
+import os
+import random
+import socket
+import threading
+import time
+
+import profiling
+import ratings
+import script
+from sampler import StackSampler
+from script import (
+    AdvancedNetwork, Combatant, MessageType, CHARACTERS, DICE_TYPES, DEFAULT_PORT,
+    listen_family, network_battle, next_game_message, send_game_config, notify, C
+)
+
+class GcMonitor:
+    """Mede as pausas do coletor de lixo via gc.callbacks"""
+    def __init__(self):
+        self.collections = 0
+        self.pause_total = 0.0
+        self.pause_max = 0.0  # maior pausa desde a última leitura (take_max)
+        self.started = None
+        gc.callbacks.append(self._callback)
+        
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self.started = time.perf_counter()
+        elif self.started is not None:
+            pause = time.perf_counter() - self.started
+            self.started = None
+            self.collections += 1
+            self.pause_total += pause
+            self.pause_max = max(self.pause_max, pause)
+            
+    def take_max(self):
+        pause, self.pause_max = self.pause_max, 0.0
+        return pause
+        
+    def close(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+def process_stats():
+    """RSS, descritores abertos e threads do próprio processo (RSS e fds só no Linux)"""
+    stats = {'threads': threading.active_count(), 'rss_bytes': None, 'open_fds': None}
+    try:
+        with open('/proc/self/statm') as f:
+            stats['rss_bytes'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        stats['open_fds'] = len(os.listdir('/proc/self/fd'))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return stats
+
+ADMIN_PORT_OFFSET = 100  # porta de administração = porta do jogo + deslocamento
+
+class MatchServer:
+    def __init__(self, host="", port=DEFAULT_PORT, series=1, dice=None):
+        self.host = host
+        self.port = port
+        self.series = series  # séries jogadas por conexão antes do GAME_END final
+        self.dice = dice      # None = sorteia um dado por conexão
+        self.listener = None
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+        self.active = 0
+        self.connections = 0
+        self.battles = 0
+        self.profiler = None  # ProfileCollector opcional: perfila cada conexão
+        self.sampler = None   # StackSampler opcional, consultado pelos comandos de administração
+        self.gc_monitor = GcMonitor()
+        self.admin = None
+        self.ratings = None   # ratings.RatingBook opcional: avalia os clientes contra a CPU
+        self.ratings_path = None
+
+    def start(self):
+        """Abre o socket de escuta e aceita conexões numa thread própria"""
+        family, host, dualstack = listen_family(self.host)
+        self.listener = socket.create_server((host, self.port), family=family, backlog=1024,
+                                             dualstack_ipv6=dualstack)
+        self.port = self.listener.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self._accept_loop, name="accept", daemon=True)
+        self.thread.start()
+        notify(f"Servidor dedicado em {host}:{self.port}", C.GREEN)
+        return self.port
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while self.running:
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        if self.listener:
+            self.listener.close()
+        if self.admin:
+            self.admin.close()
+        if self.sampler:
+            self.sampler.stop()
+        self.gc_monitor.close()
+        if self.ratings is not None:
+            self.ratings.save(self.ratings_path)
+    
+    def start_admin(self, port, host="127.0.0.1"):
+        """Porta de administração local: um comando por linha, resposta em texto"""
+        self.admin = socket.create_server((host, port))
+        threading.Thread(target=self._admin_loop, name="admin", daemon=True).start()
+        return self.admin.getsockname()[1]
+    
+    def _admin_loop(self):
+        while True:
+            try:
+                sock, _ = self.admin.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._admin_client, args=(sock,), daemon=True).start()
+    
+    def _admin_client(self, sock):
+        with sock, sock.makefile('r', encoding='utf-8', newline='\n') as lines:
+            for line in lines:
+                if not line.strip():
+                    continue
+                if line.strip() == 'quit':
+                    break
+                sock.sendall((self.admin_command(line) + "\n").encode('utf-8'))
+    
+    def admin_command(self, line):
+        """status | profile [segundos] | top [n] [segundos] | ladder [n] | help"""
+        parts = line.split()
+        command, args = parts[0], parts[1:]
+        try:
+            if command == 'status':
+                with self.lock:
+                    lines = [f"ativos {self.active}", f"conexoes {self.connections}", f"batalhas {self.battles}"]
+                lines += [f"{k} {v}" for k, v in process_stats().items()]
+                gcm = self.gc_monitor
+                lines += [f"gc_collections {gcm.collections}", f"gc_pause_total_s {gcm.pause_total}",
+                          f"gc_pause_max_s {gcm.take_max()}"]
+                if self.sampler:
+                    lines += [f"sampler_{k} {v}" for k, v in self.sampler.status().items()]
+                return "\n".join(lines) + "\n"
+            if command == 'ladder':
+                if self.ratings is None:
+                    return "erro: ratings desligados (--ratings)\n"
+                rows = self.ratings.top(int(args[0]) if args else 20)
+                return "".join(f"{i:4d} {name} {rating:.1f} {rd:.0f} {games} {wins}\n"
+                               for i, (name, rating, rd, games, wins) in enumerate(rows, 1))
+            if command in ('profile', 'top') and not self.sampler:
+                return "erro: amostrador desligado\n"
+            if command == 'profile':
+                return self.sampler.collapsed(float(args[0]) if args else None)
+            if command == 'top':
+                n = int(args[0]) if args else 20
+                rows = self.sampler.top(n, float(args[1]) if len(args) > 1 else None)
+                return "".join(f"{own:8d} {total:8d}  {label}\n" for label, own, total in rows)
+        except (ValueError, IndexError):
+            return "erro: argumentos inválidos\n"
+        return "comandos: status | profile [segundos] | top [n] [segundos] | ladder [n] | quit\n"
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, addr = self.listener.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            target, args = self._serve_client, (sock, addr)
+            if self.profiler is not None:
+                target, args = self.profiler.run, (self._serve_client, sock, addr)
+            threading.Thread(target=target, args=args, daemon=True).start()
+
+    def _serve_client(self, sock, addr):
+        network = AdvancedNetwork()
+        network.socket = sock
+        network.peer_addr = addr
+        with self.lock:
+            self.active += 1
+            self.connections += 1
+        try:
+            if network._perform_handshake_server():
+                self.play_series(network)
+        except Exception as e:
+            notify(f"Erro com o cliente {addr[0]}: {e}", C.RED)
+        finally:
+            network.close()
+            with self.lock:
+                self.active -= 1
+
+    def play_series(self, network):
+        """Séries melhor de 3 da CPU do servidor contra um cliente"""
+        kind = random.choice(list(CHARACTERS.keys()))
+        # O nome vem do handshake do cliente: só texto curto entra no ranking
+        player = network.player if ratings.valid_name(network.player) else f"anon@{network.peer_addr[0]}"
+        if self.ratings is not None:
+            # Emparelhamento: a CPU de rating mais próximo do jogador
+            kind = self.ratings.nearest(player, [cpu_name(k) for k in CHARACTERS])[len(ratings.CPU_PREFIX):]
+        dice = self.dice or random.choice(list(DICE_TYPES.keys()))
+        cpu = Combatant("Servidor", kind, is_cpu=True)
+        opponent = None
+        for _ in range(self.series):
+            score = [0, 0]
+            battle_no = 1
+            send_game_config(network, kind, dice, battle_no, score)
+            while max(score) < 2:
+                msg = next_game_message(network)
+                if not msg or msg['type'] != MessageType.CHARACTER_SELECT:
+                    return
+                opp_kind = msg['data'].get('character', 'Guerreiro')
+                if opp_kind not in CHARACTERS:
+                    opp_kind = 'Guerreiro'
+                if opponent is None or opponent.kind != opp_kind:
+                    opponent = Combatant("Cliente", opp_kind)
+                cpu.reset_round()
+                opponent.reset_round()
+
+                winner = network_battle(cpu, opponent, dice, network, True)
+                if winner is None:
+                    return
+                with self.lock:
+                    self.battles += 1
+                if self.ratings is not None:
+                    if winner is cpu:
+                        self.ratings.record(cpu_name(kind), player)
+                    else:
+                        self.ratings.record(player, cpu_name(kind))
+                score[0 if winner is cpu else 1] += 1
+                battle_no += 1
+                if max(score) < 2:
+                    send_game_config(network, kind, dice, battle_no, score)
+        network.send_message(MessageType.GAME_END, {'reason': 'series_over'})
+
+def cpu_name(kind):
+    """Cada personagem da CPU do servidor tem o próprio rating"""
+    return f"{ratings.CPU_PREFIX}{kind}"
+
+def admin_request(port, command, host="127.0.0.1"):
+    """Envia um comando à porta de administração e devolve a resposta"""
+    with socket.create_connection((host, port), timeout=10) as sock:
+        sock.sendall(f"{command}\nquit\n".encode('utf-8'))
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks).decode('utf-8')
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor dedicado da Batalha de Dados")
+    parser.add_argument("--host", default="", help="endereço de escuta (vazio = IPv4 + IPv6)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--series", type=int, default=1, help="séries por conexão")
+    parser.add_argument("--dice", choices=list(DICE_TYPES.keys()), help="dado fixo (padrão: sorteado)")
+    parser.add_argument("--metrics-port", type=int, help="expõe /metrics (Prometheus) em 127.0.0.1")
+    parser.add_argument("--trace", default=os.environ.get('BATALHA_TRACE'),
+                        help="grava o rastreamento de latência por mensagem neste arquivo")
+    parser.add_argument("--replays", default=os.environ.get('BATALHA_REPLAYS'),
+                        help="grava um replay compacto por batalha neste arquivo")
+    parser.add_argument("--results", default=os.environ.get('BATALHA_RESULTS'),
+                        help="guarda o resultado de cada batalha neste banco SQLite")
+    parser.add_argument("--capture", default=os.environ.get('BATALHA_CAPTURE'),
+                        help="grava todos os frames enviados e recebidos neste arquivo (capture.py)")
+    parser.add_argument("--ratings", help="ratings Glicko dos jogadores: carregados ao iniciar e gravados ao sair")
+    parser.add_argument("--admin-port", type=int, help="porta de administração em 127.0.0.1 (padrão: porta + 100)")
+    parser.add_argument("--admin", metavar="COMANDO", help="envia um comando à porta de administração e sai")
+    parser.add_argument("--no-sampler", action="store_true", help="desliga o amostrador de pilhas")
+    parser.add_argument("--profile", default=os.environ.get(profiling.PROFILE_ENV),
+                        help="perfila as conexões e grava <prefixo>.pstats/.collapsed ao sair")
+    args = parser.parse_args()
+
+    if args.admin:
+        print(admin_request(args.admin_port or args.port + ADMIN_PORT_OFFSET, args.admin), end="")
+        return
+    
+    script.set_headless(True)
+    if args.metrics_port is not None:
+        script.enable_metrics(args.metrics_port)
+    if args.trace:
+        script.enable_tracing(args.trace)
+    if args.replays:
+        script.enable_replays(args.replays)
+    if args.results:
+        script.enable_results(args.results)
+    if args.capture:
+        script.enable_capture(args.capture)
+    server = MatchServer(args.host, args.port, args.series, args.dice)
+    if args.ratings:
+        server.ratings = ratings.RatingBook.load(args.ratings)
+        server.ratings_path = args.ratings
+    if args.profile:
+        server.profiler = profiling.ProfileCollector()
+    if not args.no_sampler:
+        server.sampler = StackSampler().start()
+    server.start_admin(args.admin_port or args.port + ADMIN_PORT_OFFSET)
+    print(script.color(f"Servidor dedicado ouvindo na porta {args.port} (Ctrl+C para sair)", C.GREEN))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nEncerrando: {server.connections} conexões, {server.battles} batalhas.")
+    if script.TRACER is not None:
+        script.TRACER.close()
+    if server.profiler is not None:
+        stats = server.profiler.stats()
+        if stats is not None:
+            paths = profiling.write_profile(stats, args.profile)
+            print(f"Perfil gravado em {paths[0]} e {paths[1]}")
+        if server.profiler.unprofiled:
+            print(f"{server.profiler.unprofiled} conexões rodaram sem perfil (outro cProfile já estava ativo).")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - rede simulada em tempo virtual (determinística)
+- Transporte em memória (VirtualSocket) no lugar dos sockets reais, com
+  atraso, jitter, perda, duplicação e reordenação (parâmetros do impair.py)
+- Relógio virtual no lugar de time.sleep/time.monotonic do script.py
+- Cada lado da partida roda numa thread, mas só uma executa por vez e a
+  ordem é decidida pelo relógio virtual: a mesma semente repete a mesma
+  partida bit a bit, e milhares de partidas rodam em segundos
+- Cobre AdvancedNetwork, network_battle() e as séries do servidor dedicado
+"""
+
+import argparse
+import contextlib
+import hashlib
+import heapq
+import io
+import itertools
+import random
+import socket
+import sys
+import threading
+import time
+
+import script
+import server
+from impair import Impairment
+from script import AdvancedNetwork, Combatant, MessageType, CHARACTERS, network_battle, next_game_message
+
+SIM_EPOCH = 1_700_000_000.0  # time.time() virtual no instante zero
+
+class SimulationStalled(ConnectionResetError):
+    """A simulação ficou sem eventos com threads ainda bloqueadas (ex.: datagrama perdido)"""
+
+class _Task:
+    def __init__(self, sim, func, args, name):
+        self.sim = sim
+        self.go = threading.Event()
+        self.token = 0
+        self.done = False
+        self.cancelled = False
+        self.timed_out = False
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self._main, args=(func, args), name=name, daemon=True)
+
+    def _main(self, func, args):
+        self.go.wait()
+        self.go.clear()
+        try:
+            self.result = func(*args)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done = True
+            self.sim.switch.set()
+
+class Simulator:
+    """Escalonador de eventos em tempo virtual; as tarefas cedem a vez ao bloquear"""
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.now = 0.0
+        self.events = []  # (tempo, seq, tarefa ou callback, token)
+        self.seq = itertools.count()
+        self.switch = threading.Event()
+        self.current = None
+        self.tasks = []
+
+    def spawn(self, func, *args, name="sim"):
+        task = _Task(self, func, args, name)
+        self.tasks.append(task)
+        task.thread.start()
+        self._push(self.now, task, task.token)
+        return task
+
+    def at(self, when, callback):
+        self._push(when, callback, None)
+
+    def _push(self, when, item, token):
+        heapq.heappush(self.events, (when, next(self.seq), item, token))
+
+    def wake(self, task):
+        self._push(self.now, task, task.token)
+
+    def block(self, timeout=None):
+        """Suspende a tarefa atual até wake() ou até o timeout; True se foi acordada"""
+        task = self.current
+        if task.cancelled:
+            raise SimulationStalled("simulação parada com a tarefa bloqueada")
+        task.token += 1
+        task.timed_out = False
+        if timeout is not None:
+            self._push(self.now + timeout, self._timeout(task, task.token), None)
+        self.switch.set()
+        task.go.wait()
+        task.go.clear()
+        if task.cancelled:
+            raise SimulationStalled("simulação parada com a tarefa bloqueada")
+        return not task.timed_out
+
+    def _timeout(self, task, token):
+        def fire():
+            if task.token == token and not task.done:
+                task.timed_out = True
+                self.wake(task)
+        return fire
+
+    def sleep(self, seconds):
+        task = self.current
+        if task.cancelled:
+            raise SimulationStalled("simulação parada")
+        task.token += 1
+        self._push(self.now + max(0.0, seconds), task, task.token)
+        self.switch.set()
+        task.go.wait()
+        task.go.clear()
+        if task.cancelled:
+            raise SimulationStalled("simulação parada")
+
+    def _resume(self, task):
+        self.current = task
+        self.switch.clear()
+        task.go.set()
+        self.switch.wait()
+        self.current = None
+
+    def run(self, until=None):
+        """Processa eventos até acabarem (ou até `until`); cancela tarefas travadas"""
+        while self.events:
+            when, _, item, token = self.events[0]
+            if until is not None and when > until:
+                break
+            heapq.heappop(self.events)
+            self.now = max(self.now, when)
+            if isinstance(item, _Task):
+                if not item.done and item.token == token:
+                    self._resume(item)
+            else:
+                item()
+        stalled = [task for task in self.tasks if not task.done]
+        for task in stalled:
+            task.cancelled = True
+            self._resume(task)
+        return stalled
+
+class VirtualTime:
+    """Substitui o módulo time dentro do script.py durante a simulação"""
+    def __init__(self, sim):
+        self.sim = sim
+
+    def time(self):
+        return SIM_EPOCH + self.sim.now
+
+    def monotonic(self):
+        return self.sim.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.sim.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+class VirtualLink:
+    """Um sentido do tráfego com as mesmas regras do impair.Link, em tempo virtual"""
+    def __init__(self, sim, impairment, name, ordered, log):
+        self.sim = sim
+        self.imp = impairment
+        self.rng = random.Random(f"{sim.seed}:{name}")
+        self.name = name
+        self.ordered = ordered
+        self.log = log
+        self.last = 0.0
+        self.stats = {'packets': 0, 'dropped': 0, 'duplicated': 0, 'reordered': 0, 'retransmitted': 0}
+
+    def _latency(self):
+        imp = self.imp
+        return max(0.0, imp.delay + (self.rng.uniform(-imp.jitter, imp.jitter) if imp.jitter else 0.0))
+
+    def transmit(self, data, deliver):
+        imp = self.imp
+        now = self.sim.now
+        times = []
+        if data is None or self.ordered:
+            at = now + self._latency()
+            while data is not None and imp.loss and self.rng.random() < imp.loss:
+                at += imp.rto
+                self.stats['retransmitted'] += 1
+            times.append(max(at, self.last))
+            self.last = times[0]
+        else:
+            if imp.loss and self.rng.random() < imp.loss:
+                self.stats['dropped'] += 1
+                return
+            at = now + self._latency()
+            if imp.reorder and self.rng.random() < imp.reorder:
+                at += imp.reorder_delay
+                self.stats['reordered'] += 1
+            times.append(at)
+            if imp.duplicate and self.rng.random() < imp.duplicate:
+                times.append(at + self._latency() * 0.1)
+                self.stats['duplicated'] += 1
+        for at in times:
+            self.sim.at(at, self._delivery(at, data, deliver))
+
+    def _delivery(self, at, data, deliver):
+        def fire():
+            if data is not None:
+                self.stats['packets'] += 1
+                self.log.append((at, self.name, len(data)))
+            deliver(data)
+        return fire
+
+class VirtualSocket:
+    """Ponta de uma conexão em memória com a interface de socket usada pelo jogo"""
+    def __init__(self, sim, name, datagram):
+        self.sim = sim
+        self.name = name
+        self.datagram = datagram
+        self.peer = None
+        self.link = None
+        self.rx = bytearray()
+        self.datagrams = []
+        self.eof = False
+        self.closed = False
+        self.timeout = None
+        self.waiters = []
+        self.address = ('10.0.0.1' if name == 'host' else '10.0.0.2', 12345)
+
+    def _wake(self):
+        waiters, self.waiters = self.waiters, []
+        for task in waiters:
+            self.sim.wake(task)
+
+    def _deliver(self, data):
+        if self.closed:
+            return
+        if data is None:
+            self.eof = True
+        elif self.datagram:
+            self.datagrams.append(data)
+        else:
+            self.rx += data
+        self._wake()
+
+    def sendall(self, data):
+        if self.closed:
+            raise OSError("socket fechado")
+        if self.peer.closed and not self.datagram:
+            raise BrokenPipeError("conexão encerrada pelo par")
+        self.link.transmit(bytes(data), self.peer._deliver)
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def sendto(self, data, addr):
+        return self.send(data)
+
+    def _wait_data(self):
+        while not (self.datagrams if self.datagram else self.rx) and not self.eof:
+            if self.closed:
+                raise OSError("socket fechado")
+            self.waiters.append(self.sim.current)
+            if not self.sim.block(self.timeout):
+                raise socket.timeout("timed out")
+
+    def recv(self, size):
+        self._wait_data()
+        if self.datagram:
+            return self.datagrams.pop(0) if self.datagrams else b""
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def recvfrom(self, size):
+        data = self.recv(size)
+        return data, self.peer.address
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if not self.datagram:
+            self.link.transmit(None, self.peer._deliver)  # FIN depois dos dados em trânsito
+        self._wake()
+
+    def shutdown(self, how):
+        self.link.transmit(None, self.peer._deliver)
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setsockopt(self, *args):
+        pass
+
+    def getsockname(self):
+        return self.address
+
+    def getpeername(self):
+        return self.peer.address
+
+def socket_pair(sim, impairment, use_tcp, log):
+    host = VirtualSocket(sim, 'host', not use_tcp)
+    guest = VirtualSocket(sim, 'guest', not use_tcp)
+    host.peer, guest.peer = guest, host
+    host.link = VirtualLink(sim, impairment, 'host->guest', use_tcp, log)
+    guest.link = VirtualLink(sim, impairment, 'guest->host', use_tcp, log)
+    return host, guest
+
+@contextlib.contextmanager
+def virtual_time(sim):
+    """Troca o relógio do script.py e do servidor pelo relógio virtual"""
+    clock = VirtualTime(sim)
+    saved = script.time, server.time
+    script.time = server.time = clock
+    try:
+        yield clock
+    finally:
+        script.time, server.time = saved
+
+def _networks(sim, impairment, use_tcp, log):
+    host_sock, guest_sock = socket_pair(sim, impairment, use_tcp, log)
+    host = AdvancedNetwork()
+    host.is_tcp = use_tcp
+    host.socket = host_sock
+    guest = AdvancedNetwork()
+    guest.is_tcp = use_tcp
+    guest.socket = guest_sock
+    guest.peer_addr = host_sock.address
+    return host, guest
+
+def _host_handshake(network):
+    if network.is_tcp:
+        network.peer_addr = network.socket.getpeername()
+        return network._perform_handshake_server()
+    return network.wait_connection()
+
+def _digest(result, log):
+    h = hashlib.sha256()
+    for at, direction, size in log:
+        h.update(f"{at!r} {direction} {size}\n".encode())
+    h.update(repr(sorted(result.items())).encode())
+    return h.hexdigest()
+
+def simulate_match(seed, use_tcp=True, impairment=None, dice='d6', kinds=None):
+    """Uma partida CPU vs CPU pela rede simulada; devolve o resultado e o digest"""
+    sim = Simulator(seed)
+    impairment = impairment or Impairment()
+    log = []
+    random.seed(seed)
+    if kinds is None:
+        kinds = (random.choice(list(CHARACTERS)), random.choice(list(CHARACTERS)))
+    host, guest = _networks(sim, impairment, use_tcp, log)
+    a = Combatant("Host", kinds[0], True)
+    b = Combatant("Convidado", kinds[1], True)
+
+    def host_side():
+        if _host_handshake(host):
+            winner = network_battle(a, Combatant("Convidado", kinds[1]), dice, host, True)
+            return None if winner is None else winner.name
+
+    def guest_side():
+        if guest._perform_handshake_client():
+            winner = network_battle(b, Combatant("Host", kinds[0]), dice, guest, False)
+            return None if winner is None else winner.name
+
+    with virtual_time(sim):
+        host_task = sim.spawn(host_side, name="sim-host")
+        guest_task = sim.spawn(guest_side, name="sim-guest")
+        stalled = sim.run()
+    host.socket.close()
+    guest.socket.close()
+    result = {
+        'winner': host_task.result,
+        'guest_winner': guest_task.result,
+        'stalled': len(stalled),
+        'virtual_time': sim.now,
+        'frames': len(log),
+        'hp': (a.hp, b.hp),
+    }
+    result['digest'] = _digest(result, log)
+    return result
+
+def _series_client(network, dice_hint):
+    """Cliente síncrono do servidor dedicado: joga as séries com a política da CPU"""
+    if not network._perform_handshake_client():
+        return None
+    me = Combatant("Cliente", random.choice(list(CHARACTERS)), True)
+    battles = 0
+    while True:
+        msg = next_game_message(network)
+        if msg is None or msg['type'] == MessageType.GAME_END:
+            return battles
+        if msg['type'] != MessageType.GAME_CONFIG:
+            continue
+        data = msg['data']
+        host = Combatant("Servidor", data.get('host_character', 'Guerreiro'))
+        me.reset_round()
+        network.send_message(MessageType.CHARACTER_SELECT, {'character': me.kind})
+        if network_battle(me, host, data.get('dice_type', dice_hint), network, False) is None:
+            return battles
+        battles += 1
+
+def simulate_server(seed, impairment=None, series=1, dice=None):
+    """Uma conexão ao servidor dedicado (MatchServer, só TCP) pela rede simulada"""
+    sim = Simulator(seed)
+    impairment = impairment or Impairment()
+    log = []
+    random.seed(seed)
+    host_sock, guest_sock = socket_pair(sim, impairment, True, log)
+    match_server = server.MatchServer(series=series, dice=dice)
+    client = AdvancedNetwork()
+    client.socket = guest_sock
+
+    with virtual_time(sim):
+        sim.spawn(match_server._serve_client, host_sock, guest_sock.address, name="sim-server")
+        client_task = sim.spawn(_series_client, client, dice or 'd6', name="sim-client")
+        stalled = sim.run()
+    guest_sock.close()
+    result = {
+        'battles': match_server.battles,
+        'client_battles': client_task.result,
+        'stalled': len(stalled),
+        'virtual_time': sim.now,
+        'frames': len(log),
+    }
+    result['digest'] = _digest(result, log)
+    return result
+
+def run_many(count, seed, quiet=True, **kwargs):
+    """Roda `count` simulações (sementes seed..seed+count-1); devolve resultados e digest total"""
+    target = simulate_server if kwargs.pop('server', False) else simulate_match
+    script.set_headless(True)
+    results = []
+    total = hashlib.sha256()
+    sink = io.StringIO()
+    with contextlib.redirect_stderr(sink) if quiet else contextlib.nullcontext():
+        for i in range(count):
+            result = target(seed + i, **kwargs)
+            results.append(result)
+            total.update(result['digest'].encode())
+    return results, total.hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(description="Partidas em rede simulada (tempo virtual, determinístico)")
+    parser.add_argument("-n", "--matches", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--udp", action="store_true", help="partidas diretas por UDP (não vale com --server)")
+    parser.add_argument("--server", action="store_true", help="simula conexões ao servidor dedicado")
+    parser.add_argument("--series", type=int, default=1, help="séries por conexão (--server)")
+    parser.add_argument("--delay", type=float, default=0.0, help="atraso de ida em ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="variação do atraso em ms")
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--duplicate", type=float, default=0.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--rto", type=float, default=200.0, help="atraso por perda no TCP, em ms")
+    parser.add_argument("--repeat", action="store_true", help="roda duas vezes e confere se é idêntico")
+    parser.add_argument("--verbose", action="store_true", help="mostra as mensagens de erro do jogo")
+    args = parser.parse_args()
+
+    imp = Impairment(args.delay / 1000, args.jitter / 1000, args.loss, args.duplicate, args.reorder,
+                     rto=args.rto / 1000)
+    kwargs = {'impairment': imp}
+    if args.server and args.udp:
+        parser.error("o servidor dedicado só atende por TCP: --server não aceita --udp")
+    if args.server:
+        kwargs.update(server=True, series=args.series)
+    else:
+        kwargs['use_tcp'] = not args.udp
+    started = time.perf_counter()
+    results, digest = run_many(args.matches, args.seed, quiet=not args.verbose, **kwargs)
+    elapsed = time.perf_counter() - started
+    stalled = sum(1 for r in results if r['stalled'])
+    virtual = sum(r['virtual_time'] for r in results)
+    print(f"{len(results)} simulações em {elapsed:.2f}s reais ({virtual:.1f}s virtuais)")
+    print(f"Travadas (sem eventos com threads bloqueadas): {stalled}")
+    print(f"Digest: {digest}")
+    if args.repeat:
+        _, again = run_many(args.matches, args.seed, quiet=not args.verbose, **kwargs)
+        print("Repetição idêntica" if again == digest else f"DIVERGÊNCIA na repetição: {again}")
+        return 0 if again == digest else 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
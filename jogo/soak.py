@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - teste de resistência (soak) do servidor dedicado
+- Sobe o servidor em outro processo (ou usa um já rodando) e mantém uma
+  população fixa de bots jogando sem parar, por horas se preciso
+- A cada intervalo grava uma linha no CSV: RSS, descritores, threads e
+  pausas de GC do servidor (porta de administração), atraso do loop de
+  eventos dos bots, vazão, latência de turno e falhas
+- No fim, o resumo compara o início e o fim do regime e aponta deriva
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import script
+import server
+from loadgen import BotStats, ProtocolBot, percentile
+from memdiag import slope
+from script import DEFAULT_PORT
+
+COLUMNS = [
+    'elapsed_s', 'rss_kib', 'open_fds', 'threads', 'active', 'battles_per_s', 'turns_per_s',
+    'turn_p95_ms', 'loop_lag_ms', 'gc_pause_max_ms', 'gc_pause_ms_per_s', 'failures',
+]
+
+# (coluna, sentido ruim: +1 crescer / -1 cair, tolerância relativa, piso absoluto)
+DRIFT_CHECKS = [
+    ('rss_kib', +1, 0.10, 1024),
+    ('open_fds', +1, 0.10, 8),
+    ('threads', +1, 0.10, 8),
+    ('turn_p95_ms', +1, 0.25, 1.0),
+    ('loop_lag_ms', +1, 0.50, 2.0),
+    ('gc_pause_ms_per_s', +1, 0.50, 1.0),
+    ('battles_per_s', -1, 0.10, 1.0),
+]
+
+def parse_duration(text):
+    """"90", "90s", "30m" ou "2h" em segundos"""
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+def parse_status(text):
+    status = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(' ')
+        try:
+            status[key] = float(value)
+        except ValueError:
+            status[key] = value
+    return status
+
+class _CurrentStats:
+    """Repassa ao BotStats da amostra corrente: um bot no meio da sessão
+    continua contando na amostra nova depois da troca"""
+    def __init__(self, runner):
+        object.__setattr__(self, 'runner', runner)
+
+    def __getattr__(self, name):
+        return getattr(self.runner.stats, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.runner.stats, name, value)
+
+class SoakRunner:
+    def __init__(self, host, port, admin_port, bots, interval, seed):
+        self.host = host
+        self.port = port
+        self.admin_port = admin_port
+        self.bots = bots
+        self.interval = interval
+        self.rng = random.Random(seed)
+        self.stats = BotStats()  # trocado a cada amostra: as listas não crescem sem limite
+        self.running = True
+        self.lag_max = 0.0
+        self.rows = []
+
+    async def bot_loop(self, index):
+        await asyncio.sleep(self.interval * index / max(1, self.bots))  # entrada escalonada
+        rng = random.Random(self.rng.random())
+        stats = _CurrentStats(self)
+        while self.running:
+            if not await ProtocolBot(self.host, self.port, stats, random.Random(rng.random())).run():
+                await asyncio.sleep(1)  # servidor fora do ar: não martelar
+
+    async def lag_probe(self, period=0.1):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            started = loop.time()
+            await asyncio.sleep(period)
+            self.lag_max = max(self.lag_max, loop.time() - started - period)
+
+    async def sample(self, started, previous):
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, server.admin_request, self.admin_port, 'status')
+        status = parse_status(text)
+        stats, self.stats = self.stats, BotStats()
+        lag, self.lag_max = self.lag_max, 0.0
+        now = time.monotonic()
+        span = now - previous['at']
+        battles = status.get('batalhas', 0)
+        gc_total = status.get('gc_pause_total_s', 0.0)
+        rss = status.get('rss_bytes')
+        row = {
+            'elapsed_s': round(now - started, 1),
+            'rss_kib': rss / 1024 if isinstance(rss, float) else None,
+            'open_fds': status.get('open_fds'),
+            'threads': status.get('threads'),
+            'active': status.get('ativos'),
+            'battles_per_s': (battles - previous['battles']) / span,
+            'turns_per_s': stats.turns / span,
+            'turn_p95_ms': percentile(sorted(stats.turn_latencies), 95) * 1000,
+            'loop_lag_ms': lag * 1000,
+            'gc_pause_max_ms': status.get('gc_pause_max_s', 0.0) * 1000,
+            'gc_pause_ms_per_s': (gc_total - previous['gc']) * 1000 / span,
+            'failures': stats.failures,
+        }
+        previous.update(at=now, battles=battles, gc=gc_total)
+        return row
+
+    async def run(self, duration, output):
+        started = time.monotonic()
+        status = parse_status(await asyncio.get_running_loop().run_in_executor(
+            None, server.admin_request, self.admin_port, 'status'))
+        previous = {'at': started, 'battles': status.get('batalhas', 0), 'gc': status.get('gc_pause_total_s', 0.0)}
+        tasks = [asyncio.create_task(self.bot_loop(i)) for i in range(self.bots)]
+        tasks.append(asyncio.create_task(self.lag_probe()))
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            while time.monotonic() - started < duration:
+                await asyncio.sleep(self.interval)
+                row = await self.sample(started, previous)
+                self.rows.append(row)
+                writer.writerow(row)
+                f.flush()
+                print(f"{row['elapsed_s']:8.0f}s  RSS {row['rss_kib'] or 0:9.0f} KiB  fds {row['open_fds'] or 0:.0f}  "
+                      f"threads {row['threads'] or 0:.0f}  {row['battles_per_s']:7.1f} batalhas/s  "
+                      f"p95 {row['turn_p95_ms']:6.2f} ms  lag {row['loop_lag_ms']:6.2f} ms  falhas {row['failures']}")
+        self.running = False
+        await asyncio.wait(tasks, timeout=30)
+        return self.rows
+
+def drift_summary(rows, warmup=0.1):
+    """Compara o primeiro e o último quarto do regime; devolve {coluna: dados} e se houve deriva"""
+    steady = rows[int(len(rows) * warmup):]
+    quarter = max(1, len(steady) // 4)
+    summary = {}
+    drifted = False
+    for column, direction, tolerance, floor in DRIFT_CHECKS:
+        values = [(row['elapsed_s'], row[column]) for row in steady if row[column] is not None]
+        if len(values) < 4:
+            continue
+        first = sum(v for _, v in values[:quarter]) / quarter
+        last = sum(v for _, v in values[-quarter:]) / quarter
+        change = (last - first) / max(abs(first), floor)
+        flagged = change * direction > tolerance
+        drifted |= flagged
+        summary[column] = {
+            'first': first, 'last': last, 'change': change,
+            'slope_per_hour': slope(values) * 3600, 'drift': flagged,
+        }
+    return summary, drifted
+
+def _serve(port, admin_port):
+    script.set_headless(True)
+    match_server = server.MatchServer(port=port)
+    match_server.sampler = server.StackSampler().start()
+    match_server.start_admin(admin_port)
+    match_server.serve_forever()
+
+def wait_admin(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return server.admin_request(port, 'status')
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError("porta de administração do servidor não respondeu")
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de resistência do servidor dedicado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--admin-port", type=int, help="porta de administração (padrão: porta + 100)")
+    parser.add_argument("--spawn-server", action="store_true", help="sobe o servidor num processo próprio")
+    parser.add_argument("--bots", type=int, default=50, help="população fixa de bots")
+    parser.add_argument("--duration", default="1h", help="duração: 90s, 30m, 2h...")
+    parser.add_argument("--interval", type=float, default=5.0, help="segundos entre amostras")
+    parser.add_argument("--warmup", type=float, default=0.1, help="fração inicial fora do resumo")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", default="soak.csv", help="série temporal (CSV)")
+    args = parser.parse_args()
+
+    script.set_headless(True)
+    admin_port = args.admin_port or args.port + server.ADMIN_PORT_OFFSET
+    server_proc = None
+    if args.spawn_server:
+        server_proc = multiprocessing.Process(target=_serve, args=(args.port, admin_port), daemon=True)
+        server_proc.start()
+    try:
+        wait_admin(admin_port)
+        runner = SoakRunner(args.host, args.port, admin_port, args.bots, args.interval, args.seed)
+        rows = asyncio.run(runner.run(parse_duration(args.duration), args.output))
+    finally:
+        if server_proc:
+            server_proc.terminate()
+
+    summary, drifted = drift_summary(rows, args.warmup)
+    print(f"\nResumo ({len(rows)} amostras, série em {args.output}):")
+    for column, data in summary.items():
+        mark = "DERIVA" if data['drift'] else "ok"
+        print(f"  {column:18s} {data['first']:10.2f} -> {data['last']:10.2f}  {data['change']:+7.1%}"
+              f"  ({data['slope_per_hour']:+.2f}/h)  {mark}")
+    summary_path = args.output.rsplit('.', 1)[0] + '.summary.json'
+    with open(summary_path, 'w') as f:
+        json.dump({'drift': drifted, 'columns': summary}, f, indent=2)
+    print("Deriva detectada." if drifted else "Estável.")
+    return 1 if drifted else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
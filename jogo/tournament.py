@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - torneio CPU vs CPU sem interface
+- Todos os confrontos entre personagens (inclusive espelhados) em cada dado
+- Cada confronto joga séries melhor de 3 como o modo CPU vs CPU do menu
+- Semente opcional para repetir exatamente o mesmo torneio
+- --results guarda cada batalha no SQLite do results.py
+- --checkpoint grava de tempos em tempos a posição, os placares parciais e
+  o estado do gerador aleatório; se o torneio cair, a mesma linha de
+  comando continua do último checkpoint com resultado idêntico ao de uma
+  execução sem interrupção (as batalhas jogadas depois do checkpoint são
+  jogadas de novo, então --results pode receber essas linhas repetidas)
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import script
+from script import Combatant, CHARACTERS, DICE_TYPES, battle
+
+def play_series(kind1, kind2, dice):
+    """Série melhor de 3 entre duas CPUs; devolve o índice do vencedor (0 ou 1)"""
+    p1 = Combatant("CPU-A", kind1, is_cpu=True)
+    p2 = Combatant("CPU-B", kind2, is_cpu=True)
+    score = [0, 0]
+    while max(score) < 2:
+        p1.reset_round()
+        p2.reset_round()
+        winner = battle(p1, p2, dice)
+        score[0 if winner is p1 else 1] += 1
+    return 0 if score[0] == 2 else 1
+
+def pairings(kinds=None, dice=None):
+    """Confrontos (personagem 1, personagem 2, dado) na ordem em que o torneio os joga"""
+    kinds = kinds or list(CHARACTERS.keys())
+    dice = dice or list(DICE_TYPES.keys())
+    return [(k1, k2, d) for d in dice for k1, k2 in itertools.product(kinds, repeat=2)]
+
+CHECKPOINT_FORMAT = 1
+CHECKPOINT_INTERVAL = 30.0  # segundos entre checkpoints
+
+def save_checkpoint(path, config, position, results):
+    """Grava (troca atômica) a configuração, a próxima série, os placares e o estado do gerador"""
+    version, state, gauss = random.getstate()
+    data = {'format': CHECKPOINT_FORMAT, 'config': config, 'position': position,
+            'results': [[*key, *wins] for key, wins in results.items()],
+            'rng': [version, list(state), gauss]}
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def load_checkpoint(path, config):
+    """(posição, placares) de um checkpoint, restaurando o gerador; None se não há checkpoint"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') != CHECKPOINT_FORMAT:
+        raise ValueError(f"{path}: formato de checkpoint desconhecido")
+    if data['config'] != config:
+        raise ValueError(f"{path} é de outro torneio ({data['config']})")
+    version, state, gauss = data['rng']
+    random.setstate((version, tuple(state), gauss))
+    results = {(k1, k2, d): [w1, w2] for k1, k2, d, w1, w2 in data['results']}
+    return data['position'], results
+
+def run_tournament(kinds=None, dice=None, series=10, seed=None, checkpoint=None,
+                   checkpoint_interval=CHECKPOINT_INTERVAL):
+    """Joga `series` séries por confronto; devolve {(k1, k2, dado): [vitórias k1, vitórias k2]}.
+    Com `checkpoint`, continua de lá se o arquivo existe e o apaga ao terminar."""
+    script.set_headless(True)
+    matchups = pairings(kinds, dice)
+    config = {'pairings': [list(m) for m in matchups], 'series': series, 'seed': seed}
+    resumed = load_checkpoint(checkpoint, config) if checkpoint else None
+    if resumed:
+        (start, done), results = resumed
+    else:
+        if seed is not None:
+            random.seed(seed)
+        start, done, results = 0, 0, {}
+    last_save = time.monotonic()
+    # Checkpoints só entre séries: uma série interrompida é jogada de novo do
+    # começo, com o gerador no mesmo estado em que estava antes dela
+    for index in range(start, len(matchups)):
+        kind1, kind2, d = key = matchups[index]
+        wins = results.setdefault(key, [0, 0])
+        for done in range(done, series):
+            if checkpoint and time.monotonic() - last_save >= checkpoint_interval:
+                save_checkpoint(checkpoint, config, [index, done], results)
+                last_save = time.monotonic()
+            wins[play_series(kind1, kind2, d)] += 1
+        done = 0
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return results
+
+def win_rates(results):
+    """Taxa de vitória em séries por personagem, somando todos os confrontos"""
+    won = {}
+    played = {}
+    for (kind1, kind2, _), (w1, w2) in results.items():
+        for kind, w in ((kind1, w1), (kind2, w2)):
+            won[kind] = won.get(kind, 0) + w
+            played[kind] = played.get(kind, 0) + w1 + w2
+    return {kind: won[kind] / played[kind] for kind in played if played[kind]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Torneio CPU vs CPU da Batalha de Dados")
+    parser.add_argument("--series", type=int, default=10, help="séries por confronto")
+    parser.add_argument("--dice", nargs='*', choices=list(DICE_TYPES.keys()), help="dados (padrão: todos)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--results", help="guarda cada batalha neste banco SQLite (results.py)")
+    parser.add_argument("--checkpoint", help="arquivo de checkpoint: grava o progresso e continua dele")
+    parser.add_argument("--checkpoint-interval", type=float, default=CHECKPOINT_INTERVAL,
+                        help="segundos entre checkpoints")
+    args = parser.parse_args()
+
+    if args.results:
+        script.enable_results(args.results).source = 'tournament'
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        print(f"Continuando do checkpoint {args.checkpoint}")
+    results = run_tournament(dice=args.dice, series=args.series, seed=args.seed,
+                             checkpoint=args.checkpoint, checkpoint_interval=args.checkpoint_interval)
+    for (kind1, kind2, d), (w1, w2) in results.items():
+        print(f"{d:4s} {kind1:10s} x {kind2:10s}  {w1:4d} x {w2:<4d}")
+    print()
+    for kind, rate in sorted(win_rates(results).items(), key=lambda item: -item[1]):
+        print(f"{kind:10s} {rate:6.1%}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
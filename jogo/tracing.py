@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Batalha de Dados - análise dos arquivos de rastreamento de latência
+- Junta os eventos send/recv dos dois lados pelo id de rastreamento
+- Separa a latência de ida em serialize, wire, decode e queue
+- Percentis por tipo de mensagem; --csv grava a decomposição por mensagem
+Os arquivos vêm de BATALHA_TRACE=<arquivo> (script.py) ou server.py --trace.
+"""
+
+import argparse
+import csv
+import json
+import sys
+
+from loadgen import percentile
+
+HOPS = ('serialize', 'wire', 'decode', 'queue', 'total')
+
+def load_events(paths):
+    sends = {}
+    recvs = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                event = json.loads(line)
+                if not event.get('trace'):
+                    continue
+                if event['ev'] == 'send':
+                    sends[event['trace']] = event
+                elif event['ev'] == 'recv':
+                    recvs.append(event)
+    return sends, recvs
+
+def breakdown(sends, recvs):
+    """Decomposição por mensagem recebida que tem o envio correspondente"""
+    rows = []
+    for recv in recvs:
+        send = sends.get(recv['trace'])
+        if send is None:
+            continue
+        transit = recv.get('transit')
+        if transit is None and send['host'] == recv['host']:
+            transit = recv['received'] - send['mono']  # mesmo host: mesmo relógio monotônico
+        if transit is None:
+            continue
+        row = {
+            'trace': recv['trace'],
+            'type': recv['type'],
+            'round': recv.get('round'),
+            'bytes': send['bytes'],
+            'serialize': send['serialize'],
+            'wire': transit - send['serialize'],
+            'decode': recv['decode'],
+            'queue': recv['queue'],
+        }
+        row['total'] = transit + row['decode'] + row['queue']
+        rows.append(row)
+    return rows
+
+def summarize(rows):
+    """{tipo: {etapa: (p50, p95, p99)}} em segundos, mais a contagem"""
+    by_type = {}
+    for row in rows:
+        by_type.setdefault(row['type'], []).append(row)
+    summary = {}
+    for msg_type, items in sorted(by_type.items()):
+        summary[msg_type] = {'count': len(items)}
+        for hop in HOPS:
+            values = sorted(item[hop] for item in items)
+            summary[msg_type][hop] = tuple(percentile(values, p) for p in (50, 95, 99))
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Decomposição de latência a partir dos rastreamentos")
+    parser.add_argument('files', nargs='+', help="arquivos de rastreamento (um ou os dois lados)")
+    parser.add_argument('--csv', help="grava a decomposição por mensagem neste arquivo")
+    args = parser.parse_args()
+
+    sends, recvs = load_events(args.files)
+    rows = breakdown(sends, recvs)
+    if not rows:
+        print("Nenhuma mensagem com envio e recebimento correspondentes "
+              "(hosts diferentes precisam de HEARTBEATs para sincronizar o relógio).")
+        return 1
+    print(f"{len(rows)} mensagens; valores em ms (p50 / p95 / p99)\n")
+    print(f"{'tipo':14s} {'n':>6s}  " + "  ".join(f"{hop:>22s}" for hop in HOPS))
+    for msg_type, stats in summarize(rows).items():
+        cells = "  ".join("{:6.3f} /{:6.3f} /{:6.3f}".format(*(v * 1000 for v in stats[hop])) for hop in HOPS)
+        print(f"{msg_type:14s} {stats['count']:6d}  {cells}")
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nDecomposição por mensagem gravada em {args.csv}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())